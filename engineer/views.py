@@ -2,7 +2,8 @@ from django.shortcuts import render
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from meter.models import MeterAssignment
-from meter.serializers import MeterAssignmentSerializer, MeterSerializer
+from meter.serializers import MeterAssignmentSerializer, MeterSerializer, MeterDataSerializer
+from meter.queries import latest_readings
 from meter.models import Meter
 from accounts.models import User
 # Create your views here.
@@ -27,7 +28,7 @@ class EngineersMeterViewSet(viewsets.ViewSet):
                     "details": "No meters assigned to the engineer"
                 }, status=status.HTTP_404_NOT_FOUND)
 
-            meter_ids = [assignment.meter.id for assignment in meter_assignments]
+            meter_ids = [assignment.meter_id for assignment in meter_assignments]
             meters = Meter.objects.filter(id__in=meter_ids)
 
             if not meters:
@@ -36,12 +37,19 @@ class EngineersMeterViewSet(viewsets.ViewSet):
                     "details": "No meters assigned to the engineer"
                 }, status=status.HTTP_404_NOT_FOUND)
 
+            # Current state of every meter from the latest-reading snapshot, in one query
+            latest = latest_readings(meter_ids)
+
             return Response({
                 "details": {
                     "message": "Meters retrieved successfully",
                     "data": {
                         'meter_assignments': MeterAssignmentSerializer(meter_assignments, many=True).data,
-                        'meters': MeterSerializer(meters, many=True).data
+                        'meters': MeterSerializer(meters, many=True).data,
+                        'latest_data': {
+                            meter.device_id: MeterDataSerializer(latest[meter.id]).data
+                            for meter in meters if meter.id in latest
+                        }
                     }
                 }
             }, status=status.HTTP_200_OK)
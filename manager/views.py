@@ -7,7 +7,8 @@ from admin_master.models import UserAssignment
 from admin_master.serializers import UserAssignmentSerializer
 from rest_framework import status
 from meter.models import Meter, MeterAssignment
-from meter.serializers import MeterSerializer, MeterAssignmentSerializer
+from meter.serializers import MeterSerializer, MeterAssignmentSerializer, MeterDataSerializer
+from meter.queries import latest_readings
 
 # Create your views here.
 
@@ -82,11 +83,14 @@ class AssignedMetersViewSet(viewsets.ViewSet):
             meter_assignments = MeterAssignment.objects.filter(manager=request.user)
 
             # Get all meter IDs from the assignments
-            meter_ids = [assignment.meter.id for assignment in meter_assignments]
+            meter_ids = list(meter_assignments.values_list('meter_id', flat=True))
 
             # Get all meters with those IDs
             meters = Meter.objects.filter(id__in=meter_ids)
 
+            # Current state of every meter from the latest-reading snapshot, in one query
+            latest = latest_readings(meter_ids)
+
             # Serialize both the assignments and meters
             assignment_serializer = MeterAssignmentSerializer(meter_assignments, many=True)
             meter_serializer = MeterSerializer(meters, many=True)
@@ -96,7 +100,11 @@ class AssignedMetersViewSet(viewsets.ViewSet):
                     "message": "Meters retrieved successfully",
                     "data": {
                         'assignments': assignment_serializer.data,
-                        'meters': meter_serializer.data
+                        'meters': meter_serializer.data,
+                        'latest_data': {
+                            meter.device_id: MeterDataSerializer(latest[meter.id]).data
+                            for meter in meters if meter.id in latest
+                        }
                     }
                 }
             })
@@ -0,0 +1,116 @@
+"""
+Alarm edge detection.
+
+MeterData repeats five alarm booleans on every reading. Ingest compares
+each new reading with the meter's previous alarm state, kept as a bitmask
+on its MeterLatest snapshot, and touches AlarmEvent only on transitions:
+a raised alarm adds a row, a cleared one sets ``cleared_at`` on its open
+row. Alarm history is then read from that small indexed table instead of
+scanning telemetry.
+
+Readings older than the meter's snapshot arrive after later state was
+already evaluated, so they are left out of edge detection.
+``python manage.py alarm_catchup`` rebuilds a meter's events from its raw
+readings, which also backfills history ingested before events existed.
+As with rollups, two workers ingesting the same meter at the same moment
+can both record the same edge.
+"""
+from itertools import groupby
+from operator import attrgetter
+
+from .models import AlarmEvent, MeterData, MeterLatest
+
+# Alarm flags in bit order
+ALARM_FIELDS = [field for field, _ in AlarmEvent.ALARM_CHOICES]
+
+
+def alarm_bits(flags):
+    """Bitmask of alarm flags given in ALARM_FIELDS order"""
+    return sum(1 << bit for bit, flag in enumerate(flags) if flag)
+
+
+def alarm_state(reading):
+    """Bitmask of the alarms set on a MeterData reading"""
+    return alarm_bits(getattr(reading, field) for field in ALARM_FIELDS)
+
+
+def edges(previous, readings):
+    """Yield ``(timestamp, field, raised)`` for every alarm that changes across ``(timestamp, state)`` readings"""
+    for timestamp, state in readings:
+        changed = previous ^ state
+        for bit, field in enumerate(ALARM_FIELDS):
+            if changed & (1 << bit):
+                yield timestamp, field, bool(state & (1 << bit))
+        previous = state
+
+
+def events_from_edges(meter_pk, meter_edges):
+    """
+    Turn one meter's edges into new AlarmEvents, cleared already if they
+    clear within the same edges, and ``(field, timestamp)`` clears of
+    events opened earlier.
+    """
+    opened = {}
+    new = []
+    clears = []
+    for timestamp, field, raised in meter_edges:
+        if raised:
+            opened[field] = AlarmEvent(meter_id=meter_pk, alarm=field, raised_at=timestamp)
+            new.append(opened[field])
+        elif field in opened:
+            opened.pop(field).cleared_at = timestamp
+        else:
+            clears.append((field, timestamp))
+    return new, clears
+
+
+def record_alarm_edges(instances):
+    """Write AlarmEvent changes for a batch of new readings; call before the snapshots are refreshed"""
+    by_meter = groupby(sorted(instances, key=attrgetter('meter_id', 'timestamp', 'id')), key=attrgetter('meter_id'))
+    by_meter = [(meter_pk, list(readings)) for meter_pk, readings in by_meter]
+    if not by_meter:
+        return
+    snapshots = {
+        meter_pk: (timestamp, alarms)
+        for meter_pk, timestamp, alarms in MeterLatest.objects.filter(
+            meter_id__in=[meter_pk for meter_pk, _ in by_meter]
+        ).values_list('meter_id', 'timestamp', 'alarms')
+    }
+
+    new = []
+    for meter_pk, readings in by_meter:
+        since, previous = snapshots.get(meter_pk, (None, 0))
+        states = [
+            (reading.timestamp, alarm_state(reading)) for reading in readings
+            if since is None or reading.timestamp >= since
+        ]
+        created, clears = events_from_edges(meter_pk, edges(previous, states))
+        new.extend(created)
+        for field, timestamp in clears:
+            AlarmEvent.objects.filter(meter_id=meter_pk, alarm=field, cleared_at__isnull=True).update(cleared_at=timestamp)
+    AlarmEvent.objects.bulk_create(new)
+
+
+def rebuild(meter_pk, chunk_size=50000):
+    """
+    Recompute one meter's device alarm events from its raw readings and
+    reset its snapshot's alarm state. Returns the number of events written.
+    """
+    AlarmEvent.objects.filter(meter_id=meter_pk, alarm__in=ALARM_FIELDS).delete()
+    readings = (
+        MeterData.objects.filter(meter_id=meter_pk)
+        .order_by('timestamp', 'id')
+        .values_list('timestamp', *ALARM_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    last = [0]
+
+    def states():
+        for row in readings:
+            last[0] = alarm_bits(row[1:])
+            yield row[0], last[0]
+
+    new, _ = events_from_edges(meter_pk, edges(0, states()))
+    AlarmEvent.objects.bulk_create(new, batch_size=1000)
+    MeterLatest.objects.filter(meter_id=meter_pk).update(alarms=last[0])
+    return len(new)
@@ -0,0 +1,170 @@
+"""
+Vectorized statistics over MeterData columns.
+
+Columns are read with ``values_list`` in chunks and copied straight into a
+float64 NumPy array, one column per field, so no model instances or
+serializer objects are built. Every statistic is then a single reduction
+over that array. Missing values are NaN and are left out of each field's
+statistics.
+
+Alarm history is found the same way: the alarm flags of a range are loaded
+as a boolean array and every episode of every alarm is located with one
+run-length encoding over it.
+"""
+import math
+import warnings
+
+import numpy as np
+from django.conf import settings
+from django.db import models
+
+from .alarms import ALARM_FIELDS
+from .models import MeterData
+
+# Numeric MeterData columns that statistics can be computed over
+NUMERIC_FIELDS = [
+    field.name for field in MeterData._meta.concrete_fields
+    if isinstance(field, (models.FloatField, models.IntegerField)) and not field.primary_key and not field.is_relation
+]
+
+# Percentiles reported when the client does not ask for any
+DEFAULT_PERCENTILES = getattr(settings, 'METER_STATS_PERCENTILES', [50, 90, 95, 99])
+
+# Rows fetched from the database per round trip while loading columns
+LOAD_CHUNK_SIZE = getattr(settings, 'METER_STATS_CHUNK_SIZE', 50000)
+
+
+def load_columns(queryset, fields, chunk_size=LOAD_CHUNK_SIZE):
+    """Load ``fields`` of ``queryset`` into an ``n x len(fields)`` float64 array; NULL becomes NaN"""
+    chunks = []
+    rows = []
+    for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            chunks.append(np.array(rows, dtype=np.float64))
+            rows = []
+    if rows or not chunks:
+        chunks.append(np.array(rows, dtype=np.float64).reshape(len(rows), len(fields)))
+    return np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+
+
+def load_flags(queryset, fields=ALARM_FIELDS, chunk_size=LOAD_CHUNK_SIZE):
+    """
+    Load reading times and boolean ``fields`` of ``queryset``, which must be
+    ordered by time, as a float64 vector of epoch seconds and an
+    ``n x len(fields)`` bool array
+    """
+    epochs = []
+    flags = []
+    rows = []
+
+    def flush():
+        epochs.append(np.fromiter((row[0].timestamp() for row in rows), dtype=np.float64, count=len(rows)))
+        flags.append(np.array([row[1:] for row in rows], dtype=bool).reshape(len(rows), len(fields)))
+        rows.clear()
+
+    for row in queryset.values_list('timestamp', *fields).iterator(chunk_size=chunk_size):
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            flush()
+    if rows or not epochs:
+        flush()
+    return np.concatenate(epochs), np.concatenate(flags)
+
+
+def alarm_episodes(epochs, flags, end):
+    """
+    Run-length encode every column of ``flags`` at once.
+
+    Returns ``(columns, raised, cleared)`` arrays with one entry per episode,
+    ordered by column then time: an episode starts at the first reading with
+    the flag set and ends at the next reading without it, or at ``end``
+    (epoch seconds) when it is still set on the last reading.
+    """
+    count = len(epochs)
+    padded = np.zeros((count + 2, flags.shape[1]), dtype=bool)
+    padded[1:-1] = flags
+    # Transitions alternate raise, clear within each column
+    columns, rows = np.nonzero((padded[1:] != padded[:-1]).T)
+    bounds = np.append(epochs, end)
+    return columns[0::2], bounds[rows[0::2]], bounds[rows[1::2]]
+
+
+def alarm_summary(columns, raised, cleared, fields=ALARM_FIELDS):
+    """Occurrences, total active seconds and longest episode in seconds of each alarm"""
+    durations = cleared - raised
+    counts = np.bincount(columns, minlength=len(fields))
+    totals = np.bincount(columns, weights=durations, minlength=len(fields))
+    longest = np.zeros(len(fields))
+    np.maximum.at(longest, columns, durations)
+    return {
+        field: {
+            "occurrences": int(counts[i]),
+            "active_seconds": float(totals[i]),
+            "longest_seconds": float(longest[i]),
+        }
+        for i, field in enumerate(fields)
+    }
+
+
+def _number(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def describe(values, fields, percentiles=DEFAULT_PERCENTILES):
+    """
+    Count, min, max, mean, stddev and percentiles for each column of ``values``.
+
+    Returns ``{field: {...}}``; statistics of a field with no values are None.
+    """
+    with warnings.catch_warnings():
+        # All-NaN columns are expected and reported as None
+        warnings.simplefilter('ignore', RuntimeWarning)
+        counts = np.count_nonzero(~np.isnan(values), axis=0)
+        minimums = np.nanmin(values, axis=0) if len(values) else np.full(len(fields), np.nan)
+        maximums = np.nanmax(values, axis=0) if len(values) else np.full(len(fields), np.nan)
+        means = np.nanmean(values, axis=0)
+        stddevs = np.nanstd(values, axis=0)
+        quantiles = (
+            np.nanpercentile(values, percentiles, axis=0) if len(values) and percentiles
+            else np.full((len(percentiles), len(fields)), np.nan)
+        )
+
+    return {
+        field: {
+            "count": int(counts[i]),
+            "min": _number(minimums[i]),
+            "max": _number(maximums[i]),
+            "mean": _number(means[i]),
+            "stddev": _number(stddevs[i]),
+            "percentiles": {
+                f"p{percentile:g}": _number(quantiles[j, i]) for j, percentile in enumerate(percentiles)
+            },
+        }
+        for i, field in enumerate(fields)
+    }
+
+
+def parse_fields(value):
+    """Split a comma separated field list; raises ValueError on fields that are not numeric columns"""
+    fields = [field.strip() for field in (value or '').split(',') if field.strip()]
+    if not fields:
+        raise ValueError("fields is required")
+    unknown = [field for field in fields if field not in NUMERIC_FIELDS]
+    if unknown:
+        raise ValueError(f"Not numeric MeterData fields: {', '.join(unknown)}")
+    return fields
+
+
+def parse_percentiles(value):
+    """Split a comma separated percentile list, or return the defaults when not given"""
+    if not value:
+        return list(DEFAULT_PERCENTILES)
+    try:
+        percentiles = [float(p) for p in value.split(',')]
+    except ValueError:
+        raise ValueError("percentiles must be numbers")
+    if any(not math.isfinite(p) or p < 0 or p > 100 for p in percentiles):
+        raise ValueError("percentiles must be between 0 and 100")
+    return percentiles
@@ -0,0 +1,143 @@
+"""
+Streaming anomaly detection on key signals.
+
+Each worker keeps an exponentially weighted mean and variance of
+ANOMALY_FIELDS for every meter it has seen. The state sits in NumPy arrays
+with one row per meter, so a reading is scored and folded in with a
+constant amount of work and memory and no history queries. A reading is
+flagged into the Anomaly table when a field's z-score against the
+meter's statistics before that reading exceeds METER_ANOMALY_Z_LIMIT,
+once the meter has METER_ANOMALY_WARMUP readings of that field.
+
+Readings of a batch are applied in rounds: the first reading of every
+meter in the batch, then the second, and so on, each round one vectorized
+update. The statistics follow arrival order and are not persisted; a
+restarted worker warms up again, and workers ingesting the same meter
+keep separate statistics.
+"""
+import threading
+from operator import attrgetter
+
+import numpy as np
+from django.conf import settings
+
+from .models import Anomaly
+
+# Detect anomalies as part of every ingest write
+ANOMALIES_AT_INGEST = getattr(settings, 'METER_ANOMALIES_AT_INGEST', True)
+
+# Signals tracked per meter
+ANOMALY_FIELDS = getattr(settings, 'METER_ANOMALY_FIELDS', ['rpm', 'oil_pressure_kpa', 'frequency_hz', 'coolant_temp_c'])
+
+# Weight of the newest reading in the moving mean and variance
+ALPHA = getattr(settings, 'METER_ANOMALY_ALPHA', 0.05)
+
+# Absolute z-score above which a reading is flagged
+Z_LIMIT = getattr(settings, 'METER_ANOMALY_Z_LIMIT', 4.0)
+
+# Readings of a field a meter needs before that field is scored
+WARMUP = getattr(settings, 'METER_ANOMALY_WARMUP', 30)
+
+# Lower bound on the standard deviation, so a signal that has been flat is not divided by zero
+MIN_STDDEV = getattr(settings, 'METER_ANOMALY_MIN_STDDEV', 1e-6)
+
+
+class RollingStats:
+    """Exponentially weighted mean and variance of each field, one array row per meter"""
+
+    def __init__(self, fields=ANOMALY_FIELDS, alpha=ALPHA, capacity=1024):
+        self.fields = list(fields)
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.clear(capacity)
+
+    def clear(self, capacity=1024):
+        self.index = {}
+        self.mean = np.zeros((capacity, len(self.fields)))
+        self.var = np.zeros((capacity, len(self.fields)))
+        self.count = np.zeros((capacity, len(self.fields)), dtype=np.int64)
+
+    def slots(self, meter_pks):
+        """Array row of each meter, adding rows for meters not seen before"""
+        for meter_pk in meter_pks:
+            if meter_pk not in self.index:
+                self.index[meter_pk] = len(self.index)
+        size = len(self.mean)
+        if len(self.index) > size:
+            capacity = max(len(self.index), 2 * size)
+            for name in ('mean', 'var', 'count'):
+                grown = np.zeros((capacity, len(self.fields)), dtype=getattr(self, name).dtype)
+                grown[:size] = getattr(self, name)
+                setattr(self, name, grown)
+        return np.array([self.index[meter_pk] for meter_pk in meter_pks], dtype=np.int64)
+
+    def update(self, slots, values):
+        """
+        Score one reading per slot against the statistics so far, then fold
+        it in; ``slots`` must be unique and ``values`` has NaN for missing
+        fields. Returns ``(zscores, means, stddevs)`` as they were before the
+        update, with NaN z-scores for missing or still warming up fields.
+        """
+        mean = self.mean[slots]
+        var = self.var[slots]
+        count = self.count[slots]
+        present = ~np.isnan(values)
+        stddev = np.sqrt(var)
+        diff = values - mean
+        zscores = np.where(present & (count >= WARMUP), diff / np.maximum(stddev, MIN_STDDEV), np.nan)
+
+        first = present & (count == 0)
+        increment = self.alpha * diff
+        self.mean[slots] = np.where(first, values, np.where(present, mean + increment, mean))
+        self.var[slots] = np.where(present & ~first, (1 - self.alpha) * (var + diff * increment), var)
+        self.count[slots] = count + present
+        return zscores, mean, stddev
+
+
+stats = RollingStats()
+
+
+def score(instances):
+    """
+    Fold new MeterData instances into the rolling statistics.
+
+    Returns ``(reading, field, value, mean, stddev, zscore)`` for every
+    field whose z-score exceeds Z_LIMIT.
+    """
+    if not instances:
+        return []
+    readings = sorted(instances, key=attrgetter('meter_id', 'timestamp', 'id'))
+    values = np.array([[getattr(reading, field) for field in stats.fields] for reading in readings],
+                      dtype=np.float64).reshape(len(readings), len(stats.fields))
+    meter_ids = np.fromiter((reading.meter_id for reading in readings), dtype=np.int64, count=len(readings))
+    first = np.ones(len(readings), dtype=bool)
+    first[1:] = meter_ids[1:] != meter_ids[:-1]
+    segment = np.cumsum(first) - 1
+    # Position of each reading among its meter's readings in this batch
+    rank = np.arange(len(readings)) - np.flatnonzero(first)[segment]
+
+    zscores = np.empty_like(values)
+    means = np.empty_like(values)
+    stddevs = np.empty_like(values)
+    order = np.argsort(rank, kind='stable')
+    bounds = np.flatnonzero(np.diff(rank[order])) + 1
+    with stats.lock:
+        slots = stats.slots(meter_ids[first].tolist())[segment]
+        for batch in np.split(order, bounds):
+            zscores[batch], means[batch], stddevs[batch] = stats.update(slots[batch], values[batch])
+
+    with np.errstate(invalid='ignore'):
+        rows, columns = np.nonzero(np.abs(zscores) > Z_LIMIT)
+    return [
+        (readings[i], stats.fields[j], values[i, j], means[i, j], stddevs[i, j], zscores[i, j])
+        for i, j in zip(rows.tolist(), columns.tolist())
+    ]
+
+
+def detect_anomalies(instances):
+    """Score a batch of new readings and record the anomalous ones"""
+    Anomaly.objects.bulk_create([
+        Anomaly(meter_id=reading.meter_id, timestamp=reading.timestamp, field=field,
+                value=value, mean=mean, stddev=stddev, zscore=zscore)
+        for reading, field, value, mean, stddev, zscore in score(instances)
+    ])
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MeterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'meter'
+
+    def ready(self):
+        # Register signal handlers
+        from . import signals
@@ -0,0 +1,171 @@
+"""
+Write-behind buffer for single-reading ingest.
+
+When METER_INGEST_MODE is ``'buffered'``, MeterDataViewSet.create validates
+a reading, puts it on an in-process bounded queue and answers 202 straight
+away. A background thread drains the queue into MeterData with bulk_create
+whenever METER_INGEST_BUFFER_BATCH_SIZE rows are waiting or
+METER_INGEST_BUFFER_FLUSH_INTERVAL seconds have passed, whichever comes
+first. Anything still queued is flushed when the worker process exits.
+
+A batch that fails to write is split in half and each half written on its
+own, down to single rows, so one bad reading (say, for a meter deleted
+after it was queued) costs only itself. Rows that still fail are logged
+with their contents and counted as failed.
+
+Readings held in memory are lost if the process is killed outright.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from .ingest import write_rows
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of readings waiting to be written
+BUFFER_MAX_SIZE = getattr(settings, 'METER_INGEST_BUFFER_MAX_SIZE', 10000)
+
+# Rows written per flush
+BUFFER_BATCH_SIZE = getattr(settings, 'METER_INGEST_BUFFER_BATCH_SIZE', 500)
+
+# Longest time, in seconds, a reading waits before being flushed
+BUFFER_FLUSH_INTERVAL = getattr(settings, 'METER_INGEST_BUFFER_FLUSH_INTERVAL', 1.0)
+
+# What to do when the queue is full: 'block' waits up to
+# METER_INGEST_BUFFER_BLOCK_TIMEOUT seconds for room, 'reject' fails at once
+BUFFER_FULL_POLICY = getattr(settings, 'METER_INGEST_BUFFER_FULL_POLICY', 'block')
+BUFFER_BLOCK_TIMEOUT = getattr(settings, 'METER_INGEST_BUFFER_BLOCK_TIMEOUT', 2.0)
+
+
+class BufferFull(Exception):
+    """Raised when a reading cannot be queued because the buffer is full"""
+
+
+class IngestBuffer:
+    """Bounded queue of validated rows with a background batch flusher"""
+
+    def __init__(self, write, max_size=BUFFER_MAX_SIZE, batch_size=BUFFER_BATCH_SIZE,
+                 flush_interval=BUFFER_FLUSH_INTERVAL, full_policy=BUFFER_FULL_POLICY,
+                 block_timeout=BUFFER_BLOCK_TIMEOUT):
+        if full_policy not in ('block', 'reject'):
+            raise ValueError(f"Unknown buffer full policy: {full_policy}")
+        self.write = write
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.full_policy = full_policy
+        self.block_timeout = block_timeout
+        self.queue = queue.Queue(maxsize=max_size)
+        self.stopping = threading.Event()
+        self.thread = None
+        self.written = 0
+        self.failed = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='meter-ingest-flusher', daemon=True)
+        self.thread.start()
+
+    def put(self, row):
+        """Queue a validated row, applying the configured backpressure policy"""
+        if self.stopping.is_set():
+            raise BufferFull("Ingest buffer is shutting down")
+        try:
+            if self.full_policy == 'block':
+                self.queue.put(row, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(row)
+        except queue.Full:
+            raise BufferFull("Ingest buffer is full")
+
+    def stop(self, timeout=30):
+        """Stop accepting readings and flush whatever is still queued"""
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "failed": self.failed,
+        }
+
+    def _take_batch(self):
+        """Wait for the first row, then gather more until the batch is full or the interval passes"""
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        close_old_connections()
+        self._write(batch)
+
+    def _write(self, batch):
+        """Write a batch, bisecting it on failure so only the rows that cannot be written are dropped"""
+        try:
+            self.write(batch)
+        except Exception:
+            if len(batch) == 1:
+                self.failed += 1
+                logger.exception("Dropping buffered meter reading that could not be written: %r", batch[0])
+                return
+            middle = len(batch) // 2
+            self._write(batch[:middle])
+            self._write(batch[middle:])
+        else:
+            self.written += len(batch)
+
+    def _run(self):
+        try:
+            while not self.stopping.is_set():
+                batch = self._take_batch()
+                if batch:
+                    self._flush(batch)
+            # Drain what was queued before shutdown
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    break
+                self._flush(batch)
+        finally:
+            connection.close()
+
+
+_buffer = None
+_buffer_pid = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """Return this process's ingest buffer, starting its flusher on first use"""
+    global _buffer, _buffer_pid
+    with _buffer_lock:
+        # A forked worker must not reuse its parent's queue and thread
+        if _buffer is None or _buffer_pid != os.getpid():
+            _buffer = IngestBuffer(write_rows)
+            _buffer_pid = os.getpid()
+            _buffer.start()
+            atexit.register(_buffer.stop)
+        return _buffer
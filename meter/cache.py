@@ -0,0 +1,138 @@
+"""
+In-process cache of device_id -> Meter lookups.
+
+Nearly every request starts by resolving a device_id, and meters are
+rarely created, renamed or deleted, so each worker keeps a bounded LRU of
+the meters it has seen. Saving or deleting a Meter clears the local cache
+through signals (see meter/signals.py) and bumps a version number in the
+Django cache. Other workers compare that version at most every
+METER_CACHE_VERSION_CHECK_INTERVAL seconds and drop their entries when it
+moved. The version is only shared between processes when CACHES points at
+a shared backend such as Redis or Memcached; with the default per-process
+LocMemCache, other workers only notice a change once their entries expire,
+METER_CACHE_TTL seconds after they were loaded.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Meter
+
+# Meters kept per worker
+CACHE_MAX_SIZE = getattr(settings, 'METER_CACHE_MAX_SIZE', 10000)
+
+# Seconds between checks of the shared invalidation version; 0 checks on every lookup
+VERSION_CHECK_INTERVAL = getattr(settings, 'METER_CACHE_VERSION_CHECK_INTERVAL', 5)
+
+# Seconds a lookup is trusted; bounds how stale another worker's entry can get
+# when invalidations do not reach it
+CACHE_TTL = getattr(settings, 'METER_CACHE_TTL', 300)
+
+VERSION_KEY = 'meter:resolver:version'
+
+MeterEntry = namedtuple('MeterEntry', ['pk', 'device_id', 'location'])
+
+
+class MeterResolver:
+    """Bounded LRU of device_id -> MeterEntry with hit/miss counters"""
+
+    def __init__(self, max_size=CACHE_MAX_SIZE, version_check_interval=VERSION_CHECK_INTERVAL, ttl=CACHE_TTL):
+        self.max_size = max_size
+        self.version_check_interval = version_check_interval
+        self.ttl = ttl
+        # device_id -> (MeterEntry, monotonic expiry)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.version = None
+        self.checked_at = 0
+
+    def get(self, device_id):
+        """Return the MeterEntry for a device_id, or None if no such meter exists"""
+        return self.get_many([device_id]).get(device_id)
+
+    def get_many(self, device_ids):
+        """Return ``{device_id: MeterEntry}`` for the device_ids that exist, with at most one query"""
+        self._check_version()
+        found = {}
+        missing = []
+        now = time.monotonic()
+        with self.lock:
+            for device_id in set(device_ids):
+                cached = self.entries.get(device_id)
+                if cached is None or cached[1] <= now:
+                    missing.append(device_id)
+                else:
+                    self.entries.move_to_end(device_id)
+                    found[device_id] = cached[0]
+            self.hits += len(found)
+            self.misses += len(missing)
+
+        if missing:
+            generation = self.invalidations
+            loaded = [
+                MeterEntry(*values)
+                for values in Meter.objects.filter(device_id__in=missing).values_list('id', 'device_id', 'location')
+            ]
+            with self.lock:
+                for entry in loaded:
+                    found[entry.device_id] = entry
+                    # Do not cache rows read before a concurrent invalidation
+                    if generation == self.invalidations:
+                        self.entries[entry.device_id] = (entry, now + self.ttl)
+                        self.entries.move_to_end(entry.device_id)
+                # Meters looked up and no longer found must not linger until evicted
+                for device_id in missing:
+                    if device_id not in found:
+                        self.entries.pop(device_id, None)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+        return found
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.invalidations += 1
+
+    def invalidate(self):
+        """Drop local entries and tell other workers to drop theirs"""
+        self.clear()
+        try:
+            cache.add(VERSION_KEY, 0, timeout=None)
+            self.version = cache.incr(VERSION_KEY)
+        except ValueError:
+            # The key was evicted between add and incr
+            self.version = None
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+                "version": self.version,
+            }
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self.checked_at < self.version_check_interval:
+            return
+        self.checked_at = now
+        version = cache.get(VERSION_KEY)
+        if version != self.version:
+            if self.version is not None or version is not None:
+                self.clear()
+            self.version = version
+
+
+resolver = MeterResolver()
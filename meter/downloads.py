@@ -0,0 +1,110 @@
+"""
+Streamed report downloads.
+
+Report files are served from storage with FileResponse instead of being
+read into memory, so a real file is handed to the server's
+wsgi.file_wrapper (sendfile under gunicorn). A single byte range is
+answered with 206 so interrupted downloads can resume; an ETag built from
+the file's size and modification time lets clients revalidate with
+If-None-Match and guard a resume with If-Range. Files are never deleted
+here; meter/retention.py decides when they go.
+"""
+import re
+
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .retention import report_path
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """
+    Up to ``length`` bytes of a file from ``start``. It has no fileno, so
+    servers stream it in blocks rather than sendfile the rest of the file.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def file_etag(size, modified):
+    return f'"{size:x}-{int(modified.timestamp() * 1000000):x}"'
+
+
+def parse_range(header, size):
+    """
+    ``(start, end)`` inclusive for a single ``bytes=`` range, None to send
+    the whole file, or ValueError when the range cannot be satisfied.
+    Multiple ranges are answered with the whole file.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Range {header} not satisfiable for {size} bytes")
+    return start, end
+
+
+def report_response(request, filename):
+    """Response streaming a stored report, or None when the file does not exist"""
+    path = report_path(filename)
+    if '/' in filename or not default_storage.exists(path):
+        return None
+
+    size = default_storage.size(path)
+    modified = default_storage.get_modified_time(path)
+    etag = file_etag(size, modified)
+    last_modified = int(modified.timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    # If-Range: resume only if the client's copy is still this file
+    if_range = request.headers.get('If-Range')
+    header = request.headers.get('Range') if if_range is None or if_range == etag else None
+    try:
+        byte_range = parse_range(header, size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = default_storage.open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, as_attachment=True, filename=filename)
+    else:
+        start, end = byte_range
+        response = FileResponse(RangeFile(file, start, end - start + 1), as_attachment=True, filename=filename,
+                                status=206)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -0,0 +1,194 @@
+"""
+CSV and Parquet exports of MeterData rows.
+
+Both take ``values_list`` rows straight from a server-side cursor, with no
+model instances and no spreadsheet formatting. CSV rows are encoded as they
+arrive and handed out in small text chunks. Parquet rows are gathered into
+row groups of METER_EXPORT_ROW_GROUP_SIZE rows, and each group is written
+as soon as it fills, so memory is bounded by one row group. Neither format
+has Excel's row limit.
+
+Parquet needs pyarrow, which is optional and only imported once a Parquet
+export is written; check_format() rejects Parquet when it is not installed.
+"""
+import csv
+import importlib.util
+import io
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .models import MeterData
+
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+# Formats written here; xlsx is written by meter/reports.py
+EXPORT_FORMATS = ['csv', 'parquet']
+
+# Rows fetched per round trip while exporting
+EXPORT_CHUNK_SIZE = getattr(settings, 'METER_EXPORT_CHUNK_SIZE', 5000)
+
+# Rows per Parquet row group, the unit a Parquet export holds in memory
+ROW_GROUP_SIZE = getattr(settings, 'METER_EXPORT_ROW_GROUP_SIZE', 100000)
+
+# CSV rows per chunk handed to the response or file
+CSV_ROWS_PER_CHUNK = 1000
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def check_format(report_format, formats):
+    """Validate a requested format; raises ValueError when unknown or when Parquet is asked for without pyarrow"""
+    if report_format not in formats:
+        raise ValueError(f"format must be one of {', '.join(formats)}")
+    if report_format == 'parquet' and not PARQUET_AVAILABLE:
+        raise ValueError("Parquet export needs pyarrow, which is not installed")
+    return report_format
+
+
+def export_rows(queryset, fields):
+    """Rows of ``fields`` from a server-side cursor"""
+    return queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def csv_chunks(rows, header):
+    """Encode rows as CSV text, yielding one chunk every CSV_ROWS_PER_CHUNK rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % CSV_ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def arrow_type(field):
+    """Arrow type of a MeterData column; device_id is the one non-model column exports add"""
+    import pyarrow as pa
+
+    if field == 'device_id':
+        return pa.string()
+    internal = MeterData._meta.get_field(field).get_internal_type()
+    if internal == 'FloatField':
+        return pa.float64()
+    if internal in ('IntegerField', 'AutoField', 'BigAutoField', 'ForeignKey'):
+        return pa.int64()
+    if internal == 'BooleanField':
+        return pa.bool_()
+    if internal == 'DateTimeField':
+        return pa.timestamp('us', tz='UTC')
+    return pa.string()
+
+
+def write_parquet(rows, fields, sink):
+    """Write rows to ``sink`` (a path or writable file) one row group at a time; yields after each group"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(field, arrow_type(field)) for field in fields])
+    with pq.ParquetWriter(sink, schema) as writer:
+        group = []
+        for row in rows:
+            group.append(row)
+            if len(group) >= ROW_GROUP_SIZE:
+                writer.write_table(row_group(group, schema))
+                group = []
+                yield
+        if group:
+            writer.write_table(row_group(group, schema))
+    yield
+
+
+def row_group(rows, schema):
+    import pyarrow as pa
+
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    return pa.table([pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+
+class ChunkSink:
+    """Write-only file that keeps what was written until drained, for streaming Parquet over HTTP"""
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_chunks(rows, fields):
+    """Encode rows as a Parquet file, yielding its bytes after each row group"""
+    sink = ChunkSink()
+    for _ in write_parquet(rows, fields, sink):
+        data = sink.drain()
+        if data:
+            yield data
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def write_export(path, rows, fields, report_format):
+    """Write rows to a CSV or Parquet file at ``path``"""
+    if report_format == 'csv':
+        with open(path, 'w', newline='') as f:
+            for chunk in csv_chunks(rows, fields):
+                f.write(chunk)
+    else:
+        for _ in write_parquet(rows, fields, path):
+            pass
+
+
+def streaming_export(rows, fields, report_format, filename):
+    """Response streaming rows as a CSV or Parquet download while they are read"""
+    chunks = csv_chunks(rows, fields) if report_format == 'csv' else parquet_chunks(rows, fields)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[report_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+class ExportRenderer(BaseRenderer):
+    """
+    Lets ``?format=`` select an export format during content negotiation.
+    Exports are streamed by the view itself, so this only renders error
+    payloads, which stay JSON.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'application/json'
+        return JSONRenderer().render(data)
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = CONTENT_TYPES['csv']
+    format = 'csv'
+
+
+class ParquetRenderer(ExportRenderer):
+    media_type = CONTENT_TYPES['parquet']
+    format = 'parquet'
+
+
+class XLSXRenderer(ExportRenderer):
+    media_type = CONTENT_TYPES['xlsx']
+    format = 'xlsx'
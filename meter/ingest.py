@@ -0,0 +1,249 @@
+"""
+Helpers for turning gateway telemetry payloads into MeterData rows.
+
+The single-reading, bulk and streaming endpoints all flatten payloads with
+the compiled schema in meter.schema, so a reading is accepted or rejected
+identically no matter how it reaches the server.
+"""
+import json
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .alarms import alarm_state, record_alarm_edges
+from .anomalies import ANOMALIES_AT_INGEST, detect_anomalies
+from .cache import resolver
+from .models import MeterData, MeterLatest
+from .power_quality import derive_rows
+from .rollups import ROLLUP_AT_INGEST, rollup_instances
+from .rules import RULES_AT_INGEST, record_rule_alerts
+from .schema import flatten_reading
+from .sketches import SKETCH_AT_INGEST, sketch_instances
+from .totalizers import TOTALIZE_AT_INGEST, totalize_instances
+
+# 'sync' writes each single reading before responding. 'buffered' queues it
+# for the write-behind flusher in meter.buffer and 'spooled' appends it to the
+# on-disk spool in meter.spool; both respond with 202
+INGEST_MODE = getattr(settings, 'METER_INGEST_MODE', 'sync')
+
+# Rows written per bulk_create call
+INGEST_CHUNK_SIZE = getattr(settings, 'METER_INGEST_CHUNK_SIZE', 500)
+
+# Upper bound on the number of readings accepted in one bulk request
+BULK_MAX_READINGS = getattr(settings, 'METER_INGEST_BULK_MAX_READINGS', 10000)
+
+# Lines buffered before a streamed upload is flushed to the database
+STREAM_BATCH_SIZE = getattr(settings, 'METER_INGEST_STREAM_BATCH_SIZE', 1000)
+
+# Rejected lines reported individually in a streamed upload summary
+STREAM_MAX_ERRORS = getattr(settings, 'METER_INGEST_STREAM_MAX_ERRORS', 100)
+
+
+def parse_timestamp(value):
+    """Parse an optional reading timestamp given as ISO 8601 text or epoch seconds"""
+    if isinstance(value, bool):
+        raise ValueError("Timestamp must be ISO 8601 text or epoch seconds.")
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    if isinstance(value, str):
+        parsed = parse_datetime(value)
+        if parsed is not None:
+            if timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed, dt_timezone.utc)
+            return parsed
+    raise ValueError("Timestamp must be ISO 8601 text or epoch seconds.")
+
+
+def resolve_meters(device_ids):
+    """Map device_ids to Meter primary keys, querying only for ones not already cached"""
+    return {device_id: entry.pk for device_id, entry in resolver.get_many(device_ids).items()}
+
+
+def prepare_reading(reading, meters):
+    """
+    Flatten one ``{"meter_id": ..., "timestamp": ..., "data": {...}}`` reading.
+
+    Returns ``(row, errors)``; ``row`` is None whenever ``errors`` is not empty.
+    """
+    if not isinstance(reading, dict):
+        return None, {"non_field_errors": ["Reading must be an object"]}
+    meter_id = reading.get('meter_id')
+    if meter_id is None or meter_id == '':
+        return None, {"meter_id": ["meter_id is required"]}
+    if not isinstance(meter_id, str):
+        return None, {"meter_id": ["meter_id must be a string"]}
+    if meters.get(meter_id) is None:
+        return None, {"meter_id": [f"Meter with device_id {meter_id} not found"]}
+    data = reading.get('data') or {}
+    if not isinstance(data, dict):
+        return None, {"data": ["data must be an object"]}
+    row, errors = flatten_reading(data)
+    if errors:
+        return None, errors
+    row['meter_id'] = meters[meter_id]
+    if reading.get('timestamp') is not None:
+        try:
+            row['timestamp'] = parse_timestamp(reading['timestamp'])
+        except (ValueError, OverflowError, OSError) as e:
+            return None, {"timestamp": [str(e)]}
+    return row, {}
+
+
+def update_latest(instances):
+    """Upsert MeterLatest for every meter whose newest reading is in ``instances``"""
+    newest = {}
+    for instance in instances:
+        current = newest.get(instance.meter_id)
+        if current is None or (instance.timestamp, instance.id) > (current.timestamp, current.id):
+            newest[instance.meter_id] = instance
+    if not newest:
+        return
+
+    # Backlog uploads may be older than what the snapshot already holds
+    known = dict(MeterLatest.objects.filter(meter_id__in=newest).values_list('meter_id', 'timestamp'))
+    snapshots = [
+        MeterLatest(meter_id=meter_id, data_id=instance.id, timestamp=instance.timestamp, alarms=alarm_state(instance))
+        for meter_id, instance in newest.items()
+        if meter_id not in known or instance.timestamp >= known[meter_id]
+    ]
+    MeterLatest.objects.bulk_create(
+        snapshots,
+        update_conflicts=True,
+        unique_fields=['meter'],
+        update_fields=['data', 'timestamp', 'alarms'],
+    )
+
+
+def write_rows(rows):
+    """Insert validated rows into MeterData in fixed-size chunks with their derived metrics and refresh alarm events, rule alerts, anomalies, snapshots, rollups, totalizers and quantile sketches"""
+    created = []
+    with transaction.atomic():
+        for start in range(0, len(rows), INGEST_CHUNK_SIZE):
+            chunk = [MeterData(**row) for row in derive_rows(rows[start:start + INGEST_CHUNK_SIZE])]
+            created.extend(MeterData.objects.bulk_create(chunk))
+        # Alarm edges are found against the snapshots as they were before this batch
+        record_alarm_edges(created)
+        if RULES_AT_INGEST:
+            record_rule_alerts(created)
+        if ANOMALIES_AT_INGEST:
+            detect_anomalies(created)
+        update_latest(created)
+        if ROLLUP_AT_INGEST:
+            rollup_instances(created)
+        if TOTALIZE_AT_INGEST:
+            totalize_instances(created)
+        if SKETCH_AT_INGEST:
+            sketch_instances(created)
+    return created
+
+
+def process_batch(readings, meters):
+    """
+    Prepare, validate and store a batch of readings.
+
+    ``meters`` maps device_id to Meter pk and must already cover every
+    device_id in the batch. Returns ``(created, rejected)`` where ``created``
+    pairs each accepted reading's batch position with its new MeterData row
+    and ``rejected`` pairs batch positions with error dicts.
+    """
+    rows = []
+    positions = []
+    rejected = []
+    for position, reading in enumerate(readings):
+        row, errors = prepare_reading(reading, meters)
+        if row is None:
+            rejected.append((position, errors))
+        else:
+            rows.append(row)
+            positions.append(position)
+
+    created = list(zip(positions, write_rows(rows)))
+    return created, rejected
+
+
+def _device_ids(readings):
+    """device_ids to resolve; readings whose meter_id is missing or not a string are rejected by prepare_reading"""
+    return [
+        reading['meter_id'] for reading in readings
+        if isinstance(reading, dict) and isinstance(reading.get('meter_id'), str) and reading['meter_id']
+    ]
+
+
+def ingest_bulk(readings):
+    """
+    Validate and store a list of readings.
+
+    Returns one result dict per reading, in payload order, describing
+    whether it was accepted (with the new row id) or rejected (with errors).
+    """
+    meters = resolve_meters(_device_ids(readings))
+    created, rejected = process_batch(readings, meters)
+
+    results = [None] * len(readings)
+    for index, instance in created:
+        results[index] = {"index": index, "status": "accepted", "id": instance.id}
+    for index, errors in rejected:
+        results[index] = {"index": index, "status": "rejected", "errors": errors}
+    return results
+
+
+def _reject_constant(name):
+    # json.loads accepts NaN, Infinity and -Infinity, which are not JSON
+    raise ValueError(f"{name} is not valid JSON")
+
+
+def ingest_stream(lines, batch_size=None, max_errors=None):
+    """
+    Store newline-delimited JSON readings from an iterable of lines.
+
+    Readings are flushed to the database every ``batch_size`` lines, so
+    memory use does not depend on the length of the stream. Only the first
+    ``max_errors`` rejected lines are reported in detail.
+    """
+    batch_size = batch_size or STREAM_BATCH_SIZE
+    max_errors = STREAM_MAX_ERRORS if max_errors is None else max_errors
+    summary = {"accepted": 0, "rejected": 0, "errors": [], "errors_truncated": False}
+    meters = {}
+
+    def reject(line_number, errors):
+        summary["rejected"] += 1
+        if len(summary["errors"]) < max_errors:
+            summary["errors"].append({"line": line_number, "errors": errors})
+        else:
+            summary["errors_truncated"] = True
+
+    def flush(batch, line_numbers):
+        unknown = [device_id for device_id in _device_ids(batch) if device_id not in meters]
+        if unknown:
+            found = resolve_meters(unknown)
+            for device_id in unknown:
+                meters[device_id] = found.get(device_id)
+        created, rejected = process_batch(batch, meters)
+        summary["accepted"] += len(created)
+        for position, errors in rejected:
+            reject(line_numbers[position], errors)
+
+    batch = []
+    line_numbers = []
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            reading = json.loads(line, parse_constant=_reject_constant)
+        except ValueError:
+            reject(line_number, {"non_field_errors": ["Line is not valid JSON"]})
+            continue
+        batch.append(reading)
+        line_numbers.append(line_number)
+        if len(batch) >= batch_size:
+            flush(batch, line_numbers)
+            batch = []
+            line_numbers = []
+
+    if batch:
+        flush(batch, line_numbers)
+
+    return summary
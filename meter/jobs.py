@@ -0,0 +1,170 @@
+"""
+Background execution of ReportJob rows.
+
+The report endpoints only create a PENDING ReportJob and answer 202 with
+its id; clients poll the ``jobs/<id>/`` route of the same report endpoint
+(e.g. ``/api/meter/meter-report/jobs/<id>/``, returned as ``status_url``)
+until it has SUCCEEDED or FAILED. Jobs are built by one of two executors,
+chosen with METER_REPORT_EXECUTOR:
+
+``'thread'``
+    Each web worker process runs a small thread pool of
+    METER_REPORT_WORKERS threads. A job is handed to the pool once the
+    transaction that created it commits, and the pool picks up jobs left
+    PENDING by earlier processes when it starts. A request that reuses a
+    PENDING job hands it to the pool again.
+
+``'worker'``
+    Web processes never build reports. ``python manage.py report_worker``
+    polls for PENDING jobs and runs up to ``--concurrency`` of them at once,
+    keeping report CPU and memory away from telemetry ingest entirely.
+
+A job is claimed with a conditional PENDING -> RUNNING update, so it runs
+once even when several executors see it. A request whose fingerprint
+matches a pending, running or stored job gets that job back instead of a
+new one. A job RUNNING for longer than METER_REPORT_JOB_TIMEOUT is taken
+to have lost its executor: it is marked FAILED and the request gets a new
+job.
+"""
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import ReportJob
+from .report_specs import ReportError, fingerprint
+from .retention import evict, is_stored, touch
+
+logger = logging.getLogger(__name__)
+
+# 'thread' runs jobs in a pool inside each web process, 'worker' leaves them to the report_worker command
+REPORT_EXECUTOR = getattr(settings, 'METER_REPORT_EXECUTOR', 'thread')
+
+# Reports built at the same time by one process
+REPORT_WORKERS = getattr(settings, 'METER_REPORT_WORKERS', 2)
+
+# Seconds a job may stay RUNNING before it is taken for lost (its executor died) and failed
+REPORT_JOB_TIMEOUT = getattr(settings, 'METER_REPORT_JOB_TIMEOUT', 3600)
+
+
+def fail_if_stale(job):
+    """Mark a job FAILED if it has been RUNNING longer than REPORT_JOB_TIMEOUT; returns True if it was"""
+    if job.status != 'RUNNING' or job.started_at is None:
+        return False
+    if job.started_at > timezone.now() - timedelta(seconds=REPORT_JOB_TIMEOUT):
+        return False
+    failed = ReportJob.objects.filter(pk=job.pk, status='RUNNING', started_at=job.started_at).update(
+        status='FAILED', error=f"Report was not built within {REPORT_JOB_TIMEOUT} seconds", finished_at=timezone.now()
+    )
+    if failed:
+        logger.warning("Report job %s has been running since %s; marked FAILED", job.pk, job.started_at)
+    return True
+
+
+def reusable_job(key):
+    """The newest job with this fingerprint that is still being built or whose file is still stored"""
+    jobs = ReportJob.objects.filter(fingerprint=key, status__in=['PENDING', 'RUNNING', 'SUCCEEDED'])
+    for job in jobs.order_by('-created_at'):
+        if fail_if_stale(job):
+            continue
+        if job.status != 'SUCCEEDED':
+            return job
+        if is_stored(job):
+            touch(job)
+            return job
+    return None
+
+
+def submit(report_type, meter_pk=None, params=None, user=None):
+    """Record a report job and queue it for the configured executor, unless an identical one exists"""
+    params = params or {}
+    key = fingerprint(report_type, meter_pk, params)
+    job = reusable_job(key)
+    if job is None:
+        job = ReportJob.objects.create(
+            report_type=report_type,
+            meter_id=meter_pk,
+            params=params,
+            fingerprint=key,
+            requested_by=user if user is not None and user.is_authenticated else None,
+        )
+    elif job.status != 'PENDING':
+        return job
+    # A reused PENDING job may come from a process whose pool is gone; claim() keeps a second hand-off harmless
+    if REPORT_EXECUTOR == 'thread':
+        transaction.on_commit(lambda: get_executor().submit(run_job, job.pk))
+    return job
+
+
+def claim(job_id):
+    """Move a PENDING job to RUNNING; returns False if another executor got there first"""
+    return ReportJob.objects.filter(pk=job_id, status='PENDING').update(
+        status='RUNNING', started_at=timezone.now()
+    ) == 1
+
+
+def claim_next():
+    """Claim the oldest PENDING job and return its id, or None when there is nothing to do"""
+    while True:
+        job_id = ReportJob.objects.filter(status='PENDING').order_by('created_at').values_list('id', flat=True).first()
+        if job_id is None:
+            return None
+        if claim(job_id):
+            return job_id
+
+
+def execute(job_id):
+    """Build the report for a claimed job and record the outcome"""
+    # Imported here so web processes load pandas and xlsxwriter only once they build a report
+    from .reports import build
+
+    job = ReportJob.objects.select_related('meter').get(pk=job_id)
+    try:
+        filename = build(job)
+    except Exception as e:
+        if not isinstance(e, ReportError):
+            logger.exception("Report job %s failed", job_id)
+        ReportJob.objects.filter(pk=job_id).update(status='FAILED', error=str(e), finished_at=timezone.now())
+        return
+    now = timezone.now()
+    ReportJob.objects.filter(pk=job_id).update(status='SUCCEEDED', filename=filename, finished_at=now, last_used_at=now)
+    try:
+        evict(keep=filename)
+    except Exception:
+        logger.exception("Failed to evict old report files")
+
+
+def run_job(job_id):
+    """Claim and execute one job from a pool thread"""
+    try:
+        close_old_connections()
+        if claim(job_id):
+            execute(job_id)
+    except Exception:
+        logger.exception("Failed to run report job %s", job_id)
+    finally:
+        connection.close()
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return this process's report thread pool, queueing leftover PENDING jobs on first use"""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix='meter-report')
+            _executor_pid = os.getpid()
+            atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+            for job_id in ReportJob.objects.filter(status='PENDING').values_list('id', flat=True):
+                _executor.submit(run_job, job_id)
+        return _executor
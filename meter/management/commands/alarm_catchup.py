@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from meter.alarms import rebuild
+from meter.models import Meter
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild alarm events from raw readings, replacing the events already stored. "
+        "Backfills history ingested before alarm events were recorded."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meter', action='append', dest='meters', default=[],
+                            help="device_id to rebuild; repeat for several, defaults to every meter")
+
+    def handle(self, *args, **options):
+        meters = Meter.objects.all()
+        if options['meters']:
+            meters = meters.filter(device_id__in=options['meters'])
+            missing = set(options['meters']) - set(meters.values_list('device_id', flat=True))
+            if missing:
+                raise CommandError(f"Unknown meters: {', '.join(sorted(missing))}")
+
+        total = 0
+        for meter_pk, device_id in meters.values_list('id', 'device_id'):
+            with transaction.atomic():
+                written = rebuild(meter_pk)
+            total += written
+            self.stdout.write(f"{device_id}: {written} alarm events")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} alarm events"))
@@ -0,0 +1,93 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from meter.alarms import ALARM_FIELDS
+from meter.analytics import alarm_episodes, alarm_summary, load_flags
+from meter.models import Meter
+from meter.queries import readings_in_range
+
+from ._bench import Rollback, insert_readings
+
+
+def python_history(rows, end):
+    """Episodes walked reading by reading, as a loop over model rows would find them"""
+    summary = {field: {"occurrences": 0, "active_seconds": 0.0, "longest_seconds": 0.0} for field in ALARM_FIELDS}
+    raised = [None] * len(ALARM_FIELDS)
+
+    def close(i, stop):
+        duration = stop - raised[i]
+        entry = summary[ALARM_FIELDS[i]]
+        entry["occurrences"] += 1
+        entry["active_seconds"] += duration
+        entry["longest_seconds"] = max(entry["longest_seconds"], duration)
+        raised[i] = None
+
+    for epoch, *flags in rows:
+        for i, flag in enumerate(flags):
+            if flag and raised[i] is None:
+                raised[i] = epoch
+            elif not flag and raised[i] is not None:
+                close(i, epoch)
+    for i in range(len(ALARM_FIELDS)):
+        if raised[i] is not None:
+            close(i, end)
+    return summary
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the alarm history report's load and run-length encoding against a Python "
+        "loop on a year of synthetic 10-second readings (rolled back afterwards)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=365 * 8640, help="Synthetic readings to insert")
+        parser.add_argument('--toggle-rate', type=float, default=0.001,
+                            help="Chance per reading that an alarm flips")
+
+    def handle(self, *args, **options):
+        count = options['rows']
+        start = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        end = start + timedelta(seconds=count)
+        rng = np.random.default_rng(0)
+        columns = {
+            field: np.cumsum(rng.random(count) < options['toggle_rate']) % 2 == 1
+            for field in ALARM_FIELDS
+        }
+
+        try:
+            with transaction.atomic():
+                meter = Meter.objects.create(device_id='__bench_alarm_history__', location='benchmark')
+                started = time.perf_counter()
+                insert_readings(meter, start, columns)
+                self.stdout.write(f"inserted {count} rows in {time.perf_counter() - started:.1f} s")
+                queryset = readings_in_range(meter.pk, start, end)
+
+                started = time.perf_counter()
+                epochs, flags = load_flags(queryset)
+                load = time.perf_counter() - started
+
+                started = time.perf_counter()
+                episodes = alarm_episodes(epochs, flags, end.timestamp())
+                vectorized = alarm_summary(*episodes)
+                encode = time.perf_counter() - started
+
+                rows = np.column_stack([epochs, flags]).tolist()
+                started = time.perf_counter()
+                looped = python_history(rows, end.timestamp())
+                loop = time.perf_counter() - started
+                raise Rollback
+        except Rollback:
+            pass
+
+        if vectorized != looped:
+            self.stdout.write(self.style.ERROR("vectorized and looped summaries differ"))
+        self.stdout.write(f"rows:                  {count}, {len(episodes[0])} alarm episodes")
+        self.stdout.write(f"load (values_list):    {load:7.2f} s")
+        self.stdout.write(f"run-length encoding:   {encode * 1000:7.1f} ms")
+        self.stdout.write(f"Python loop:           {loop * 1000:7.1f} ms")
+        self.stdout.write(self.style.SUCCESS(f"run-length encoding {loop / encode:.0f}x faster than the loop"))
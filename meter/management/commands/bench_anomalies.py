@@ -0,0 +1,54 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from meter import anomalies
+from meter.models import MeterData
+from meter.schema import flatten_reading
+
+
+class Command(BaseCommand):
+    help = "Time scoring synthetic ingest batches against the rolling anomaly statistics (nothing is written)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meters', type=int, default=2000, help="Meters reporting in each batch")
+        parser.add_argument('--batches', type=int, default=50, help="Batches of readings")
+        parser.add_argument('--per-meter', type=int, default=1, help="Readings per meter in each batch")
+
+    def handle(self, *args, **options):
+        meters, batches, per_meter = options['meters'], options['batches'], options['per_meter']
+        start = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        rng = np.random.default_rng(0)
+        row, _ = flatten_reading({})
+        anomalies.stats.clear()
+
+        elapsed = 0.0
+        flagged = 0
+        for batch in range(batches):
+            size = meters * per_meter
+            rpm = rng.normal(1500, 5, size)
+            oil = rng.normal(400, 10, size)
+            frequency = rng.normal(50, 0.05, size)
+            coolant = rng.normal(85, 2, size)
+            # A few spikes per batch
+            rpm[rng.integers(0, size, 3)] += 200
+            readings = [
+                MeterData(id=batch * size + i, meter_id=i % meters + 1,
+                          timestamp=start + timedelta(seconds=10 * (batch * per_meter + i // meters)),
+                          **dict(row, rpm=rpm[i], oil_pressure_kpa=oil[i], frequency_hz=frequency[i],
+                                 coolant_temp_c=coolant[i]))
+                for i in range(size)
+            ]
+            started = time.perf_counter()
+            flagged += len(anomalies.score(readings))
+            elapsed += time.perf_counter() - started
+
+        count = meters * per_meter * batches
+        self.stdout.write(f"readings:     {count} ({batches} batches, {meters} meters x {per_meter})")
+        self.stdout.write(f"flagged:      {flagged} field values (z > {anomalies.Z_LIMIT})")
+        self.stdout.write(f"state:        {anomalies.stats.mean.nbytes * 3 / 2 ** 10:.0f} KB for {len(anomalies.stats.index)} meters")
+        self.stdout.write(self.style.SUCCESS(
+            f"scored in {elapsed:.2f} s, {elapsed / count * 1e6:.2f} us/reading"
+        ))
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from meter.exports import PARQUET_AVAILABLE, csv_chunks, export_rows, write_export
+from meter.models import Meter
+from meter.queries import readings_in_range
+from meter.report_specs import parse_report_fields
+from meter.reports import write_range_workbook
+
+from ._bench import Rollback, insert_readings
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare exporting a meter's range as xlsx (constant_memory), CSV and Parquet "
+        "on synthetic rows (rolled back afterwards)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help="Synthetic readings to insert")
+
+    def handle(self, *args, **options):
+        count = options['rows']
+        start = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        end = start + timedelta(seconds=count)
+        rng = np.random.default_rng(0)
+        columns = {
+            'instantaneous_power_kw': rng.normal(60, 10, count),
+            'fuel_rate_lph': rng.normal(40, 5, count),
+            'coolant_temp_c': rng.integers(70, 95, count),
+            'phase_a_voltage_v': rng.normal(230, 2, count),
+            'phase_a_current_a': rng.normal(100, 8, count),
+        }
+        fields = parse_report_fields(None, 'meter')
+        results = []
+
+        try:
+            with transaction.atomic():
+                meter = Meter.objects.create(device_id='__bench_exports__', location='benchmark')
+                started = time.perf_counter()
+                insert_readings(meter, start, columns)
+                self.stdout.write(f"inserted {count} rows in {time.perf_counter() - started:.1f} s")
+
+                def rows():
+                    return export_rows(readings_in_range(meter.pk, start, end), ['timestamp'] + fields)
+
+                def xlsx(path):
+                    write_range_workbook(path, rows(), fields, 'Meter Data Report', meter.device_id, start, end)
+
+                def csv(path):
+                    write_export(path, rows(), ['timestamp'] + fields, 'csv')
+
+                def parquet(path):
+                    write_export(path, rows(), ['timestamp'] + fields, 'parquet')
+
+                def read_only(path):
+                    for _ in rows():
+                        pass
+
+                def csv_encode_only(path):
+                    for _ in csv_chunks(rows(), ['timestamp'] + fields):
+                        pass
+
+                paths = [('cursor only', read_only), ('CSV encode only', csv_encode_only),
+                         ('xlsx constant_memory', xlsx), ('CSV file', csv)]
+                if PARQUET_AVAILABLE:
+                    paths.append(('Parquet file', parquet))
+                else:
+                    self.stdout.write(self.style.WARNING("pyarrow is not installed, skipping Parquet"))
+                for name, func in paths:
+                    results.append((name,) + self.time(func))
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f"rows:                  {count} ({len(fields) + 1} columns)")
+        for name, seconds, size in results:
+            size = f"{size / 2 ** 20:8.1f} MB" if size else ""
+            self.stdout.write(f"{name + ':':22} {seconds / count * 1e6:7.2f} us/row  {seconds:7.2f} s  {size}")
+        timings = {name: seconds for name, seconds, _ in results}
+        summary = f"CSV {timings['xlsx constant_memory'] / timings['CSV file']:.1f}x faster than xlsx"
+        if 'Parquet file' in timings:
+            summary += f", Parquet {timings['xlsx constant_memory'] / timings['Parquet file']:.1f}x"
+        self.stdout.write(self.style.SUCCESS(summary))
+
+    def time(self, func):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            started = time.perf_counter()
+            func(path)
+            return time.perf_counter() - started, os.path.getsize(path)
+        finally:
+            os.remove(path)
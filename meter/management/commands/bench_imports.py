@@ -0,0 +1,58 @@
+import os
+import re
+import resource
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Report and export libraries that must load on first use, never at startup
+LAZY_MODULES = ['pandas', 'xlsxwriter', 'pyarrow']
+
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure Django startup with `python -X importtime manage.py check` and fail when "
+        "the report libraries are imported at startup or imports exceed a time budget"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help="Heaviest top-level imports to list")
+        parser.add_argument('--budget-ms', type=float, default=None,
+                            help="Fail when total import time exceeds this many milliseconds")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', os.path.join(settings.BASE_DIR, 'manage.py'), 'check'],
+            capture_output=True, text=True, cwd=settings.BASE_DIR,
+        )
+        elapsed = time.perf_counter() - started
+        if result.returncode:
+            raise CommandError(f"manage.py check failed:\n{result.stderr[-2000:]}")
+
+        imports = []
+        for line in result.stderr.splitlines():
+            match = IMPORT_LINE.match(line)
+            if match:
+                imports.append((int(match.group(2)), len(match.group(3)), match.group(4)))
+        top_level = sorted(((us, name) for us, depth, name in imports if depth == 0), reverse=True)
+        total = sum(us for us, _ in top_level)
+        # ru_maxrss is in kilobytes on Linux
+        peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+        self.stdout.write(f"manage.py check:  {elapsed:.2f} s, peak RSS {peak_rss:.0f} MB")
+        self.stdout.write(f"imports:          {len(imports)} modules, {total / 1000:.0f} ms")
+        for us, name in top_level[:options['top']]:
+            self.stdout.write(f"  {us / 1000:8.1f} ms  {name}")
+
+        loaded = sorted({name.split('.')[0] for _, _, name in imports} & set(LAZY_MODULES))
+        if loaded:
+            raise CommandError(f"imported at startup: {', '.join(loaded)}; import them where they are first used")
+        if options['budget_ms'] is not None and total / 1000 > options['budget_ms']:
+            raise CommandError(f"imports took {total / 1000:.0f} ms, over the {options['budget_ms']:.0f} ms budget")
+        self.stdout.write(self.style.SUCCESS(f"{', '.join(LAZY_MODULES)} not imported at startup"))
@@ -0,0 +1,134 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from meter.models import Meter
+from meter.schema import flatten_reading
+from meter.serializers import MeterDataSerializer
+
+from ._bench import Rollback
+
+
+def sample_payload():
+    """Build a realistic nested gateway payload with every section filled in"""
+    phase = lambda: {
+        'voltage_v': round(random.uniform(225, 235), 2),
+        'current_a': round(random.uniform(80, 120), 2),
+        'voltage_ll': round(random.uniform(395, 405), 2),
+        'frequency_hz': 50.0,
+        'real_power': round(random.uniform(15, 25), 2),
+        'apparent_power': round(random.uniform(18, 28), 2),
+        'reactive_power': round(random.uniform(3, 8), 2),
+    }
+    return {
+        'engine_hours': 1520.5,
+        'frequency_hz': 50.01,
+        'power_percentage': 72,
+        'avg_ll_volt': 400.2,
+        'avg_ln_volt': 230.4,
+        'avg_current': 101.7,
+        'phase_a': phase(),
+        'phase_b': phase(),
+        'phase_c': phase(),
+        'gen_breaker': 'CLOSED',
+        'util_breaker': 'OPEN',
+        'gc_status': 'RUNNING',
+        'coolant_temp_c': 84,
+        'oil_pressure_kpa': 410,
+        'battery_voltage_v': 24.1,
+        'fuel_level_percent': 63,
+        'rpm': 1500,
+        'oil_temp_c': 92,
+        'boost_pressure_kpa': 140,
+        'intake_air_temp_c': 38,
+        'fuel_rate_lph': 41.3,
+        'instantaneous_power_kw': 61.2,
+        'alarms': {'emergency_stop': False, 'low_oil_pressure': False},
+    }
+
+
+def legacy_mapping(meter_pk, data):
+    """The hand-written nested .get() mapping MeterDataViewSet.create used before the compiled schema"""
+    return {
+        'meter': meter_pk,
+        'engine_hours': data.get('engine_hours', 0),
+        'frequency_hz': data.get('frequency_hz', 0),
+        'power_percentage': data.get('power_percentage', 0),
+        'avg_ll_volt': data.get('avg_ll_volt', 0),
+        'avg_ln_volt': data.get('avg_ln_volt', 0),
+        'avg_current': data.get('avg_current', 0),
+        **{
+            f'{phase}_{key}': data.get(phase, {}).get(key, 0)
+            for phase in ('phase_a', 'phase_b', 'phase_c')
+            for key in ('voltage_v', 'current_a', 'voltage_ll', 'frequency_hz',
+                        'real_power', 'apparent_power', 'reactive_power')
+        },
+        'gen_breaker': data.get('gen_breaker'),
+        'util_breaker': data.get('util_breaker'),
+        'gc_status': data.get('gc_status'),
+        'coolant_temp_c': data.get('coolant_temp_c', 0),
+        'oil_pressure_kpa': data.get('oil_pressure_kpa', 0),
+        'battery_voltage_v': data.get('battery_voltage_v', 0),
+        'fuel_level_percent': data.get('fuel_level_percent', 0),
+        'rpm': data.get('rpm', 0),
+        'oil_temp_c': data.get('oil_temp_c', 0),
+        'boost_pressure_kpa': data.get('boost_pressure_kpa', 0),
+        'intake_air_temp_c': data.get('intake_air_temp_c', 0),
+        'fuel_rate_lph': data.get('fuel_rate_lph', 0),
+        'instantaneous_power_kw': data.get('instantaneous_power_kw', 0),
+        'alarm_emergency_stop': data.get('alarms', {}).get('emergency_stop', False),
+        'alarm_low_oil_pressure': data.get('alarms', {}).get('low_oil_pressure', False),
+        'alarm_high_coolant_temp': data.get('alarms', {}).get('high_coolant_temp', False),
+        'alarm_low_coolant_level': data.get('alarms', {}).get('low_coolant_level', False),
+        'alarm_crank_failure': data.get('alarms', {}).get('crank_failure', False),
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare per-reading CPU cost of the compiled reading schema against the DRF serializer path"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readings', type=int, default=20000, help="Readings flattened per run")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per path; the fastest is reported")
+
+    def handle(self, *args, **options):
+        count = options['readings']
+        payloads = [sample_payload() for _ in range(count)]
+
+        try:
+            with transaction.atomic():
+                # The serializer validates the meter FK against the database
+                meter = Meter.objects.create(device_id='__bench_ingest__', location='benchmark')
+
+                def serializer_path():
+                    for data in payloads:
+                        serializer = MeterDataSerializer(data=legacy_mapping(meter.pk, data))
+                        serializer.is_valid(raise_exception=True)
+
+                def compiled_path():
+                    for data in payloads:
+                        row, errors = flatten_reading(data)
+                        if errors:
+                            raise ValueError(errors)
+
+                legacy = self.time(serializer_path, options['repeat'])
+                compiled = self.time(compiled_path, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f"readings per run:              {count}")
+        self.stdout.write(f"mapping + MeterDataSerializer: {legacy / count * 1e6:9.2f} us/reading")
+        self.stdout.write(f"compiled schema:               {compiled / count * 1e6:9.2f} us/reading")
+        self.stdout.write(self.style.SUCCESS(f"speedup: {legacy / compiled:.1f}x"))
+
+    def time(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
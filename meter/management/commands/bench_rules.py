@@ -0,0 +1,74 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from meter.models import AlarmRule, MeterData
+from meter.rules import RuleEngine
+from meter.schema import flatten_reading
+
+from ._bench import Rollback
+
+RULES = [
+    ('coolant_temp_c', '>', 105, 60),
+    ('battery_voltage_v', '<', 11.5, 0),
+    ('current_imbalance_pct', '>', 20, 30),
+    ('oil_pressure_kpa', '<', 150, 10),
+    ('frequency_hz', '>', 51, 0),
+]
+
+
+class Command(BaseCommand):
+    help = "Time alarm rule evaluation over synthetic ingest batches (rules rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meters', type=int, default=2000, help="Meters reporting in each batch")
+        parser.add_argument('--batches', type=int, default=30, help="Batches of one reading per meter")
+        parser.add_argument('--rules', type=int, default=20, help="Rules evaluated, cycling through a few kinds")
+
+    def handle(self, *args, **options):
+        meters, batches = options['meters'], options['batches']
+        start = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        rng = np.random.default_rng(0)
+        row, _ = flatten_reading({})
+        row.pop('meter_id', None)
+
+        elapsed = 0.0
+        transitions = 0
+        try:
+            with transaction.atomic():
+                AlarmRule.objects.bulk_create([
+                    AlarmRule(name=f'bench {i}', field=field, operator=operator, threshold=threshold,
+                              duration_seconds=duration)
+                    for i, (field, operator, threshold, duration) in
+                    ((i, RULES[i % len(RULES)]) for i in range(options['rules']))
+                ])
+                engine = RuleEngine()
+                engine.load()
+                for batch in range(batches):
+                    coolant = rng.normal(95, 6, meters)
+                    battery = rng.normal(12.6, 0.5, meters)
+                    currents = rng.normal(100, 12, (3, meters))
+                    readings = [
+                        MeterData(id=batch * meters + i, meter_id=i + 1, timestamp=start + timedelta(seconds=10 * batch),
+                                  **dict(row, coolant_temp_c=coolant[i], battery_voltage_v=battery[i],
+                                         phase_a_current_a=currents[0, i], phase_b_current_a=currents[1, i],
+                                         phase_c_current_a=currents[2, i]))
+                        for i in range(meters)
+                    ]
+                    started = time.perf_counter()
+                    transitions += len(engine.evaluate(readings))
+                    elapsed += time.perf_counter() - started
+                raise Rollback
+        except Rollback:
+            pass
+
+        count = meters * batches
+        self.stdout.write(f"readings:     {count} ({batches} batches of {meters} meters), {options['rules']} rules")
+        self.stdout.write(f"transitions:  {transitions}")
+        self.stdout.write(self.style.SUCCESS(
+            f"evaluated in {elapsed:.2f} s, {elapsed / count * 1e6:.1f} us/reading, "
+            f"{elapsed / count / options['rules'] * 1e6:.2f} us/reading/rule"
+        ))
@@ -0,0 +1,84 @@
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from meter.models import Meter, MeterDailySketch
+from meter.sketches import COMPRESSION, SKETCH_FIELDS, fleet_percentiles, sketch_rows
+
+from ._bench import Rollback
+
+PERCENTILES = [1, 50, 95, 99]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time folding synthetic readings into daily quantile sketches and a fleet-wide percentile "
+        "query over them, compared with exact percentiles (rolled back afterwards)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meters', type=int, default=100, help="Meters in the fleet")
+        parser.add_argument('--days', type=int, default=30, help="Days of readings per meter")
+        parser.add_argument('--interval', type=int, default=60, help="Seconds between readings")
+        parser.add_argument('--batch', type=int, default=2000, help="Readings per ingest batch")
+
+    def handle(self, *args, **options):
+        meters, days, interval, batch = options['meters'], options['days'], options['interval'], options['batch']
+        per_day = 24 * 60 * 60 // interval
+        start = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        rng = np.random.default_rng(0)
+        field = SKETCH_FIELDS[0]
+        exact = []
+        elapsed = 0.0
+
+        try:
+            with transaction.atomic():
+                pks = [meter.pk for meter in Meter.objects.bulk_create([
+                    Meter(device_id=f'__bench_sketches_{i}__', location='benchmark') for i in range(meters)
+                ])]
+                row = (None,) * (len(SKETCH_FIELDS) - 1)
+                for day in range(days):
+                    # One day of readings from every meter, arriving interleaved
+                    offsets = np.tile(np.arange(per_day) * interval, meters)
+                    owners = np.repeat(pks, per_day)
+                    values = rng.normal(rng.normal(85, 3, meters), 2, (per_day, meters)).T.ravel()
+                    exact.append(values)
+                    order = np.argsort(offsets, kind='stable')
+                    day_start = start + timedelta(days=day)
+                    rows = [
+                        (owners[i], day_start + timedelta(seconds=int(offsets[i])), values[i]) + row
+                        for i in order.tolist()
+                    ]
+                    started = time.perf_counter()
+                    for offset in range(0, len(rows), batch):
+                        sketch_rows(rows[offset:offset + batch])
+                    elapsed += time.perf_counter() - started
+
+                sketches = MeterDailySketch.objects.filter(field=field)
+                stored = sum(len(centroids) for centroids in sketches.values_list('centroids', flat=True))
+                started = time.perf_counter()
+                merged = fleet_percentiles([field], date(2025, 1, 1), date(2025, 1, 1) + timedelta(days=days),
+                                           PERCENTILES)[field]
+                query = time.perf_counter() - started
+                raise Rollback
+        except Rollback:
+            pass
+
+        exact = np.concatenate(exact)
+        started = time.perf_counter()
+        truth = np.percentile(exact, PERCENTILES)
+        sort = time.perf_counter() - started
+        ranks = np.searchsorted(np.sort(exact), [merged['percentiles'][f'p{p:g}'] for p in PERCENTILES]) / len(exact)
+
+        count = len(exact)
+        self.stdout.write(f"readings:     {count} ({meters} meters x {days} days, every {interval} s), compression {COMPRESSION}")
+        self.stdout.write(f"ingest:       {elapsed:.2f} s, {elapsed / count * 1e6:.2f} us/reading in batches of {batch}")
+        self.stdout.write(f"stored:       {meters * days} sketches, {stored / meters / days:.0f} bytes each on average")
+        for p, rank, value, expected in zip(PERCENTILES, ranks, [merged['percentiles'][f'p{p:g}'] for p in PERCENTILES], truth):
+            self.stdout.write(f"p{p:<4g}        {value:9.3f} (exact {expected:9.3f}, rank error {abs(rank - p / 100) * 100:.3f}%)")
+        self.stdout.write(self.style.SUCCESS(
+            f"fleet query in {query * 1000:.0f} ms; exact percentiles of the in-memory values take {sort * 1000:.0f} ms"
+        ))
@@ -0,0 +1,100 @@
+import statistics
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from meter.analytics import describe, load_columns
+from meter.models import Meter
+from meter.queries import readings_in_range
+from meter.serializers import MeterDataSerializer
+
+from ._bench import Rollback, insert_readings
+
+
+FIELDS = ['instantaneous_power_kw', 'fuel_rate_lph', 'coolant_temp_c', 'phase_a_voltage_v', 'phase_a_current_a']
+
+PERCENTILES = [50, 90, 95, 99]
+
+
+def python_stats(columns):
+    """Pure Python count/min/max/mean/stddev/percentiles, as a serializer based report would compute them"""
+    result = {}
+    for field, column in columns.items():
+        column = sorted(value for value in column if value is not None)
+        result[field] = {
+            "count": len(column),
+            "min": column[0],
+            "max": column[-1],
+            "mean": statistics.fmean(column),
+            "stddev": statistics.pstdev(column),
+            "percentiles": {p: column[min(len(column) - 1, int(len(column) * p / 100))] for p in PERCENTILES},
+        }
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare computing range statistics through MeterDataSerializer, through model "
+        "instances and through values_list + NumPy on synthetic rows (rolled back afterwards)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help="Synthetic readings to insert")
+        parser.add_argument('--serializer-rows', type=int, default=20000,
+                            help="Rows timed through the serializer path, which is too slow for the full set")
+
+    def handle(self, *args, **options):
+        count = options['rows']
+        sample = min(options['serializer_rows'], count)
+        start = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        end = start + timedelta(seconds=count)
+        rng = np.random.default_rng(0)
+        columns = {
+            'instantaneous_power_kw': rng.normal(60, 10, count),
+            'fuel_rate_lph': rng.normal(40, 5, count),
+            'coolant_temp_c': rng.integers(70, 95, count),
+            'phase_a_voltage_v': rng.normal(230, 2, count),
+            'phase_a_current_a': rng.normal(100, 8, count),
+        }
+
+        try:
+            with transaction.atomic():
+                meter = Meter.objects.create(device_id='__bench_stats__', location='benchmark')
+                started = time.perf_counter()
+                insert_readings(meter, start, columns)
+                self.stdout.write(f"inserted {count} rows in {time.perf_counter() - started:.1f} s")
+                queryset = readings_in_range(meter.pk, start, end)
+
+                def serializer_path():
+                    data = MeterDataSerializer(queryset[:sample], many=True).data
+                    python_stats({field: [reading[field] for reading in data] for field in FIELDS})
+
+                def instance_path():
+                    instances = list(queryset)
+                    python_stats({field: [getattr(reading, field) for reading in instances] for field in FIELDS})
+
+                def numpy_path():
+                    describe(load_columns(queryset, FIELDS), FIELDS, PERCENTILES)
+
+                serializer = self.time(serializer_path) / sample
+                instances = self.time(instance_path) / count
+                vectorized = self.time(numpy_path) / count
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f"rows:                          {count} ({len(FIELDS)} fields)")
+        self.stdout.write(f"MeterDataSerializer + Python:  {serializer * 1e6:9.2f} us/row ({sample} row sample)")
+        self.stdout.write(f"model instances + Python:      {instances * 1e6:9.2f} us/row  {instances * count:7.2f} s")
+        self.stdout.write(f"values_list + NumPy:           {vectorized * 1e6:9.2f} us/row  {vectorized * count:7.2f} s")
+        self.stdout.write(self.style.SUCCESS(
+            f"speedup: {serializer / vectorized:.1f}x over serializer, {instances / vectorized:.1f}x over instances"
+        ))
+
+    def time(self, func):
+        started = time.perf_counter()
+        func()
+        return time.perf_counter() - started
@@ -0,0 +1,46 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from meter.jobs import REPORT_WORKERS, claim_next, execute
+
+
+class Command(BaseCommand):
+    help = "Build queued report jobs; use with METER_REPORT_EXECUTOR = 'worker'"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=REPORT_WORKERS, help="Jobs built at the same time")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between polls when idle")
+        parser.add_argument('--once', action='store_true', help="Exit once no job is pending")
+
+    def handle(self, *args, **options):
+        threads = [
+            threading.Thread(target=self.work, args=(options['interval'], options['once']), daemon=True)
+            for _ in range(max(1, options['concurrency']))
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(1)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping report worker")
+
+    def work(self, interval, once):
+        try:
+            while True:
+                close_old_connections()
+                job_id = claim_next()
+                if job_id is None:
+                    if once:
+                        return
+                    time.sleep(interval)
+                    continue
+                started = time.perf_counter()
+                execute(job_id)
+                self.stdout.write(f"report job {job_id} finished in {time.perf_counter() - started:.2f} s")
+        finally:
+            connection.close()
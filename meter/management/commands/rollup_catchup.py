@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from meter.models import Meter, MeterData, MeterDataRollup
+from meter.queries import parse_time
+from meter.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild meter data rollups from raw readings. Without --from each meter is "
+        "caught up from the start of its newest daily bucket, or from its first reading."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meter', action='append', dest='meters', default=[],
+                            help="device_id to rebuild; repeat for several, defaults to every meter")
+        parser.add_argument('--from', dest='start', help="Start time (ISO 8601 or epoch seconds)")
+        parser.add_argument('--to', dest='end', help="End time (ISO 8601 or epoch seconds), defaults to now")
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Keep running and catch up again every N seconds")
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_time(options['start']) if options['start'] else None
+            end = parse_time(options['end']) if options['end'] else None
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        meters = Meter.objects.all()
+        if options['meters']:
+            meters = meters.filter(device_id__in=options['meters'])
+            missing = set(options['meters']) - set(meters.values_list('device_id', flat=True))
+            if missing:
+                raise CommandError(f"Unknown meters: {', '.join(sorted(missing))}")
+
+        while True:
+            self.catch_up(meters.values_list('id', 'device_id'), start, end)
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+            close_old_connections()
+
+    def catch_up(self, meters, start, end):
+        total = 0
+        for meter_pk, device_id in meters:
+            meter_start = start or self.resume_point(meter_pk)
+            if meter_start is None:
+                continue
+            read = rebuild(meter_pk, meter_start, end or timezone.now())
+            total += read
+            self.stdout.write(f"{device_id}: {read} readings rolled up from {meter_start.isoformat()}")
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {total} readings"))
+
+    def resume_point(self, meter_pk):
+        newest = (
+            MeterDataRollup.objects.filter(meter_id=meter_pk, resolution='1d')
+            .order_by('-bucket_start').values_list('bucket_start', flat=True).first()
+        )
+        if newest is not None:
+            return newest
+        return (
+            MeterData.objects.filter(meter_id=meter_pk)
+            .order_by('timestamp').values_list('timestamp', flat=True).first()
+        )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from meter.models import Meter
+from meter.sketches import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily quantile sketches from raw readings, for readings "
+        "written before sketching was enabled or after METER_SKETCH_FIELDS changed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meter', action='append', dest='meters', default=[],
+                            help="device_id to rebuild; repeat for several, defaults to every meter")
+
+    def handle(self, *args, **options):
+        meters = Meter.objects.all()
+        if options['meters']:
+            meters = meters.filter(device_id__in=options['meters'])
+            missing = set(options['meters']) - set(meters.values_list('device_id', flat=True))
+            if missing:
+                raise CommandError(f"Unknown meters: {', '.join(sorted(missing))}")
+
+        total = 0
+        for meter_pk, device_id in meters.values_list('id', 'device_id'):
+            with transaction.atomic():
+                read = rebuild(meter_pk)
+            total += read
+            self.stdout.write(f"{device_id}: {read} readings sketched")
+        self.stdout.write(self.style.SUCCESS(f"Sketched {total} readings"))
@@ -0,0 +1,89 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from meter.spool import (
+    QUARANTINE_DIR, SPOOL_DIR, SEALED, discard_segment, is_locked, list_segments, read_segment, recover,
+    replay_segment,
+)
+
+
+class Command(BaseCommand):
+    help = "Inspect, replay or truncate the on-disk meter data ingest spool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['inspect', 'replay', 'truncate'])
+        parser.add_argument('segments', nargs='*', help="Segment file names; defaults to every sealed segment")
+        parser.add_argument('--dir', default=SPOOL_DIR, help="Spool directory")
+
+    def handle(self, *args, **options):
+        directory = options['dir']
+        getattr(self, options['action'])(directory, options['segments'])
+
+    def inspect(self, directory, names):
+        segments = [(directory, segment['name'], segment) for segment in list_segments(directory)]
+        quarantine_dir = os.path.join(directory, QUARANTINE_DIR)
+        segments += [
+            (quarantine_dir, os.path.join(QUARANTINE_DIR, segment['name']), dict(segment, state='quarantined'))
+            for segment in list_segments(quarantine_dir)
+        ]
+        if names:
+            segments = [entry for entry in segments if entry[1] in names or entry[2]['name'] in names]
+        if not segments:
+            self.stdout.write(f"No spool segments in {directory}")
+            return
+        for parent, name, segment in segments:
+            path = os.path.join(parent, segment['name'])
+            payloads, torn = read_segment(path)
+            line = f"{name:80} {segment['state']:11} {os.path.getsize(path):>12} bytes {len(payloads):>8} records"
+            if segment['state'] != 'quarantined':
+                owner = "alive" if is_locked(path) else "gone"
+                line += f"  owner {segment['owner']} ({owner})"
+            if torn:
+                line += f"  torn tail {torn} bytes"
+            self.stdout.write(line)
+
+    def replay(self, directory, names):
+        recover(directory)
+        sealed = [s['name'] for s in list_segments(directory) if s['state'] == SEALED]
+        if names:
+            missing = set(names) - set(sealed)
+            if missing:
+                raise CommandError(f"Not sealed or not found: {', '.join(sorted(missing))}")
+            sealed = [name for name in sealed if name in names]
+        total = 0
+        quarantined = []
+        for name in sealed:
+            result = replay_segment(name, directory)
+            if result is None:
+                self.stdout.write(f"{name}: claimed by another process, skipped")
+                continue
+            if result.already_replayed:
+                self.stdout.write(f"{name}: already replayed, discarded")
+                continue
+            total += result.written
+            line = f"{name}: {result.written} rows replayed"
+            if result.quarantined:
+                quarantined.append(result.quarantined)
+                line += f", {result.rejected} records quarantined in {result.quarantined}"
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(f"Replayed {total} rows from {len(sealed)} segments"))
+        if quarantined:
+            self.stdout.write(self.style.WARNING(
+                f"Quarantined {len(quarantined)} segments under {os.path.join(directory, QUARANTINE_DIR)}"
+            ))
+
+    def truncate(self, directory, names):
+        """Discard segments without loading them"""
+        recover(directory)
+        sealed = [s['name'] for s in list_segments(directory) if s['state'] == SEALED]
+        if names:
+            sealed = [name for name in sealed if name in names]
+        removed = 0
+        for name in sealed:
+            if not discard_segment(name, directory):
+                self.stdout.write(f"{name}: claimed by another process, skipped")
+                continue
+            removed += 1
+            self.stdout.write(f"{name}: removed")
+        self.stdout.write(self.style.SUCCESS(f"Removed {removed} segments"))
@@ -0,0 +1,118 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter', '0007_alter_meterdata_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meterdata',
+            name='avg_current',
+            field=models.FloatField(blank=True, help_text='Average current', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='avg_ll_volt',
+            field=models.FloatField(blank=True, help_text='Average line-to-line voltage', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='avg_ln_volt',
+            field=models.FloatField(blank=True, help_text='Average line-to-neutral voltage', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='gc_status',
+            field=models.CharField(blank=True, help_text='GC status', max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='gen_breaker',
+            field=models.CharField(blank=True, help_text='Generator breaker status', max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='phase_a_apparent_power',
+            field=models.FloatField(blank=True, help_text='Phase A apparent power', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='phase_a_frequency_hz',
+            field=models.FloatField(blank=True, help_text='Phase A frequency', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='phase_a_reactive_power',
+            field=models.FloatField(blank=True, help_text='Phase A reactive power', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='phase_a_real_power',
+            field=models.FloatField(blank=True, help_text='Phase A real power', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='phase_a_voltage_ll',
+            field=models.FloatField(blank=True, help_text='Phase A line-to-line voltage', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='phase_b_apparent_power',
+            field=models.FloatField(blank=True, help_text='Phase B apparent power', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='phase_b_frequency_hz',
+            field=models.FloatField(blank=True, help_text='Phase B frequency', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='phase_b_reactive_power',
+            field=models.FloatField(blank=True, help_text='Phase B reactive power', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='phase_b_real_power',
+            field=models.FloatField(blank=True, help_text='Phase B real power', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='phase_b_voltage_ll',
+            field=models.FloatField(blank=True, help_text='Phase B line-to-line voltage', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='phase_c_apparent_power',
+            field=models.FloatField(blank=True, help_text='Phase C apparent power', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='phase_c_frequency_hz',
+            field=models.FloatField(blank=True, help_text='Phase C frequency', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='phase_c_reactive_power',
+            field=models.FloatField(blank=True, help_text='Phase C reactive power', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='phase_c_real_power',
+            field=models.FloatField(blank=True, help_text='Phase C real power', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='phase_c_voltage_ll',
+            field=models.FloatField(blank=True, help_text='Phase C line-to-line voltage', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='util_breaker',
+            field=models.CharField(blank=True, help_text='Utility breaker status', max_length=20, null=True),
+        ),
+    ]
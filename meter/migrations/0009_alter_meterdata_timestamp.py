@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter', '0008_meterdata_phase_details'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='meterdata',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
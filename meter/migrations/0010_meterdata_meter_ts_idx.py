@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter', '0009_alter_meterdata_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='meterdata',
+            index=models.Index(fields=['meter', 'timestamp'], name='meterdata_meter_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter', '0010_meterdata_meter_ts_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='meterdata',
+            index=models.Index(fields=['timestamp', 'id'], name='meterdata_ts_id_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 15:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_latest(apps, schema_editor):
+    """Seed one snapshot per meter from its newest existing reading"""
+    MeterData = apps.get_model('meter', 'MeterData')
+    MeterLatest = apps.get_model('meter', 'MeterLatest')
+    snapshots = []
+    for meter_id in MeterData.objects.order_by().values_list('meter_id', flat=True).distinct():
+        data = MeterData.objects.filter(meter_id=meter_id).order_by('-timestamp', '-id').first()
+        snapshots.append(MeterLatest(meter_id=meter_id, data_id=data.id, timestamp=data.timestamp))
+    MeterLatest.objects.bulk_create(snapshots, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter', '0011_meterdata_ts_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeterLatest',
+            fields=[
+                ('meter', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='latest', serialize=False, to='meter.meter')),
+                ('timestamp', models.DateTimeField()),
+                ('data', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='meter.meterdata')),
+            ],
+            options={
+                'verbose_name': 'Meter Latest',
+                'verbose_name_plural': 'Meter Latest',
+            },
+        ),
+        migrations.RunPython(backfill_latest, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 16:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter', '0012_meterlatest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeterDataRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('1m', '1 minute'), ('15m', '15 minutes'), ('1h', '1 hour'), ('1d', '1 day')], max_length=3)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('last_timestamp', models.DateTimeField(help_text='Timestamp of the newest reading in the bucket')),
+                ('stats', models.JSONField(default=dict)),
+                ('meter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='meter.meter')),
+            ],
+            options={
+                'ordering': ['bucket_start'],
+                'unique_together': {('meter', 'resolution', 'bucket_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter', '0014_reportjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reportjob',
+            name='report_type',
+            field=models.CharField(choices=[('meter', 'Meter data report'), ('alarm', 'Alarm report'), ('fleet', 'Fleet report')], max_length=20),
+        ),
+    ]
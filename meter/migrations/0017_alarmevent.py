@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+ALARM_FIELDS = [
+    'alarm_emergency_stop',
+    'alarm_low_oil_pressure',
+    'alarm_high_coolant_temp',
+    'alarm_low_coolant_level',
+    'alarm_crank_failure',
+]
+
+
+def fill_snapshot_alarms(apps, schema_editor):
+    """Seed each snapshot's alarm bitmask from the reading it points at"""
+    MeterLatest = apps.get_model('meter', 'MeterLatest')
+    snapshots = list(MeterLatest.objects.select_related('data'))
+    for snapshot in snapshots:
+        snapshot.alarms = sum(
+            1 << bit for bit, field in enumerate(ALARM_FIELDS) if getattr(snapshot.data, field)
+        )
+    MeterLatest.objects.bulk_update(snapshots, ['alarms'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter', '0016_reportjob_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meterlatest',
+            name='alarms',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='AlarmEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alarm', models.CharField(choices=[('alarm_emergency_stop', 'Emergency Stop'), ('alarm_low_oil_pressure', 'Low Oil Pressure'), ('alarm_high_coolant_temp', 'High Coolant Temp'), ('alarm_low_coolant_level', 'Low Coolant Level'), ('alarm_crank_failure', 'Crank Failure')], max_length=32)),
+                ('raised_at', models.DateTimeField()),
+                ('cleared_at', models.DateTimeField(blank=True, null=True)),
+                ('meter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alarm_events', to='meter.meter')),
+            ],
+            options={
+                'ordering': ['raised_at'],
+                'indexes': [models.Index(fields=['meter', 'raised_at'], name='alarmevent_meter_raised_idx'), models.Index(fields=['meter', 'alarm', 'cleared_at'], name='alarmevent_open_idx')],
+            },
+        ),
+        migrations.RunPython(fill_snapshot_alarms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter', '0017_alarmevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alarmevent',
+            name='alarm',
+            field=models.CharField(choices=[('alarm_emergency_stop', 'Emergency Stop'), ('alarm_low_oil_pressure', 'Low Oil Pressure'), ('alarm_high_coolant_temp', 'High Coolant Temp'), ('alarm_low_coolant_level', 'Low Coolant Level'), ('alarm_crank_failure', 'Crank Failure'), ('rule', 'Alarm Rule')], max_length=32),
+        ),
+        migrations.CreateModel(
+            name='AlarmRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('field', models.CharField(max_length=64)),
+                ('operator', models.CharField(choices=[('>', 'Greater than'), ('>=', 'Greater than or equal'), ('<', 'Less than'), ('<=', 'Less than or equal')], max_length=2)),
+                ('threshold', models.FloatField()),
+                ('duration_seconds', models.PositiveIntegerField(default=0)),
+                ('enabled', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('meter', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alarm_rules', to='meter.meter')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='alarmevent',
+            name='rule',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='events', to='meter.alarmrule'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter', '0018_alarmrule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeterTotalizer',
+            fields=[
+                ('meter', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='totalizer', serialize=False, to='meter.meter')),
+                ('timestamp', models.DateTimeField(help_text='Timestamp of the newest reading integrated')),
+                ('power_kw', models.FloatField(help_text='Instantaneous power of that reading')),
+                ('fuel_rate_lph', models.FloatField(help_text='Fuel rate of that reading')),
+                ('energy_kwh', models.FloatField(default=0)),
+                ('fuel_l', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MeterDailyTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('energy_kwh', models.FloatField(default=0)),
+                ('fuel_l', models.FloatField(default=0)),
+                ('meter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_totals', to='meter.meter')),
+            ],
+            options={
+                'ordering': ['day'],
+                'unique_together': {('meter', 'day')},
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:46
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Abs, Greatest, NullIf
+
+PHASES = ('a', 'b', 'c')
+
+
+def phase_sum(quantity):
+    return F(f'phase_a_{quantity}') + F(f'phase_b_{quantity}') + F(f'phase_c_{quantity}')
+
+
+def imbalance_pct(quantity):
+    """Largest deviation of a phase from the three phase mean, in percent of the mean; NULL at a zero mean"""
+    mean = phase_sum(quantity) / Value(3.0)
+    deviation = Greatest(*(Abs(F(f'phase_{phase}_{quantity}') - mean) for phase in PHASES))
+    return deviation * Value(100.0) / NullIf(mean, Value(0.0))
+
+
+def backfill_power_quality(apps, schema_editor):
+    """Fill the derived columns of existing readings in one UPDATE, with the formulas ingest uses"""
+    MeterData = apps.get_model('meter', 'MeterData')
+    MeterData.objects.update(
+        total_real_power=phase_sum('real_power'),
+        total_apparent_power=phase_sum('apparent_power'),
+        total_reactive_power=phase_sum('reactive_power'),
+        power_factor=phase_sum('real_power') / NullIf(phase_sum('apparent_power'), Value(0.0), output_field=FloatField()),
+        voltage_imbalance_pct=imbalance_pct('voltage_v'),
+        current_imbalance_pct=imbalance_pct('current_a'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter', '0019_totalizers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meterdata',
+            name='current_imbalance_pct',
+            field=models.FloatField(blank=True, help_text='Largest phase current deviation from the mean, in percent', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='power_factor',
+            field=models.FloatField(blank=True, help_text='Total real power over total apparent power', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='total_apparent_power',
+            field=models.FloatField(blank=True, help_text='Sum of the phase apparent powers', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='total_reactive_power',
+            field=models.FloatField(blank=True, help_text='Sum of the phase reactive powers', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='total_real_power',
+            field=models.FloatField(blank=True, help_text='Sum of the phase real powers', null=True),
+        ),
+        migrations.AddField(
+            model_name='meterdata',
+            name='voltage_imbalance_pct',
+            field=models.FloatField(blank=True, help_text='Largest phase voltage deviation from the mean, in percent', null=True),
+        ),
+        migrations.RunPython(backfill_power_quality, migrations.RunPython.noop),
+    ]
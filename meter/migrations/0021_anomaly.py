@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter', '0020_power_quality'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Anomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('field', models.CharField(max_length=64)),
+                ('value', models.FloatField()),
+                ('mean', models.FloatField()),
+                ('stddev', models.FloatField()),
+                ('zscore', models.FloatField()),
+                ('meter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='meter.meter')),
+            ],
+            options={
+                'verbose_name_plural': 'Anomalies',
+                'ordering': ['timestamp'],
+                'indexes': [models.Index(fields=['meter', 'timestamp'], name='anomaly_meter_ts_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter', '0021_anomaly'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MeterDailySketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('field', models.CharField(max_length=64)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('minimum', models.FloatField()),
+                ('maximum', models.FloatField()),
+                ('centroids', models.BinaryField()),
+                ('meter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sketches', to='meter.meter')),
+            ],
+            options={
+                'ordering': ['day'],
+                'indexes': [models.Index(fields=['day', 'field'], name='dailysketch_day_field_idx')],
+                'unique_together': {('meter', 'day', 'field')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meter', '0022_daily_sketch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpoolReplay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segment', models.CharField(max_length=96, unique=True)),
+                ('rows', models.PositiveIntegerField(default=0)),
+                ('rejected', models.PositiveIntegerField(default=0)),
+                ('replayed_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
@@ -1,5 +1,8 @@
+import uuid
+
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from accounts.models import User
 
 
@@ -71,7 +74,7 @@ class MeterAssignment(models.Model):
 class MeterData(models.Model):
     id = models.AutoField(primary_key=True)
     meter = models.ForeignKey(Meter, on_delete=models.CASCADE, related_name='data_points')
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
 
     # Basic meter data
     engine_hours = models.FloatField()
@@ -110,6 +113,16 @@ class MeterData(models.Model):
     phase_c_apparent_power = models.FloatField(null=True, blank=True, help_text="Phase C apparent power")
     phase_c_reactive_power = models.FloatField(null=True, blank=True, help_text="Phase C reactive power")
 
+    # Power quality, derived from the phase data at ingest (see meter/power_quality.py)
+    total_real_power = models.FloatField(null=True, blank=True, help_text="Sum of the phase real powers")
+    total_apparent_power = models.FloatField(null=True, blank=True, help_text="Sum of the phase apparent powers")
+    total_reactive_power = models.FloatField(null=True, blank=True, help_text="Sum of the phase reactive powers")
+    power_factor = models.FloatField(null=True, blank=True, help_text="Total real power over total apparent power")
+    voltage_imbalance_pct = models.FloatField(null=True, blank=True,
+                                              help_text="Largest phase voltage deviation from the mean, in percent")
+    current_imbalance_pct = models.FloatField(null=True, blank=True,
+                                              help_text="Largest phase current deviation from the mean, in percent")
+
     # Breaker statuses
     gen_breaker = models.CharField(max_length=20, null=True, blank=True, help_text="Generator breaker status")
     util_breaker = models.CharField(max_length=20, null=True, blank=True, help_text="Utility breaker status")
@@ -141,6 +154,270 @@ class MeterData(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Serves every per-meter time-ordered read as an index range scan
+            models.Index(fields=['meter', 'timestamp'], name='meterdata_meter_ts_idx'),
+            # Serves keyset pagination over the whole table
+            models.Index(fields=['timestamp', 'id'], name='meterdata_ts_id_idx'),
+        ]
         verbose_name = "Meter Data"
         verbose_name_plural = "Meter Data"
 
+
+
+class MeterLatest(models.Model):
+    """
+    The newest reading of each meter, upserted by ingest so fleet-wide
+    "current state" reads need a single query instead of one per meter.
+    """
+    meter = models.OneToOneField(Meter, on_delete=models.CASCADE, primary_key=True, related_name='latest')
+    data = models.ForeignKey(MeterData, on_delete=models.CASCADE, related_name='+')
+    timestamp = models.DateTimeField()
+    # Bitmask of the alarms set on ``data``; ingest compares new readings against it (see meter/alarms.py)
+    alarms = models.PositiveSmallIntegerField(default=0)
+
+    def __str__(self):
+        return f"Latest for {self.meter_id} at {self.timestamp}"
+
+    class Meta:
+        verbose_name = "Meter Latest"
+        verbose_name_plural = "Meter Latest"
+
+
+class MeterTotalizer(models.Model):
+    """
+    Running energy and fuel counters of a meter, advanced by ingest with
+    trapezoidal integration from the newest reading integrated so far
+    (see meter/totalizers.py).
+    """
+    meter = models.OneToOneField(Meter, on_delete=models.CASCADE, primary_key=True, related_name='totalizer')
+    timestamp = models.DateTimeField(help_text="Timestamp of the newest reading integrated")
+    power_kw = models.FloatField(help_text="Instantaneous power of that reading")
+    fuel_rate_lph = models.FloatField(help_text="Fuel rate of that reading")
+    energy_kwh = models.FloatField(default=0)
+    fuel_l = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"Totalizer for {self.meter_id}: {self.energy_kwh:.1f} kWh, {self.fuel_l:.1f} L"
+
+
+class MeterDailyTotal(models.Model):
+    """Energy and fuel integrated for one meter over one UTC day"""
+    meter = models.ForeignKey(Meter, on_delete=models.CASCADE, related_name='daily_totals')
+    day = models.DateField()
+    energy_kwh = models.FloatField(default=0)
+    fuel_l = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"{self.meter_id} totals on {self.day}"
+
+    class Meta:
+        unique_together = ('meter', 'day')
+        ordering = ['day']
+
+
+class MeterDailySketch(models.Model):
+    """
+    t-digest of one field of one meter over one UTC day (see meter/sketches.py).
+    ``centroids`` holds float64 centroid means followed by their float32 weights.
+    """
+    meter = models.ForeignKey(Meter, on_delete=models.CASCADE, related_name='daily_sketches')
+    day = models.DateField()
+    field = models.CharField(max_length=64)
+    count = models.PositiveIntegerField(default=0)
+    minimum = models.FloatField()
+    maximum = models.FloatField()
+    centroids = models.BinaryField()
+
+    def __str__(self):
+        return f"{self.field} sketch of {self.meter_id} on {self.day}"
+
+    class Meta:
+        unique_together = ('meter', 'day', 'field')
+        ordering = ['day']
+        indexes = [
+            models.Index(fields=['day', 'field'], name='dailysketch_day_field_idx'),
+        ]
+
+
+class Anomaly(models.Model):
+    """
+    A reading whose value was far from the meter's recent behaviour,
+    flagged by ingest against rolling statistics (see meter/anomalies.py).
+    ``mean`` and ``stddev`` are the statistics the reading was scored against.
+    """
+    meter = models.ForeignKey(Meter, on_delete=models.CASCADE, related_name='anomalies')
+    timestamp = models.DateTimeField()
+    field = models.CharField(max_length=64)
+    value = models.FloatField()
+    mean = models.FloatField()
+    stddev = models.FloatField()
+    zscore = models.FloatField()
+
+    def __str__(self):
+        return f"{self.field} anomaly on {self.meter_id} at {self.timestamp} (z={self.zscore:.1f})"
+
+    class Meta:
+        ordering = ['timestamp']
+        indexes = [
+            models.Index(fields=['meter', 'timestamp'], name='anomaly_meter_ts_idx'),
+        ]
+        verbose_name_plural = "Anomalies"
+
+
+class MeterDataRollup(models.Model):
+    """
+    Per-meter aggregates of MeterData over fixed time buckets.
+
+    ``stats`` maps each rolled-up field to ``[min, max, sum, count, last]``
+    where count is the number of readings that carried the field. Rows are maintained incrementally by ingest
+    and can be rebuilt with the ``rollup_catchup`` management command.
+    """
+    RESOLUTION_CHOICES = [
+        ('1m', '1 minute'),
+        ('15m', '15 minutes'),
+        ('1h', '1 hour'),
+        ('1d', '1 day'),
+    ]
+
+    meter = models.ForeignKey(Meter, on_delete=models.CASCADE, related_name='rollups')
+    resolution = models.CharField(max_length=3, choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField()
+    count = models.IntegerField(default=0)
+    last_timestamp = models.DateTimeField(help_text="Timestamp of the newest reading in the bucket")
+    stats = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"{self.meter_id} {self.resolution} rollup at {self.bucket_start}"
+
+    class Meta:
+        unique_together = ('meter', 'resolution', 'bucket_start')
+        ordering = ['bucket_start']
+
+
+class ReportJob(models.Model):
+    """
+    A report requested through the API. The request only records the job;
+    the background report executor (see meter/jobs.py) builds the file and
+    moves the job to SUCCEEDED or FAILED. Requests with the same
+    fingerprint reuse the job and its file until the file is evicted
+    (see meter/retention.py), which moves the job to EXPIRED.
+    """
+    REPORT_TYPES = [
+        ('meter', 'Meter data report'),
+        ('alarm', 'Alarm report'),
+        ('fleet', 'Fleet report'),
+    ]
+
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+        ('EXPIRED', 'Expired'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    report_type = models.CharField(max_length=20, choices=REPORT_TYPES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    meter = models.ForeignKey(Meter, on_delete=models.CASCADE, null=True, blank=True, related_name='report_jobs')
+    params = models.JSONField(default=dict, blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='report_jobs')
+    filename = models.CharField(max_length=255, blank=True)
+    fingerprint = models.CharField(max_length=64, blank=True, db_index=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_used_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.report_type} report job {self.id} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Serves the worker's oldest-pending-first poll
+            models.Index(fields=['status', 'created_at'], name='reportjob_status_idx'),
+        ]
+
+
+class AlarmRule(models.Model):
+    """
+    A server-side alert condition such as ``coolant_temp_c > 105`` held for
+    ``duration_seconds``, evaluated over every ingest batch (see
+    meter/rules.py). A rule without a meter applies to every meter.
+    """
+    OPERATOR_CHOICES = [
+        ('>', 'Greater than'),
+        ('>=', 'Greater than or equal'),
+        ('<', 'Less than'),
+        ('<=', 'Less than or equal'),
+    ]
+
+    name = models.CharField(max_length=100)
+    meter = models.ForeignKey(Meter, on_delete=models.CASCADE, null=True, blank=True, related_name='alarm_rules')
+    field = models.CharField(max_length=64)
+    operator = models.CharField(max_length=2, choices=OPERATOR_CHOICES)
+    threshold = models.FloatField()
+    # The condition must hold this long before an alert is raised
+    duration_seconds = models.PositiveIntegerField(default=0)
+    enabled = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.field} {self.operator} {self.threshold} for {self.duration_seconds}s"
+
+
+class AlarmEvent(models.Model):
+    """
+    One period during which an alarm was active on a meter: a device alarm
+    flag (see meter/alarms.py) or a server-side AlarmRule (see
+    meter/rules.py). Ingest writes a row when the alarm is raised and sets
+    ``cleared_at`` when it clears; ``cleared_at`` is null while it is active.
+    """
+    # Alarm flags reported by the devices
+    ALARM_CHOICES = [
+        ('alarm_emergency_stop', 'Emergency Stop'),
+        ('alarm_low_oil_pressure', 'Low Oil Pressure'),
+        ('alarm_high_coolant_temp', 'High Coolant Temp'),
+        ('alarm_low_coolant_level', 'Low Coolant Level'),
+        ('alarm_crank_failure', 'Crank Failure'),
+    ]
+
+    RULE = 'rule'
+
+    meter = models.ForeignKey(Meter, on_delete=models.CASCADE, related_name='alarm_events')
+    alarm = models.CharField(max_length=32, choices=ALARM_CHOICES + [(RULE, 'Alarm Rule')])
+    # Set when ``alarm`` is RULE
+    rule = models.ForeignKey(AlarmRule, on_delete=models.CASCADE, null=True, blank=True, related_name='events')
+    raised_at = models.DateTimeField()
+    cleared_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.alarm} on {self.meter_id} from {self.raised_at} to {self.cleared_at or 'now'}"
+
+    class Meta:
+        ordering = ['raised_at']
+        indexes = [
+            # Serves one meter's alarm history over a time range
+            models.Index(fields=['meter', 'raised_at'], name='alarmevent_meter_raised_idx'),
+            # Serves finding the open event of an alarm that just cleared
+            models.Index(fields=['meter', 'alarm', 'cleared_at'], name='alarmevent_open_idx'),
+        ]
+
+
+class SpoolReplay(models.Model):
+    """
+    A spool segment whose rows were committed to MeterData, recorded in the
+    same transaction so a segment loaded again after a crash is skipped
+    (see meter/spool.py)
+    """
+    segment = models.CharField(max_length=96, unique=True)
+    rows = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    replayed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Spool segment {self.segment} ({self.rows} rows)"
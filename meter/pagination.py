@@ -0,0 +1,87 @@
+"""
+Keyset (cursor) pagination over MeterData, newest first.
+
+Pages are ordered by (timestamp, id) descending and a cursor records the
+(timestamp, id) of the row at the page edge. The next page is fetched with
+a ``WHERE (timestamp, id) < cursor`` condition rather than OFFSET, so every
+page costs the same index seek no matter how deep into the table it is.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# Rows per page when the client does not ask for a size, and the most allowed
+DEFAULT_PAGE_SIZE = getattr(settings, 'METER_DATA_PAGE_SIZE', 100)
+MAX_PAGE_SIZE = getattr(settings, 'METER_DATA_MAX_PAGE_SIZE', 1000)
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded"""
+
+
+def encode_cursor(row, reverse):
+    payload = json.dumps({'t': row['timestamp'].isoformat(), 'i': row['id'], 'r': int(reverse)})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(timestamp, id, reverse)`` from an opaque cursor string"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        timestamp = parse_datetime(payload['t'])
+        pk = int(payload['i'])
+        # Ids outside a 64-bit column would only fail once the query runs
+        if timestamp is None or not 0 <= pk < 2 ** 63:
+            raise ValueError
+        return timestamp, pk, bool(payload['r'])
+    except (ValueError, TypeError, KeyError, OverflowError):
+        raise InvalidCursor("Invalid cursor")
+
+
+def page_size_from(params):
+    try:
+        size = int(params.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("page_size must be an integer")
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def paginate(queryset, fields, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Return ``(rows, next_cursor, previous_cursor)`` for one page of ``queryset``.
+
+    ``fields`` are passed to ``values()`` and must include ``id`` and
+    ``timestamp``. A next cursor walks towards older rows, a previous
+    cursor towards newer ones; either is None at the end of the data.
+    """
+    reverse = False
+    if cursor:
+        timestamp, pk, reverse = decode_cursor(cursor)
+        if reverse:
+            # Rows newer than the cursor; the first condition keeps it an index range
+            queryset = queryset.filter(timestamp__gte=timestamp).filter(Q(timestamp__gt=timestamp) | Q(id__gt=pk))
+        else:
+            queryset = queryset.filter(timestamp__lte=timestamp).filter(Q(timestamp__lt=timestamp) | Q(id__lt=pk))
+
+    ordering = ('timestamp', 'id') if reverse else ('-timestamp', '-id')
+    rows = list(queryset.order_by(*ordering).values(*fields)[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if reverse:
+        rows.reverse()
+
+    if not rows:
+        return rows, None, None
+
+    if reverse:
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, cursor is not None
+
+    next_cursor = encode_cursor(rows[-1], reverse=False) if has_next else None
+    previous_cursor = encode_cursor(rows[0], reverse=True) if has_previous else None
+    return rows, next_cursor, previous_cursor
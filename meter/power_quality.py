@@ -0,0 +1,73 @@
+"""
+Power-quality metrics derived from the per-phase MeterData columns.
+
+Ingest computes them once per chunk with NumPy and stores them in their
+own nullable MeterData columns, so range, stats, report and rule consumers
+read them like any other field instead of recomputing them per row. A
+metric is NULL when one of its inputs is missing or it is undefined, such
+as the power factor at zero apparent power. Rows written before the
+columns existed were backfilled with the same formulas in SQL by the
+migration that added them.
+"""
+import numpy as np
+
+PHASES = ('a', 'b', 'c')
+
+# Stored derived columns, in report order
+DERIVED_FIELDS = [
+    'total_real_power',
+    'total_apparent_power',
+    'total_reactive_power',
+    'power_factor',
+    'voltage_imbalance_pct',
+    'current_imbalance_pct',
+]
+
+# Per-phase columns the metrics are computed from
+SOURCE_FIELDS = [
+    f'phase_{phase}_{quantity}'
+    for quantity in ('real_power', 'apparent_power', 'reactive_power', 'voltage_v', 'current_a')
+    for phase in PHASES
+]
+
+
+def imbalance_pct(phases):
+    """Largest deviation of a phase from the three phase mean, as a percentage of that mean (NEMA MG 1)"""
+    mean = phases.mean(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.abs(phases - mean).max(axis=0) / mean * 100
+
+
+def derive(columns):
+    """Derived metric arrays from ``{source field: float64 array}``; undefined values are NaN"""
+    def phases(quantity):
+        return np.stack([columns[f'phase_{phase}_{quantity}'] for phase in PHASES])
+
+    real = phases('real_power').sum(axis=0)
+    apparent = phases('apparent_power').sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        power_factor = np.where(apparent != 0, real / apparent, np.nan)
+    return {
+        'total_real_power': real,
+        'total_apparent_power': apparent,
+        'total_reactive_power': phases('reactive_power').sum(axis=0),
+        'power_factor': power_factor,
+        'voltage_imbalance_pct': imbalance_pct(phases('voltage_v')),
+        'current_imbalance_pct': imbalance_pct(phases('current_a')),
+    }
+
+
+def derive_rows(rows):
+    """Add the derived metrics to validated MeterData row dicts in place"""
+    if not rows:
+        return rows
+    columns = {
+        field: np.array([row.get(field) for row in rows], dtype=np.float64)
+        for field in SOURCE_FIELDS
+    }
+    for field, values in derive(columns).items():
+        # Infinite ratios come from zero means and are as undefined as NaN
+        values = np.where(np.isfinite(values), values, np.nan).tolist()
+        for row, value in zip(rows, values):
+            row[field] = None if value != value else value
+    return rows
@@ -1,12 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import MeterDataViewSet, GenerateAlarmReport, GenerateMeterReport
+from .views import MeterDataViewSet, GenerateAlarmReport, GenerateMeterReport, GenerateFleetReport
 
 # Router for public-accessible endpoints
 router = DefaultRouter()
 router.register(r'meter-data', MeterDataViewSet, basename='public-meter-data')
 router.register(r'meter-report', GenerateMeterReport, basename='public-meter-report')
 router.register(r'meter-alarm-report', GenerateAlarmReport, basename='public-meter-alarm-report')
+router.register(r'fleet-report', GenerateFleetReport, basename='public-fleet-report')
 
 urlpatterns = [
     path('', include(router.urls)),
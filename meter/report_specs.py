@@ -0,0 +1,150 @@
+"""
+What each report contains: its columns, the fields a client may select and
+the fingerprint that identifies a built report. Kept apart from
+meter/reports.py so views and the job queue can use it without importing
+pandas and xlsxwriter.
+"""
+import hashlib
+import json
+
+from django.db.models import Count, Max
+
+from .models import MeterLatest
+from .queries import fleet_readings_in_range, latest_reading, parse_time, readings_in_range
+
+# Bump whenever a report's layout changes so files built with the old layout stop being reused
+TEMPLATE_VERSION = 3
+
+# (field, column label) in meter data report order
+METER_REPORT_COLUMNS = [
+    # Basic meter data
+    ('engine_hours', 'Engine Hours'),
+    ('frequency_hz', 'Frequency (Hz)'),
+    ('power_percentage', 'Power (%)'),
+    # Average readings
+    ('avg_ll_volt', 'Avg Line-to-Line Voltage'),
+    ('avg_ln_volt', 'Avg Line-to-Neutral Voltage'),
+    ('avg_current', 'Avg Current'),
+] + [
+    # Phase A, B and C data
+    (f'phase_{phase}_{key}', f'Phase {phase.upper()} {label}')
+    for phase in ('a', 'b', 'c')
+    for key, label in (
+        ('voltage_v', 'Voltage (V)'),
+        ('current_a', 'Current (A)'),
+        ('voltage_ll', 'Voltage Line-to-Line'),
+        ('frequency_hz', 'Frequency (Hz)'),
+        ('real_power', 'Real Power'),
+        ('apparent_power', 'Apparent Power'),
+        ('reactive_power', 'Reactive Power'),
+    )
+] + [
+    # Power quality
+    ('total_real_power', 'Total Real Power'),
+    ('total_apparent_power', 'Total Apparent Power'),
+    ('total_reactive_power', 'Total Reactive Power'),
+    ('power_factor', 'Power Factor'),
+    ('voltage_imbalance_pct', 'Voltage Imbalance (%)'),
+    ('current_imbalance_pct', 'Current Imbalance (%)'),
+    # Breaker statuses
+    ('gen_breaker', 'Generator Breaker'),
+    ('util_breaker', 'Utility Breaker'),
+    ('gc_status', 'GC Status'),
+    # Temperature and pressure
+    ('coolant_temp_c', 'Coolant Temp (°C)'),
+    ('oil_temp_c', 'Oil Temp (°C)'),
+    ('intake_air_temp_c', 'Intake Air Temp (°C)'),
+    ('oil_pressure_kpa', 'Oil Pressure (kPa)'),
+    ('boost_pressure_kpa', 'Boost Pressure (kPa)'),
+    # Fuel metrics
+    ('fuel_level_percent', 'Fuel Level (%)'),
+    ('fuel_rate_lph', 'Fuel Rate (L/h)'),
+    # Others
+    ('rpm', 'RPM'),
+    ('battery_voltage_v', 'Battery Voltage (V)'),
+    ('instantaneous_power_kw', 'Instantaneous Power (kW)'),
+    # Alarms
+    ('alarm_emergency_stop', 'Emergency Stop'),
+    ('alarm_low_oil_pressure', 'Low Oil Pressure'),
+    ('alarm_high_coolant_temp', 'High Coolant Temp'),
+    ('alarm_low_coolant_level', 'Low Coolant Level'),
+    ('alarm_crank_failure', 'Crank Failure'),
+]
+
+# (field, column label) in alarm report order
+ALARM_REPORT_COLUMNS = [
+    ('alarm_emergency_stop', 'Emergency Stop'),
+    ('alarm_low_oil_pressure', 'Low Oil Pressure'),
+    ('alarm_high_coolant_temp', 'High Coolant Temp'),
+    ('alarm_low_coolant_level', 'Low Coolant Level'),
+    ('alarm_crank_failure', 'Crank Failure'),
+    ('coolant_temp_c', 'Coolant Temp (°C)'),
+    ('oil_pressure_kpa', 'Oil Pressure (kPa)'),
+    ('engine_hours', 'Engine Hours'),
+    ('fuel_level_percent', 'Fuel Level (%)'),
+]
+
+REPORT_COLUMNS = {
+    'meter': METER_REPORT_COLUMNS,
+    'alarm': ALARM_REPORT_COLUMNS,
+    'fleet': METER_REPORT_COLUMNS,
+}
+
+REPORT_LABELS = dict(METER_REPORT_COLUMNS)
+
+
+class ReportError(Exception):
+    """Raised when a report cannot be built; the message is shown to the client"""
+
+
+def data_version(report_type, meter_pk, params):
+    """
+    What a report's data currently is: the latest reading id, or the newest
+    id and row count in the job's range, so new, late or deleted readings
+    all change it. One indexed query.
+    """
+    if report_type == 'fleet':
+        if 'from' not in params:
+            return sorted(MeterLatest.objects.filter(meter_id__in=params['meter_ids']).values_list('meter_id', 'data_id'))
+        readings = fleet_readings_in_range(params['meter_ids'], parse_time(params['from']), parse_time(params['to']))
+    elif 'from' in params:
+        readings = readings_in_range(meter_pk, parse_time(params['from']), parse_time(params['to']))
+    else:
+        data = latest_reading(meter_pk)
+        return data.pk if data else None
+    return readings.order_by().aggregate(last=Max('id'), count=Count('id'))
+
+
+def fingerprint(report_type, meter_pk, params):
+    """Content address of the report a job would build; equal fingerprints mean identical reports"""
+    key = {
+        'report_type': report_type,
+        'template': TEMPLATE_VERSION,
+        'meter': meter_pk,
+        'params': params,
+        'data': data_version(report_type, meter_pk, params),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def parse_report_fields(value, report_type):
+    """
+    Validate a field selection given as a list or comma separated string.
+
+    Returns the fields in the order given, or every column of the report
+    type when nothing was selected. Raises ValueError on unknown fields or
+    a selection that is not a string or a list of strings.
+    """
+    if not value:
+        return [field for field, _ in REPORT_COLUMNS[report_type]]
+    if isinstance(value, str):
+        fields = value.split(',')
+    elif isinstance(value, list) and all(isinstance(field, str) for field in value):
+        fields = value
+    else:
+        raise ValueError("fields must be a comma separated string or a list of field names")
+    fields = [field.strip() for field in fields if field.strip()]
+    unknown = [field for field in fields if field not in REPORT_LABELS]
+    if unknown:
+        raise ValueError(f"Unknown report fields: {', '.join(unknown)}")
+    return fields
@@ -0,0 +1,608 @@
+"""
+Report builders run by the background report executor (see meter/jobs.py).
+
+This module pulls in pandas and xlsxwriter, so web code imports it only
+when a report is built; what a report contains (columns, field selection,
+fingerprints) lives in meter/report_specs.py, which is cheap to import.
+
+Each builder takes a ReportJob, writes the report under ``reports/`` in
+default storage and returns the file name. Raising ReportError fails the
+job with a message meant for the client.
+
+Jobs without a time range export the latest reading as a two column
+metric/value sheet. Jobs with ``from``/``to`` export one row per reading:
+rows are streamed from a server-side cursor straight into an xlsxwriter
+workbook in ``constant_memory`` mode, which flushes each row to a temporary
+file as soon as the next one starts. Memory use therefore stays flat however
+long the range is.
+
+Alarm jobs with a range are alarm history reports instead: a summary of
+each alarm's occurrences, total active time and longest episode plus a
+timeline of every episode, found by run-length encoding the range's alarm
+flags (see meter/analytics.py). The readings themselves are added only
+when the job selected fields.
+
+Range jobs may ask for CSV or Parquet instead of xlsx (see meter/exports.py);
+those skip spreadsheet formatting and the sheet row limit.
+
+Fleet jobs cover many meters at once and read all of them with one
+batched query ordered by (meter, timestamp), writing either one workbook
+with a sheet per meter or a ZIP holding a workbook per meter.
+"""
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from itertools import groupby, repeat
+from operator import itemgetter
+
+import django
+import numpy as np
+import pandas as pd
+import xlsxwriter
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .alarms import ALARM_FIELDS
+from .analytics import alarm_episodes, alarm_summary, load_flags
+from .exports import EXPORT_FORMATS, write_export
+from .models import Meter
+from .queries import fleet_readings_in_range, latest_reading, latest_readings, parse_time, readings_in_range
+from .report_specs import (
+    ALARM_REPORT_COLUMNS, METER_REPORT_COLUMNS, REPORT_LABELS, ReportError, parse_report_fields,
+)
+
+# Rows fetched per round trip while streaming a range report
+REPORT_CHUNK_SIZE = getattr(settings, 'METER_REPORT_CHUNK_SIZE', 2000)
+
+# Excel's row limit; longer range reports continue on another sheet
+SHEET_MAX_ROWS = 1048576
+
+# Excel allows 31 characters in a sheet name; keep room for " <n>" overflow sheets
+SHEET_TITLE_LENGTH = 27
+
+# Processes building a ZIP fleet report; 0 or 1 builds it in the report worker itself
+REPORT_PROCESSES = getattr(settings, 'METER_REPORT_PROCESSES', 0)
+
+# Meters handed to each process pool task of a ZIP fleet report
+FLEET_CHUNK_METERS = getattr(settings, 'METER_FLEET_CHUNK_METERS', 50)
+
+# Excel's serial date of the Unix epoch; dividing epoch seconds by a day and adding it gives an Excel time
+EXCEL_EPOCH = 25569
+DAY_SECONDS = 86400
+
+
+def display(field, value):
+    """Alarm flags read better as Yes/No in a spreadsheet"""
+    if field.startswith('alarm_'):
+        return 'Yes' if value else 'No'
+    return value
+
+
+def save_report(filename, buffer):
+    """Save a finished report under reports/ and return the name it was stored as"""
+    buffer.seek(0)
+    file_path = default_storage.save(f"reports/{filename}", ContentFile(buffer.getvalue()))
+    return os.path.basename(file_path)
+
+
+def save_report_file(filename, path):
+    """Copy a report built in a temporary file into storage in chunks and return its stored name"""
+    with open(path, 'rb') as f:
+        file_path = default_storage.save(f"reports/{filename}", File(f))
+    return os.path.basename(file_path)
+
+
+def write_latest_sheet(writer, data, meter_id, columns, sheet_name, metric_width):
+    """Write one reading as a metric/value sheet through a pandas ExcelWriter"""
+    # Create DataFrame with a single column for the most recent data
+    report_data = {
+        'Metric': ['Timestamp'] + [label for _, label in columns],
+        'Current Value': [data.timestamp.strftime('%Y-%m-%d %H:%M:%S')] + [
+            display(field, getattr(data, field)) for field, _ in columns
+        ]
+    }
+
+    # Create DataFrame
+    df = pd.DataFrame(report_data)
+
+    df.to_excel(writer, sheet_name=sheet_name, index=False)
+    workbook = writer.book
+    worksheet = writer.sheets[sheet_name]
+
+    # Add some formatting
+    header_format = workbook.add_format({
+        'bold': True,
+        'text_wrap': True,
+        'valign': 'top',
+        'bg_color': '#D7E4BC',
+        'border': 1
+    })
+
+    # Format the header row
+    for col_num, value in enumerate(df.columns.values):
+        worksheet.write(0, col_num, value, header_format)
+
+    # Format the metric names column
+    metric_format = workbook.add_format({
+        'bold': True,
+        'bg_color': '#E6E6E6',
+        'border': 1
+    })
+
+    for row_num in range(df.shape[0]):
+        worksheet.write(row_num + 1, 0, df['Metric'][row_num], metric_format)
+
+    # Set column widths
+    worksheet.set_column(0, 0, metric_width)  # Metric names column
+    worksheet.set_column(1, 1, 25)  # Values column
+
+    # Add device info at the bottom
+    info_format = workbook.add_format({
+        'bold': True,
+        'font_size': 12,
+        'font_color': 'blue'
+    })
+    worksheet.write(df.shape[0] + 3, 0, "Device ID:", info_format)
+    worksheet.write(df.shape[0] + 3, 1, meter_id)
+    worksheet.write(df.shape[0] + 4, 0, "Report Generated At:", info_format)
+    worksheet.write(df.shape[0] + 4, 1, timezone.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+
+def build_latest_report(job, columns, sheet_name, metric_width):
+    """Metric/value sheet holding the latest reading of the job's meter"""
+    # Get only the most recent data point
+    data = latest_reading(job.meter_id)
+
+    if not data:
+        raise ReportError("No data found for this meter")
+
+    # Create a buffer to save the Excel file
+    buffer = BytesIO()
+
+    # Create Excel writer
+    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
+        write_latest_sheet(writer, data, job.params['device_id'], columns, sheet_name, metric_width)
+
+    return buffer
+
+
+def write_range_sheets(workbook, rows, fields, sheet_name):
+    """
+    Stream ``(timestamp, *fields)`` rows into as many sheets as Excel's row
+    limit needs. Rows must arrive in order; constant_memory mode cannot go
+    back to an earlier row. Returns the number of rows written.
+    """
+    header_format = workbook.add_format({
+        'bold': True,
+        'text_wrap': True,
+        'valign': 'top',
+        'bg_color': '#D7E4BC',
+        'border': 1
+    })
+    time_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+    header = ['Timestamp (UTC)'] + [REPORT_LABELS[field] for field in fields]
+    per_sheet = SHEET_MAX_ROWS - 1
+
+    worksheet = None
+    written = 0
+    for row in rows:
+        row_num = written % per_sheet + 1
+        if row_num == 1:
+            sheet = written // per_sheet + 1
+            worksheet = workbook.add_worksheet(sheet_name if sheet == 1 else f"{sheet_name} {sheet}")
+            worksheet.freeze_panes(1, 1)
+            worksheet.set_column(0, 0, 20)
+            worksheet.set_column(1, len(fields), 16)
+            worksheet.write_row(0, 0, header, header_format)
+        worksheet.write_datetime(row_num, 0, row[0], time_format)
+        for col_num, field in enumerate(fields, start=1):
+            value = row[col_num]
+            if value is not None:
+                worksheet.write(row_num, col_num, display(field, value))
+        written += 1
+
+    if worksheet is None:
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, header, header_format)
+    return written
+
+
+def write_info_sheet(workbook, items, sheet_name='Report Info'):
+    """Append a sheet of ``(label, value)`` rows describing the report"""
+    info = workbook.add_worksheet(sheet_name)
+    info_format = workbook.add_format({'bold': True, 'font_size': 12, 'font_color': 'blue'})
+    info.set_column(0, 0, 25)
+    info.set_column(1, 1, 30)
+    for row_num, (label, value) in enumerate(items):
+        info.write(row_num, 0, label, info_format)
+        info.write(row_num, 1, value)
+    return info
+
+
+def write_range_workbook(path, rows, fields, sheet_name, meter_id, start, end):
+    """Stream one meter's range rows into a constant_memory workbook at ``path``"""
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'remove_timezone': True})
+    written = write_range_sheets(workbook, rows, fields, sheet_name)
+    write_info_sheet(workbook, [
+        ("Device ID:", meter_id),
+        ("From (UTC):", start.strftime('%Y-%m-%d %H:%M:%S')),
+        ("To (UTC):", end.strftime('%Y-%m-%d %H:%M:%S')),
+        ("Readings:", written),
+        ("Report Generated At:", timezone.now().strftime('%Y-%m-%d %H:%M:%S')),
+    ])
+    workbook.close()
+    return written
+
+
+def build_range_report(job, prefix, sheet_name):
+    """One row per reading of the job's meter between ``from`` and ``to``, as xlsx, CSV or Parquet"""
+    meter_id = job.params['device_id']
+    start = parse_time(job.params['from'])
+    end = parse_time(job.params['to'])
+    fields = parse_report_fields(job.params.get('fields'), job.report_type)
+    report_format = job.params.get('format', 'xlsx')
+
+    rows = (
+        readings_in_range(job.meter_id, start, end)
+        .values_list('timestamp', *fields)
+        .iterator(chunk_size=REPORT_CHUNK_SIZE)
+    )
+
+    fd, path = tempfile.mkstemp(suffix=f'.{report_format}')
+    os.close(fd)
+    try:
+        if report_format == 'xlsx':
+            write_range_workbook(path, rows, fields, sheet_name, meter_id, start, end)
+        else:
+            write_export(path, rows, ['timestamp'] + fields, report_format)
+
+        timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"{prefix}_{meter_id}_{start:%Y%m%d}-{end:%Y%m%d}_{timestamp}.{report_format}"
+        return save_report_file(filename, path)
+    finally:
+        os.remove(path)
+
+
+def write_alarm_history(workbook, epochs, flags, end):
+    """
+    Add an alarm summary sheet and an episode timeline sheet for readings
+    given as epoch seconds and an alarm flag array (see analytics.load_flags).
+    Returns the number of episodes.
+    """
+    columns, raised, cleared = alarm_episodes(epochs, flags, end)
+    summary = alarm_summary(columns, raised, cleared)
+    # An episode still active on the range's last reading runs to the end of the range
+    ongoing = cleared >= end
+    active_at_end = set(columns[ongoing].tolist())
+
+    header_format = workbook.add_format({
+        'bold': True,
+        'text_wrap': True,
+        'valign': 'top',
+        'bg_color': '#D7E4BC',
+        'border': 1
+    })
+    time_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+    duration_format = workbook.add_format({'num_format': '[h]:mm:ss'})
+
+    worksheet = workbook.add_worksheet('Alarm Summary')
+    worksheet.set_column(0, 0, 22)
+    worksheet.set_column(1, 4, 16)
+    worksheet.write_row(0, 0, ['Alarm', 'Occurrences', 'Total Active', 'Longest Episode', 'Active at End'],
+                        header_format)
+    for i, field in enumerate(ALARM_FIELDS):
+        row_num = i + 1
+        worksheet.write(row_num, 0, REPORT_LABELS[field])
+        worksheet.write(row_num, 1, summary[field]['occurrences'])
+        worksheet.write(row_num, 2, summary[field]['active_seconds'] / DAY_SECONDS, duration_format)
+        worksheet.write(row_num, 3, summary[field]['longest_seconds'] / DAY_SECONDS, duration_format)
+        worksheet.write(row_num, 4, display(field, i in active_at_end))
+
+    order = np.lexsort((columns, raised))
+    header = ['Alarm', 'Raised (UTC)', 'Cleared (UTC)', 'Duration']
+    per_sheet = SHEET_MAX_ROWS - 1
+    for written, (column, start, stop, active) in enumerate(zip(
+        columns[order].tolist(),
+        (raised[order] / DAY_SECONDS + EXCEL_EPOCH).tolist(),
+        (cleared[order] / DAY_SECONDS + EXCEL_EPOCH).tolist(),
+        ongoing[order].tolist(),
+    )):
+        row_num = written % per_sheet + 1
+        if row_num == 1:
+            sheet = written // per_sheet + 1
+            worksheet = workbook.add_worksheet('Alarm Timeline' if sheet == 1 else f'Alarm Timeline {sheet}')
+            worksheet.freeze_panes(1, 0)
+            worksheet.set_column(0, 0, 22)
+            worksheet.set_column(1, 3, 20)
+            worksheet.write_row(0, 0, header, header_format)
+        worksheet.write(row_num, 0, REPORT_LABELS[ALARM_FIELDS[column]])
+        worksheet.write_number(row_num, 1, start, time_format)
+        if active:
+            worksheet.write(row_num, 2, 'Active')
+        else:
+            worksheet.write_number(row_num, 2, stop, time_format)
+        worksheet.write_number(row_num, 3, stop - start, duration_format)
+    if not len(order):
+        worksheet = workbook.add_worksheet('Alarm Timeline')
+        worksheet.write_row(0, 0, header, header_format)
+    return len(order)
+
+
+def build_alarm_history_report(job):
+    """Alarm history of one meter between ``from`` and ``to`` as an xlsx workbook"""
+    meter_id = job.params['device_id']
+    start = parse_time(job.params['from'])
+    end = parse_time(job.params['to'])
+    readings = readings_in_range(job.meter_id, start, end)
+    epochs, flags = load_flags(readings)
+
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'remove_timezone': True})
+        episodes = write_alarm_history(workbook, epochs, flags, end.timestamp())
+        if job.params.get('fields'):
+            rows = readings.values_list('timestamp', *job.params['fields']).iterator(chunk_size=REPORT_CHUNK_SIZE)
+            write_range_sheets(workbook, rows, job.params['fields'], 'Alarm Report')
+        write_info_sheet(workbook, [
+            ("Device ID:", meter_id),
+            ("From (UTC):", start.strftime('%Y-%m-%d %H:%M:%S')),
+            ("To (UTC):", end.strftime('%Y-%m-%d %H:%M:%S')),
+            ("Readings:", len(epochs)),
+            ("Alarm Episodes:", episodes),
+            ("Report Generated At:", timezone.now().strftime('%Y-%m-%d %H:%M:%S')),
+        ])
+        workbook.close()
+
+        timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"alarm_history_{meter_id}_{start:%Y%m%d}-{end:%Y%m%d}_{timestamp}.xlsx"
+        return save_report_file(filename, path)
+    finally:
+        os.remove(path)
+
+
+def build_alarm_report(job):
+    """Alarm report for one meter: the latest reading, the alarm history of a range, or a range export"""
+    if 'from' in job.params:
+        if job.params.get('format', 'xlsx') == 'xlsx':
+            return build_alarm_history_report(job)
+        return build_range_report(job, 'alarm_report', 'Alarm Report')
+    buffer = build_latest_report(job, ALARM_REPORT_COLUMNS, 'Alarm Report', 25)
+
+    # Save the Excel file
+    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"alarm_report_{job.params['device_id']}_{timestamp}.xlsx"
+    return save_report(filename, buffer)
+
+
+def build_meter_report(job):
+    """Comprehensive meter data report for one meter: the latest reading, or every reading in a range"""
+    if 'from' in job.params:
+        return build_range_report(job, 'meter_data_report', 'Meter Data Report')
+    buffer = build_latest_report(job, METER_REPORT_COLUMNS, 'Meter Data Report', 30)
+
+    # Save the Excel file
+    timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"meter_data_report_{job.params['device_id']}_{timestamp}.xlsx"
+    return save_report(filename, buffer)
+
+
+def sheet_title(device_id, used):
+    """A unique worksheet name for a meter, with room left for overflow sheet numbers"""
+    title = re.sub(r"[\[\]:*?/\\']", '_', device_id)[:SHEET_TITLE_LENGTH] or 'Meter'
+    base, n = title, 2
+    while title.lower() in used:
+        suffix = f"~{n}"
+        title = base[:SHEET_TITLE_LENGTH - len(suffix)] + suffix
+        n += 1
+    used.add(title.lower())
+    return title
+
+
+def archive_name(name, used):
+    """A unique ZIP entry name, adding ``~n`` before the extension when another meter's name collides"""
+    stem, extension = os.path.splitext(name)
+    n = 2
+    while name.lower() in used:
+        name = f"{stem}~{n}{extension}"
+        n += 1
+    used.add(name.lower())
+    return name
+
+
+def fleet_rows(meters, start, end, fields):
+    """
+    Yield ``(meter, rows)`` for every meter in pk order, where rows are its
+    ``(timestamp, *fields)`` readings in range. All meters are read with one
+    server-side cursor; each meter's rows must be consumed before the next.
+    """
+    rows = (
+        fleet_readings_in_range([meter.pk for meter in meters], start, end)
+        .values_list('meter_id', 'timestamp', *fields)
+        .iterator(chunk_size=REPORT_CHUNK_SIZE)
+    )
+    groups = groupby(rows, key=itemgetter(0))
+    current = next(groups, None)
+    for meter in meters:
+        if current is not None and current[0] == meter.pk:
+            yield meter, (row[1:] for row in current[1])
+            current = next(groups, None)
+        else:
+            yield meter, iter(())
+
+
+def fleet_meters(meter_pks):
+    """The job's meters in pk order, matching the order of fleet_rows"""
+    return list(Meter.objects.filter(pk__in=meter_pks).order_by('pk'))
+
+
+def write_fleet_workbook(path, meter_pks, params):
+    """One workbook with a sheet per meter, plus a Fleet Info sheet"""
+    meters = fleet_meters(meter_pks)
+    used = {'fleet info'}
+    summary = []
+
+    if 'from' in params:
+        start, end = parse_time(params['from']), parse_time(params['to'])
+        fields = parse_report_fields(params.get('fields'), 'fleet')
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'remove_timezone': True})
+        for meter, rows in fleet_rows(meters, start, end, fields):
+            title = sheet_title(meter.device_id, used)
+            summary.append((meter.device_id, title, write_range_sheets(workbook, rows, fields, title)))
+        info = [
+            ("Meters:", len(meters)),
+            ("From (UTC):", start.strftime('%Y-%m-%d %H:%M:%S')),
+            ("To (UTC):", end.strftime('%Y-%m-%d %H:%M:%S')),
+            ("Readings:", sum(count for _, _, count in summary)),
+        ]
+        write_fleet_info(workbook, info, summary)
+        workbook.close()
+        return
+
+    latest = latest_readings(meter_pks)
+    with pd.ExcelWriter(path, engine='xlsxwriter') as writer:
+        for meter in meters:
+            data = latest.get(meter.pk)
+            if data is None:
+                summary.append((meter.device_id, '', 0))
+                continue
+            title = sheet_title(meter.device_id, used)
+            write_latest_sheet(writer, data, meter.device_id, METER_REPORT_COLUMNS, title, 30)
+            summary.append((meter.device_id, title, 1))
+        write_fleet_info(writer.book, [
+            ("Meters:", len(meters)),
+            ("Meters With Data:", len(latest)),
+        ], summary)
+
+
+def write_fleet_info(workbook, items, summary):
+    """Fleet Info sheet: totals, then which sheet holds each meter and how many readings it has"""
+    info = write_info_sheet(workbook, items + [
+        ("Report Generated At:", timezone.now().strftime('%Y-%m-%d %H:%M:%S')),
+    ], sheet_name='Fleet Info')
+    header_format = workbook.add_format({'bold': True, 'bg_color': '#D7E4BC', 'border': 1})
+    row_num = len(items) + 2
+    info.write_row(row_num, 0, ['Device ID', 'Sheet', 'Readings'], header_format)
+    for row_num, row in enumerate(summary, start=row_num + 1):
+        info.write_row(row_num, 0, row)
+
+
+def build_meter_files(meter_pks, params, directory):
+    """
+    Write one workbook per meter into ``directory`` and return their
+    ``(archive name, path)`` pairs in pk order. Meters are read with one
+    batched query. Runs in the report worker or in a fleet process pool task.
+    """
+    meters = fleet_meters(meter_pks)
+    files = []
+
+    def target(meter):
+        path = os.path.join(directory, f"{meter.pk}.xlsx")
+        name = re.sub(r'[^A-Za-z0-9._-]', '_', meter.device_id)
+        files.append((f"{name}.xlsx", path))
+        return path
+
+    if 'from' in params:
+        start, end = parse_time(params['from']), parse_time(params['to'])
+        fields = parse_report_fields(params.get('fields'), 'fleet')
+        for meter, rows in fleet_rows(meters, start, end, fields):
+            write_range_workbook(target(meter), rows, fields, 'Meter Data Report', meter.device_id, start, end)
+        return files
+
+    latest = latest_readings(meter_pks)
+    for meter in meters:
+        data = latest.get(meter.pk)
+        if data is not None:
+            with pd.ExcelWriter(target(meter), engine='xlsxwriter') as writer:
+                write_latest_sheet(writer, data, meter.device_id, METER_REPORT_COLUMNS, 'Meter Data Report', 30)
+    return files
+
+
+def fleet_files(meter_pks, params, directory):
+    """
+    Yield the per-meter workbooks of a ZIP fleet report in pk order.
+
+    With METER_REPORT_PROCESSES above one, meters are split into chunks of
+    METER_FLEET_CHUNK_METERS and built in a process pool, one batched query
+    per chunk; otherwise all meters are built here from a single query.
+    """
+    chunks = [meter_pks[i:i + FLEET_CHUNK_METERS] for i in range(0, len(meter_pks), FLEET_CHUNK_METERS)]
+    if REPORT_PROCESSES > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(
+            max_workers=min(REPORT_PROCESSES, len(chunks)),
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        ) as pool:
+            for files in pool.map(build_meter_files, chunks, repeat(params), repeat(directory)):
+                yield from files
+    else:
+        yield from build_meter_files(meter_pks, params, directory)
+
+
+def write_fleet_export(path, meter_pks, params):
+    """Every meter's range rows in one CSV or Parquet file, led by a device_id column"""
+    fields = parse_report_fields(params.get('fields'), 'fleet')
+    device_ids = dict(Meter.objects.filter(pk__in=meter_pks).values_list('pk', 'device_id'))
+    rows = (
+        fleet_readings_in_range(meter_pks, parse_time(params['from']), parse_time(params['to']))
+        .values_list('meter_id', 'timestamp', *fields)
+        .iterator(chunk_size=REPORT_CHUNK_SIZE)
+    )
+    rows = ((device_ids[row[0]],) + row[1:] for row in rows)
+    write_export(path, rows, ['device_id', 'timestamp'] + fields, params['format'])
+
+
+def build_fleet_report(job):
+    """
+    Report over many meters: one workbook with a sheet per meter, a ZIP of
+    per-meter workbooks, or a single CSV or Parquet file of all readings
+    """
+    meter_pks = sorted(job.params['meter_ids'])
+    report_format = job.params.get('format', 'xlsx')
+
+    fd, path = tempfile.mkstemp(suffix=f'.{report_format}')
+    os.close(fd)
+    try:
+        if report_format in EXPORT_FORMATS:
+            write_fleet_export(path, meter_pks, job.params)
+        elif report_format == 'zip':
+            directory = tempfile.mkdtemp()
+            try:
+                # Workbooks are already deflated, so they are stored as they are
+                with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as archive:
+                    # Deduplicated here rather than per chunk so names stay unique across pool tasks
+                    used = set()
+                    for name, file_path in fleet_files(meter_pks, job.params, directory):
+                        archive.write(file_path, archive_name(name, used))
+                        os.remove(file_path)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+        else:
+            write_fleet_workbook(path, meter_pks, job.params)
+
+        timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"fleet_report_{len(meter_pks)}_meters_{timestamp}.{report_format}"
+        return save_report_file(filename, path)
+    finally:
+        os.remove(path)
+
+
+# Builder for each ReportJob.report_type
+BUILDERS = {
+    'meter': build_meter_report,
+    'alarm': build_alarm_report,
+    'fleet': build_fleet_report,
+}
+
+
+def build(job):
+    """Build the report a job asks for and return its file name"""
+    return BUILDERS[job.report_type](job)
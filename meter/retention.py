@@ -0,0 +1,85 @@
+"""
+Size-bounded retention of built report files.
+
+Report jobs are content addressed (see reports.fingerprint), so a file in
+``reports/`` is handed to every request for the same data until it is
+evicted. After each build, evict() deletes the least recently used files
+until the directory fits METER_REPORT_STORAGE_MAX_BYTES and
+METER_REPORT_STORAGE_MAX_FILES. A file's last use is when its job was
+built, reused or polled; files no job knows about go by modification time.
+Jobs whose file was evicted become EXPIRED.
+"""
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .models import ReportJob
+
+REPORT_DIR = 'reports'
+
+# Bounds on what reports/ may hold before least recently used files are deleted
+REPORT_STORAGE_MAX_BYTES = getattr(settings, 'METER_REPORT_STORAGE_MAX_BYTES', 1024 ** 3)
+REPORT_STORAGE_MAX_FILES = getattr(settings, 'METER_REPORT_STORAGE_MAX_FILES', 1000)
+
+
+def report_path(filename):
+    return f"{REPORT_DIR}/{filename}"
+
+
+def touch(job):
+    """Record a use of a job's file so eviction keeps it longer"""
+    job.last_used_at = timezone.now()
+    ReportJob.objects.filter(pk=job.pk).update(last_used_at=job.last_used_at)
+
+
+def is_stored(job):
+    """Whether a SUCCEEDED job's file is still in storage; marks the job EXPIRED if not"""
+    if default_storage.exists(report_path(job.filename)):
+        return True
+    ReportJob.objects.filter(pk=job.pk, status='SUCCEEDED').update(status='EXPIRED')
+    job.status = 'EXPIRED'
+    return False
+
+
+def evict(keep=None, max_bytes=None, max_files=None):
+    """
+    Delete least recently used report files until reports/ is within its
+    bounds, never deleting ``keep``. Returns the evicted file names.
+    """
+    max_bytes = REPORT_STORAGE_MAX_BYTES if max_bytes is None else max_bytes
+    max_files = REPORT_STORAGE_MAX_FILES if max_files is None else max_files
+    try:
+        _, names = default_storage.listdir(REPORT_DIR)
+    except FileNotFoundError:
+        return []
+
+    last_used = dict(
+        ReportJob.objects.filter(filename__in=names, last_used_at__isnull=False)
+        .values_list('filename', 'last_used_at')
+    )
+    files = []
+    for name in names:
+        try:
+            size = default_storage.size(report_path(name))
+            used = last_used.get(name) or default_storage.get_modified_time(report_path(name))
+        except OSError:
+            # Evicted or downloaded by another process meanwhile
+            continue
+        files.append((used, name, size))
+
+    total_bytes = sum(size for _, _, size in files)
+    total_files = len(files)
+    evicted = []
+    for _, name, size in sorted(files):
+        if total_bytes <= max_bytes and total_files <= max_files:
+            break
+        if name == keep:
+            continue
+        default_storage.delete(report_path(name))
+        total_bytes -= size
+        total_files -= 1
+        evicted.append(name)
+
+    if evicted:
+        ReportJob.objects.filter(filename__in=evicted, status='SUCCEEDED').update(status='EXPIRED')
+    return evicted
@@ -0,0 +1,218 @@
+"""
+Incremental time-bucket rollups of MeterData.
+
+For every ingested batch the readings are grouped per meter into 1 minute,
+15 minute, 1 hour and 1 day buckets with NumPy, reduced to count, min, max,
+sum and last value per field, and merged into MeterDataRollup rows. Trend
+charts then read one row per bucket instead of scanning raw readings.
+
+Two workers merging into the same bucket at the same moment can lose one
+of the updates; ``python manage.py rollup_catchup`` rebuilds any range
+from the raw readings.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+
+from .models import MeterData, MeterDataRollup
+
+# Fields summarised in every bucket
+ROLLUP_FIELDS = getattr(settings, 'METER_ROLLUP_FIELDS', [
+    'instantaneous_power_kw',
+    'fuel_rate_lph',
+    'coolant_temp_c',
+    'phase_a_voltage_v',
+    'phase_b_voltage_v',
+    'phase_c_voltage_v',
+    'phase_a_current_a',
+    'phase_b_current_a',
+    'phase_c_current_a',
+])
+
+# Bucket width in seconds for each resolution
+RESOLUTIONS = {
+    '1m': 60,
+    '15m': 15 * 60,
+    '1h': 60 * 60,
+    '1d': 24 * 60 * 60,
+}
+
+# Update rollups as part of every ingest write
+ROLLUP_AT_INGEST = getattr(settings, 'METER_ROLLUP_AT_INGEST', True)
+
+
+def _epoch(timestamp):
+    return timestamp.timestamp()
+
+
+def _from_epoch(seconds):
+    return datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+
+
+def summarize(meter_ids, epochs, values, resolution):
+    """
+    Reduce readings to one partial aggregate per (meter, bucket).
+
+    ``meter_ids`` and ``epochs`` are 1-D arrays and ``values`` is an
+    ``n x len(ROLLUP_FIELDS)`` float array. Returns a dict keyed by
+    ``(meter_id, bucket_epoch)`` holding ``(count, last_epoch, stats)``.
+    """
+    width = RESOLUTIONS[resolution]
+    buckets = np.floor_divide(epochs, width) * width
+
+    # Sort by meter, bucket, then time so groups are contiguous and end on their newest reading
+    order = np.lexsort((epochs, buckets, meter_ids))
+    meter_ids, buckets, epochs, values = meter_ids[order], buckets[order], epochs[order], values[order]
+
+    boundary = np.ones(len(order), dtype=bool)
+    boundary[1:] = (meter_ids[1:] != meter_ids[:-1]) | (buckets[1:] != buckets[:-1])
+    starts = np.flatnonzero(boundary)
+    ends = np.append(starts[1:], len(order)) - 1
+
+    counts = ends - starts + 1
+    minimums = np.fmin.reduceat(values, starts, axis=0)
+    maximums = np.fmax.reduceat(values, starts, axis=0)
+    sums = np.add.reduceat(np.nan_to_num(values), starts, axis=0)
+    present = np.add.reduceat(~np.isnan(values), starts, axis=0)
+    lasts = values[ends]
+
+    partials = {}
+    for group, start in enumerate(starts):
+        stats = {
+            field: [minimums[group, i], maximums[group, i], sums[group, i], present[group, i], lasts[group, i]]
+            for i, field in enumerate(ROLLUP_FIELDS)
+        }
+        partials[(int(meter_ids[start]), float(buckets[start]))] = (int(counts[group]), float(epochs[ends[group]]), stats)
+    return partials
+
+
+def _clean(number):
+    """JSON has no NaN, so an all-missing aggregate is stored as null"""
+    number = float(number)
+    return None if np.isnan(number) else number
+
+
+def _merge_stats(existing, partial, partial_is_newer):
+    merged = {}
+    for field, (low, high, total, present, last) in partial.items():
+        old = existing.get(field)
+        if old is None:
+            merged[field] = [_clean(low), _clean(high), float(total), int(present), _clean(last)]
+            continue
+        old_low, old_high, old_total, old_present, old_last = old
+        merged[field] = [
+            _clean(np.fmin(low, np.nan if old_low is None else old_low)),
+            _clean(np.fmax(high, np.nan if old_high is None else old_high)),
+            float(total) + old_total,
+            int(present) + old_present,
+            _clean(last) if partial_is_newer else old_last,
+        ]
+    return merged
+
+
+def merge_partials(partials, resolution):
+    """Fold partial aggregates into MeterDataRollup rows, creating buckets as needed"""
+    if not partials:
+        return
+    meter_ids = {meter_id for meter_id, _ in partials}
+    bucket_starts = {_from_epoch(bucket) for _, bucket in partials}
+    existing = {
+        (rollup.meter_id, _epoch(rollup.bucket_start)): rollup
+        for rollup in MeterDataRollup.objects.filter(
+            meter_id__in=meter_ids, resolution=resolution, bucket_start__in=bucket_starts
+        )
+    }
+
+    created = []
+    updated = []
+    for key, (count, last_epoch, stats) in partials.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            created.append(MeterDataRollup(
+                meter_id=key[0],
+                resolution=resolution,
+                bucket_start=_from_epoch(key[1]),
+                count=count,
+                last_timestamp=_from_epoch(last_epoch),
+                stats=_merge_stats({}, stats, True),
+            ))
+            continue
+        is_newer = last_epoch >= _epoch(rollup.last_timestamp)
+        rollup.stats = _merge_stats(rollup.stats, stats, is_newer)
+        rollup.count += count
+        if is_newer:
+            rollup.last_timestamp = _from_epoch(last_epoch)
+        updated.append(rollup)
+
+    MeterDataRollup.objects.bulk_create(created, batch_size=500)
+    MeterDataRollup.objects.bulk_update(updated, ['stats', 'count', 'last_timestamp'], batch_size=500)
+
+
+def rollup_arrays(meter_ids, epochs, values):
+    """Merge readings given as arrays into every resolution"""
+    if not len(meter_ids):
+        return
+    for resolution in RESOLUTIONS:
+        merge_partials(summarize(meter_ids, epochs, values, resolution), resolution)
+
+
+def rollup_rows(rows):
+    """Merge ``(meter_id, timestamp, *field values)`` tuples into every resolution"""
+    if not rows:
+        return
+    meter_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    epochs = np.fromiter((_epoch(row[1]) for row in rows), dtype=np.float64, count=len(rows))
+    values = np.array([row[2:] for row in rows], dtype=np.float64).reshape(len(rows), len(ROLLUP_FIELDS))
+    rollup_arrays(meter_ids, epochs, values)
+
+
+def rollup_instances(instances):
+    """Merge freshly written MeterData instances into every resolution"""
+    rollup_rows([
+        (instance.meter_id, instance.timestamp, *(getattr(instance, field) for field in ROLLUP_FIELDS))
+        for instance in instances
+    ])
+
+
+def rebuild(meter_pk, start, end, chunk_size=50000):
+    """
+    Recompute one meter's rollups for whole days covering ``[start, end)``.
+
+    The range is widened to day boundaries so that every bucket touched is
+    rebuilt from all of its readings. Returns the number of readings read.
+    """
+    day = RESOLUTIONS['1d']
+    start = _from_epoch(np.floor(_epoch(start) / day) * day)
+    end = _from_epoch(np.ceil(_epoch(end) / day) * day)
+    MeterDataRollup.objects.filter(meter_id=meter_pk, bucket_start__gte=start, bucket_start__lt=end).delete()
+
+    readings = (
+        MeterData.objects.filter(meter_id=meter_pk, timestamp__gte=start, timestamp__lt=end)
+        .order_by('timestamp')
+        .values_list('meter_id', 'timestamp', *ROLLUP_FIELDS)
+    )
+    total = 0
+    chunk = []
+    for row in readings.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            rollup_rows(chunk)
+            total += len(chunk)
+            chunk = []
+    rollup_rows(chunk)
+    return total + len(chunk)
+
+
+def bucket_summary(rollup, fields):
+    """Render a rollup row as ``{field: {min, max, avg, last}}`` for the API"""
+    summary = {}
+    for field in fields:
+        low, high, total, present, last = rollup.stats.get(field) or (None, None, 0, 0, None)
+        summary[field] = {
+            "min": low,
+            "max": high,
+            "avg": total / present if present else None,
+            "last": last,
+        }
+    return summary
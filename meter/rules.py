@@ -0,0 +1,233 @@
+"""
+Server-side alarm rules evaluated over ingest batches.
+
+Enabled AlarmRule rows are compiled once per worker into column-wise
+predicates: a NumPy comparison ufunc, a threshold and the column it reads.
+Each ingest batch is copied into one float64 column per field the rules
+read, sorted by meter and time, and every rule is then evaluated over the
+whole batch with a single comparison. Debouncing ("for 60s") is vectorized
+as well: runs of readings where the condition holds are found with one
+pass of run-length encoding, and a reading fires once its run has lasted
+``duration_seconds``. Only the raise and clear transitions touch the
+database, as AlarmEvent rows linked to their rule.
+
+Debounce state lives in memory per worker and is kept only for meters
+whose condition currently holds. Loading the rules resets it and reopens
+the alerts still open in AlarmEvent, so a restart loses only conditions
+that had not yet held long enough. Readings older than the last one a
+worker evaluated for a meter are skipped. Saving or deleting a rule
+reloads the rules in every worker the same way meter changes reach
+meter/cache.py. As with rollups, workers ingesting the same meter keep
+separate state, and state already updated is not rolled back with a
+failed write.
+"""
+import threading
+import time
+from collections import namedtuple
+from operator import attrgetter
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from .analytics import NUMERIC_FIELDS
+from .models import AlarmEvent, AlarmRule
+
+# Evaluate alarm rules as part of every ingest write
+RULES_AT_INGEST = getattr(settings, 'METER_RULES_AT_INGEST', True)
+
+# Seconds between checks of the shared rule version; 0 checks on every batch
+VERSION_CHECK_INTERVAL = getattr(settings, 'METER_CACHE_VERSION_CHECK_INTERVAL', 5)
+
+VERSION_KEY = 'meter:rules:version'
+
+OPERATORS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+}
+
+# Fields a rule may test, the derived power-quality metrics included
+RULE_FIELDS = NUMERIC_FIELDS
+
+CompiledRule = namedtuple('CompiledRule', ['pk', 'meter_pk', 'field', 'compare', 'threshold', 'duration'])
+
+
+def compile_rule(rule):
+    return CompiledRule(rule.pk, rule.meter_id, rule.field, OPERATORS[rule.operator],
+                        rule.threshold, rule.duration_seconds)
+
+
+def batch_columns(readings, fields):
+    """Float64 column of each field for ``readings``; NULL becomes NaN"""
+    return {
+        field: np.array([getattr(reading, field) for reading in readings], dtype=np.float64)
+        for field in fields
+    }
+
+
+class RuleEngine:
+    """Compiled enabled rules plus each meter's debounce state"""
+
+    def __init__(self, version_check_interval=VERSION_CHECK_INTERVAL):
+        self.version_check_interval = version_check_interval
+        self.lock = threading.Lock()
+        self.rules = None
+        # rule pk -> {meter pk: (epoch the condition started holding, alert open)}
+        self.state = {}
+        # meter pk -> epoch of the newest reading evaluated
+        self.last_seen = {}
+        self.version = None
+        self.checked_at = 0
+
+    def load(self):
+        """Compile the enabled rules and restart debouncing from the alerts still open"""
+        rules = [
+            compile_rule(rule) for rule in AlarmRule.objects.filter(enabled=True)
+            # Rules saved around the API's validation must not break ingest
+            if rule.field in RULE_FIELDS and rule.operator in OPERATORS
+        ]
+        state = {rule.pk: {} for rule in rules}
+        for rule_pk, meter_pk, raised_at in AlarmEvent.objects.filter(
+            rule_id__in=state, cleared_at__isnull=True
+        ).values_list('rule_id', 'meter_id', 'raised_at'):
+            state[rule_pk][meter_pk] = (raised_at.timestamp(), True)
+        self.rules = rules
+        self.state = state
+        self.last_seen = {}
+
+    def clear(self):
+        with self.lock:
+            self.rules = None
+
+    def invalidate(self):
+        """Reload rules locally and tell other workers to reload theirs"""
+        self.clear()
+        try:
+            cache.add(VERSION_KEY, 0, timeout=None)
+            self.version = cache.incr(VERSION_KEY)
+        except ValueError:
+            # The key was evicted between add and incr
+            self.version = None
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self.checked_at < self.version_check_interval:
+            return
+        self.checked_at = now
+        version = cache.get(VERSION_KEY)
+        if version != self.version:
+            if self.version is not None or version is not None:
+                self.rules = None
+            self.version = version
+
+    def evaluate(self, instances):
+        """
+        Evaluate every enabled rule over new MeterData instances.
+
+        Returns ``(rule_pk, meter_pk, timestamp, raised)`` transitions, in
+        time order for each rule and meter.
+        """
+        self._check_version()
+        with self.lock:
+            if self.rules is None:
+                self.load()
+            if not self.rules or not instances:
+                return []
+
+            readings = sorted(instances, key=attrgetter('meter_id', 'timestamp', 'id'))
+            meter_ids = np.fromiter((reading.meter_id for reading in readings), dtype=np.int64, count=len(readings))
+            epochs = np.fromiter((reading.timestamp.timestamp() for reading in readings),
+                                 dtype=np.float64, count=len(readings))
+            first = np.ones(len(readings), dtype=bool)
+            first[1:] = meter_ids[1:] != meter_ids[:-1]
+
+            # Leave out readings older than what each meter was already evaluated up to
+            seen = np.array([self.last_seen.get(meter_pk, -np.inf) for meter_pk in meter_ids[first].tolist()])
+            keep = epochs >= seen[np.cumsum(first) - 1]
+            if not keep.all():
+                readings = [reading for reading, kept in zip(readings, keep) if kept]
+                meter_ids, epochs = meter_ids[keep], epochs[keep]
+                first = np.ones(len(readings), dtype=bool)
+                first[1:] = meter_ids[1:] != meter_ids[:-1]
+            if not readings:
+                return []
+
+            index = np.arange(len(readings))
+            segment = np.cumsum(first) - 1
+            segment_first = np.flatnonzero(first)
+            segment_last = np.append(segment_first[1:], len(readings)) - 1
+            segment_meters = meter_ids[first]
+            meters = segment_meters.tolist()
+            columns = batch_columns(readings, {rule.field for rule in self.rules})
+
+            transitions = []
+            for rule in self.rules:
+                hit = rule.compare(columns[rule.field], rule.threshold)
+                if rule.meter_pk is not None:
+                    hit &= meter_ids == rule.meter_pk
+                held = self.state[rule.pk]
+                if not held and not hit.any():
+                    continue
+
+                # State carried over from earlier batches, looked up only for the meters that have any
+                prior_since = np.full(len(meters), np.nan)
+                prior_open = np.zeros(len(meters), dtype=bool)
+                if held:
+                    keys = np.fromiter(held, dtype=np.int64, count=len(held))
+                    found = np.minimum(np.searchsorted(segment_meters, keys), len(meters) - 1)
+                    matched = segment_meters[found] == keys
+                    for seg, meter_pk in zip(found[matched].tolist(), keys[matched].tolist()):
+                        prior_since[seg], prior_open[seg] = held[meter_pk]
+                has_prior = ~np.isnan(prior_since)
+
+                # Start of the run of hits each reading belongs to; a run at the
+                # start of the batch continues the one held before it
+                change = first.copy()
+                change[1:] |= hit[1:] != hit[:-1]
+                run_first = np.maximum.accumulate(np.where(change, index, 0))
+                carried = hit & (run_first == segment_first[segment]) & has_prior[segment]
+                run_start = np.where(carried, prior_since[segment], epochs[run_first])
+
+                fired = hit & (epochs - run_start >= rule.duration)
+                before = np.empty(len(readings), dtype=bool)
+                before[1:] = fired[:-1]
+                before[first] = prior_open
+                for i in np.flatnonzero(fired != before).tolist():
+                    transitions.append((rule.pk, readings[i].meter_id, readings[i].timestamp, bool(fired[i])))
+
+                for seg in np.flatnonzero(hit[segment_last] | has_prior).tolist():
+                    i = segment_last[seg]
+                    if hit[i]:
+                        held[meters[seg]] = (float(run_start[i]), bool(fired[i]))
+                    else:
+                        held.pop(meters[seg], None)
+
+            for seg, meter_pk in enumerate(meters):
+                self.last_seen[meter_pk] = float(epochs[segment_last[seg]])
+            return transitions
+
+
+engine = RuleEngine()
+
+
+def record_rule_alerts(instances):
+    """Evaluate alarm rules over a batch of new readings and write the alerts they raise or clear"""
+    opened = {}
+    new = []
+    clears = []
+    for rule_pk, meter_pk, timestamp, raised in engine.evaluate(instances):
+        key = (rule_pk, meter_pk)
+        if raised:
+            opened[key] = AlarmEvent(meter_id=meter_pk, alarm=AlarmEvent.RULE, rule_id=rule_pk, raised_at=timestamp)
+            new.append(opened[key])
+        elif key in opened:
+            opened.pop(key).cleared_at = timestamp
+        else:
+            clears.append((key, timestamp))
+    AlarmEvent.objects.bulk_create(new)
+    for (rule_pk, meter_pk), timestamp in clears:
+        AlarmEvent.objects.filter(
+            meter_id=meter_pk, alarm=AlarmEvent.RULE, rule_id=rule_pk, cleared_at__isnull=True
+        ).update(cleared_at=timestamp)
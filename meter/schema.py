@@ -0,0 +1,222 @@
+"""
+Declarative mapping from nested gateway payloads to MeterData columns.
+
+READING_SCHEMA lists, for every column, where its value lives in the
+payload and what to use when the gateway leaves it out. At import time the
+schema is compiled into a single Python function that walks each nested
+section once, applies the same coercion rules as MeterDataSerializer and
+returns the flat row together with any field errors.
+"""
+import math
+
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models
+
+from .models import MeterData
+
+# (column, payload path, default when missing)
+PHASE_KEYS = (
+    ('voltage_v', 0),
+    ('current_a', 0),
+    ('voltage_ll', 0),
+    ('frequency_hz', 0),
+    ('real_power', 0),
+    ('apparent_power', 0),
+    ('reactive_power', 0),
+)
+
+READING_SCHEMA = [
+    ('engine_hours', ('engine_hours',), 0),
+    ('frequency_hz', ('frequency_hz',), 0),
+    ('power_percentage', ('power_percentage',), 0),
+
+    # Average readings
+    ('avg_ll_volt', ('avg_ll_volt',), 0),
+    ('avg_ln_volt', ('avg_ln_volt',), 0),
+    ('avg_current', ('avg_current',), 0),
+] + [
+    # Phase A, B and C data
+    (f'{phase}_{key}', (phase, key), default)
+    for phase in ('phase_a', 'phase_b', 'phase_c')
+    for key, default in PHASE_KEYS
+] + [
+    # Breaker statuses
+    ('gen_breaker', ('gen_breaker',), None),
+    ('util_breaker', ('util_breaker',), None),
+    ('gc_status', ('gc_status',), None),
+
+    # Other measurements
+    ('coolant_temp_c', ('coolant_temp_c',), 0),
+    ('oil_pressure_kpa', ('oil_pressure_kpa',), 0),
+    ('battery_voltage_v', ('battery_voltage_v',), 0),
+    ('fuel_level_percent', ('fuel_level_percent',), 0),
+    ('rpm', ('rpm',), 0),
+    ('oil_temp_c', ('oil_temp_c',), 0),
+    ('boost_pressure_kpa', ('boost_pressure_kpa',), 0),
+    ('intake_air_temp_c', ('intake_air_temp_c',), 0),
+    ('fuel_rate_lph', ('fuel_rate_lph',), 0),
+    ('instantaneous_power_kw', ('instantaneous_power_kw',), 0),
+
+    # Alarms
+    ('alarm_emergency_stop', ('alarms', 'emergency_stop'), False),
+    ('alarm_low_oil_pressure', ('alarms', 'low_oil_pressure'), False),
+    ('alarm_high_coolant_temp', ('alarms', 'high_coolant_temp'), False),
+    ('alarm_low_coolant_level', ('alarms', 'low_coolant_level'), False),
+    ('alarm_crank_failure', ('alarms', 'crank_failure'), False),
+]
+
+
+# Value coercion, mirroring the rules MeterDataSerializer applies per field
+
+TRUE_VALUES = {'t', 'T', 'y', 'Y', 'yes', 'Yes', 'YES', 'true', 'True', 'TRUE', 'on', 'On', 'ON', '1', 1, True}
+FALSE_VALUES = {'f', 'F', 'n', 'N', 'no', 'No', 'NO', 'false', 'False', 'FALSE', 'off', 'Off', 'OFF', '0', 0, 0.0, False}
+
+NULL_ERROR = "This field may not be null."
+SECTION_ERROR = "Must be an object."
+
+# Longest numeric string DRF's number fields will parse
+MAX_STRING_LENGTH = 1000
+
+
+def to_float(value):
+    if isinstance(value, str) and len(value) > MAX_STRING_LENGTH:
+        raise ValueError("String value too large.")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("A valid number is required.")
+    except OverflowError:
+        raise ValueError("Integer value too large to convert to float")
+    if not math.isfinite(number):
+        raise ValueError("A valid number is required.")
+    return number
+
+
+def to_int(value):
+    if isinstance(value, bool):
+        raise ValueError("A valid integer is required.")
+    if isinstance(value, str) and len(value) > MAX_STRING_LENGTH:
+        raise ValueError("String value too large.")
+    if isinstance(value, int):
+        return value
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("A valid integer is required.")
+    if not number.is_integer():
+        raise ValueError("A valid integer is required.")
+    return int(number)
+
+
+def int_coercer(min_value, max_value):
+    def to_bounded_int(value):
+        value = to_int(value)
+        if max_value is not None and value > max_value:
+            raise ValueError(f"Ensure this value is less than or equal to {max_value}.")
+        if min_value is not None and value < min_value:
+            raise ValueError(f"Ensure this value is greater than or equal to {min_value}.")
+        return value
+    return to_bounded_int
+
+
+def to_bool(value):
+    try:
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+    except TypeError:
+        pass
+    raise ValueError("Must be a valid boolean.")
+
+
+def char_coercer(max_length):
+    def to_str(value):
+        if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+            raise ValueError("Not a valid string.")
+        value = str(value).strip()
+        if max_length is not None and len(value) > max_length:
+            raise ValueError(f"Ensure this field has no more than {max_length} characters.")
+        return value
+    return to_str
+
+
+def _column_rule(field):
+    """
+    Return ``(coerce, fast_check)`` for a model field.
+
+    ``fast_check`` is an expression over ``v`` that is true when the value
+    already has the column's native type and needs no coercion.
+    """
+    if isinstance(field, models.BooleanField):
+        return to_bool, "v is True or v is False"
+    if isinstance(field, models.IntegerField):
+        # The database range, which the serializer enforces through the field's validators
+        min_value = max((v.limit_value for v in field.validators if isinstance(v, MinValueValidator)), default=None)
+        max_value = min((v.limit_value for v in field.validators if isinstance(v, MaxValueValidator)), default=None)
+        checks = ["v.__class__ is int"]
+        if min_value is not None:
+            checks.append(f"v >= {min_value}")
+        if max_value is not None:
+            checks.append(f"v <= {max_value}")
+        return int_coercer(min_value, max_value), " and ".join(checks)
+    if isinstance(field, models.FloatField):
+        return to_float, "v.__class__ is float and isfinite(v)"
+    return char_coercer(field.max_length), "False"
+
+
+def compile_schema(schema, model=MeterData):
+    """
+    Compile a schema into ``flatten(data) -> (row, errors)``.
+
+    Each nested section is looked up once, values that already have the
+    right type skip coercion entirely, and the whole mapping runs as one
+    straight-line function instead of a loop over field objects.
+    """
+    namespace = {'NULL_ERROR': NULL_ERROR, 'SECTION_ERROR': SECTION_ERROR, 'EMPTY': {}, 'isfinite': math.isfinite}
+    lines = ["def flatten(data):", "    row = {}", "    errors = {}"]
+    sections = {(): 'data'}
+
+    for index, (column, path, default) in enumerate(schema):
+        field = model._meta.get_field(column)
+        coerce, fast_check = _column_rule(field)
+        namespace[f'coerce_{index}'] = coerce
+        namespace[f'default_{index}'] = default
+
+        # Resolve each enclosing section once and reuse it for later columns
+        for depth in range(1, len(path)):
+            prefix = path[:depth]
+            if prefix in sections:
+                continue
+            parent = sections[prefix[:-1]]
+            name = f"section_{len(sections)}"
+            sections[prefix] = name
+            key = prefix[-1]
+            lines += [
+                f"    {name} = {parent}.get({key!r}, EMPTY)",
+                f"    if {name}.__class__ is not dict:",
+                f"        errors[{'.'.join(prefix)!r}] = [SECTION_ERROR]",
+                f"        {name} = EMPTY",
+            ]
+
+        lines.append(f"    v = {sections[path[:-1]]}.get({path[-1]!r}, default_{index})")
+        lines.append(f"    if v is None:")
+        if field.null:
+            lines.append(f"        pass")
+        else:
+            lines.append(f"        errors[{column!r}] = [NULL_ERROR]")
+        lines += [
+            f"    elif not ({fast_check}):",
+            f"        try:",
+            f"            v = coerce_{index}(v)",
+            f"        except ValueError as e:",
+            f"            errors[{column!r}] = [str(e)]",
+            f"    row[{column!r}] = v",
+        ]
+
+    lines.append("    return row, errors")
+    exec("\n".join(lines), namespace)
+    return namespace['flatten']
+
+
+flatten_reading = compile_schema(READING_SCHEMA)
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Meter, MeterAssignment, MeterData
+from .models import AlarmRule, Meter, MeterAssignment, MeterData, ReportJob
+from .rules import RULE_FIELDS
 from django.core.exceptions import ValidationError
 
 class MeterSerializer(serializers.ModelSerializer):
@@ -51,12 +52,39 @@ class MeterDataSerializer(serializers.ModelSerializer):
             'phase_b_real_power', 'phase_b_apparent_power', 'phase_b_reactive_power',
             'phase_c_voltage_v', 'phase_c_current_a', 'phase_c_voltage_ll', 'phase_c_frequency_hz',
             'phase_c_real_power', 'phase_c_apparent_power', 'phase_c_reactive_power',
+            'total_real_power', 'total_apparent_power', 'total_reactive_power', 'power_factor',
+            'voltage_imbalance_pct', 'current_imbalance_pct',
             'gen_breaker', 'util_breaker', 'gc_status',
             'coolant_temp_c', 'oil_pressure_kpa', 'battery_voltage_v', 'fuel_level_percent',
             'rpm', 'oil_temp_c', 'boost_pressure_kpa', 'intake_air_temp_c', 'fuel_rate_lph',
             'instantaneous_power_kw', 'alarm_emergency_stop', 'alarm_low_oil_pressure',
             'alarm_high_coolant_temp', 'alarm_low_coolant_level', 'alarm_crank_failure'
         ]
-        read_only_fields = ['timestamp']
+        read_only_fields = [
+            'timestamp', 'total_real_power', 'total_apparent_power', 'total_reactive_power', 'power_factor',
+            'voltage_imbalance_pct', 'current_imbalance_pct',
+        ]
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    device_id = serializers.CharField(source='meter.device_id', default=None, read_only=True)
+
+    class Meta:
+        model = ReportJob
+        fields = ['id', 'report_type', 'status', 'device_id', 'params', 'filename', 'error',
+                  'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
 
+class AlarmRuleSerializer(serializers.ModelSerializer):
+    meter = serializers.SlugRelatedField(slug_field='device_id', queryset=Meter.objects.all(),
+                                         required=False, allow_null=True)
+
+    class Meta:
+        model = AlarmRule
+        fields = ['id', 'name', 'meter', 'field', 'operator', 'threshold', 'duration_seconds', 'enabled',
+                  'created_at', 'updated_at']
+        read_only_fields = ['created_at', 'updated_at']
 
+    def validate_field(self, value):
+        if value not in RULE_FIELDS:
+            raise serializers.ValidationError(f"{value} is not a numeric MeterData field or derived metric")
+        return value
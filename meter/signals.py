@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import resolver
+from .models import AlarmRule, Meter
+from .rules import engine
+
+
+@receiver([post_save, post_delete], sender=Meter)
+def invalidate_meter_cache(sender, **kwargs):
+    """Any change to a meter drops cached device_id lookups in every worker"""
+    resolver.clear()
+    # Clear again and publish once the change is visible to other connections
+    transaction.on_commit(resolver.invalidate)
+
+
+@receiver([post_save, post_delete], sender=AlarmRule)
+def reload_alarm_rules(sender, **kwargs):
+    """Any change to a rule makes every worker recompile its rules"""
+    engine.clear()
+    transaction.on_commit(engine.invalidate)
@@ -0,0 +1,252 @@
+"""
+Mergeable quantile sketches for fleet-wide percentiles.
+
+Ingest folds SKETCH_FIELDS of every reading into a t-digest per meter, UTC
+day and field, stored as a MeterDailySketch row. A t-digest keeps values
+as weighted centroids. The centroids are small near the minimum and
+maximum and larger towards the median. METER_SKETCH_COMPRESSION bounds
+their number to about half its value, whatever the number of readings.
+Digests merge by pooling their centroids. Percentiles of any set of
+meters over any run of whole days are therefore read from at most one
+row per meter, day and field, never from the raw readings.
+
+Compression is vectorized across digests. The centroids of every digest
+touched by a batch, and the batch's new values, are sorted together by
+digest and value in one pass. Each centroid is given a slot of the
+arcsine scale function from the share of its digest's weight that lies
+below it. One ``np.add.reduceat`` then collapses each slot into a single
+centroid.
+
+Readings are folded in whatever order they arrive, so late readings need
+no special handling. ``python manage.py sketch_catchup`` rebuilds a
+meter's digests from its raw readings, for history written before
+sketches existed or after SKETCH_FIELDS changes. As with daily totals,
+two workers updating the same digest at the same moment can lose one of
+the updates.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+
+from .models import MeterDailySketch, MeterData
+
+# Fold readings into the daily sketches as part of every ingest write
+SKETCH_AT_INGEST = getattr(settings, 'METER_SKETCH_AT_INGEST', True)
+
+# Fields sketched; a percentile query can only ask for these
+SKETCH_FIELDS = getattr(settings, 'METER_SKETCH_FIELDS', [
+    'coolant_temp_c', 'oil_pressure_kpa', 'rpm', 'instantaneous_power_kw', 'fuel_rate_lph',
+])
+
+# t-digest compression: a digest keeps about half this many centroids
+COMPRESSION = getattr(settings, 'METER_SKETCH_COMPRESSION', 200)
+
+DAY = 24 * 60 * 60
+
+
+def encode(means, weights):
+    """Centroids as bytes: float64 means followed by float32 weights"""
+    return means.astype('<f8').tobytes() + weights.astype('<f4').tobytes()
+
+
+def decode(data):
+    """``(means, weights)`` of encoded centroids"""
+    data = bytes(data)
+    size = len(data) // 12
+    return (
+        np.frombuffer(data, dtype='<f8', count=size),
+        np.frombuffer(data, dtype='<f4', count=size, offset=8 * size).astype(np.float64),
+    )
+
+
+def compress(groups, means, weights, compression=COMPRESSION):
+    """
+    Merge the centroids of several digests at once.
+
+    ``groups`` numbers the digest each centroid belongs to. Returns
+    ``(groups, means, weights)`` of the compressed centroids, sorted by
+    digest and then by mean.
+    """
+    order = np.lexsort((means, groups))
+    groups, means, weights = groups[order], means[order], weights[order]
+    first = np.ones(len(groups), dtype=bool)
+    first[1:] = groups[1:] != groups[:-1]
+    segment = np.cumsum(first) - 1
+
+    # Share of its digest's weight below each centroid, mapped onto the arcsine scale
+    below = np.cumsum(weights) - weights
+    below -= below[first][segment]
+    totals = np.add.reduceat(weights, np.flatnonzero(first))
+    scale = np.floor(compression / (2 * np.pi) * np.arcsin(np.clip(2 * below / totals[segment] - 1, -1, 1)))
+
+    start = first.copy()
+    start[1:] |= scale[1:] != scale[:-1]
+    starts = np.flatnonzero(start)
+    merged_weights = np.add.reduceat(weights, starts)
+    return groups[starts], np.add.reduceat(means * weights, starts) / merged_weights, merged_weights
+
+
+def sketch_rows(rows):
+    """Fold ``(meter_id, timestamp, *SKETCH_FIELDS)`` tuples into MeterDailySketch rows"""
+    if not rows or not SKETCH_FIELDS:
+        return
+    meter_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    days = np.floor_divide(
+        np.fromiter((row[1].timestamp() for row in rows), dtype=np.float64, count=len(rows)), DAY
+    ).astype(np.int64)
+    values = np.array([row[2:] for row in rows], dtype=np.float64).reshape(len(rows), len(SKETCH_FIELDS))
+
+    # One digest per (meter, day, field) that has values in the batch
+    present = ~np.isnan(values)
+    reading, column = np.nonzero(present)
+    keys = np.stack([meter_ids[reading], days[reading], column], axis=1)
+    digests, groups = np.unique(keys, axis=0, return_inverse=True)
+    groups = groups.reshape(-1)
+    new_values = values[present]
+    if not len(new_values):
+        return
+
+    day_dates = {day: datetime.fromtimestamp(day * DAY, tz=dt_timezone.utc).date() for day in np.unique(days).tolist()}
+    wanted = {
+        (meter_pk, day_dates[day], SKETCH_FIELDS[field]): index
+        for index, (meter_pk, day, field) in enumerate(digests.tolist())
+    }
+    existing = {}
+    for sketch in MeterDailySketch.objects.filter(
+        meter_id__in=np.unique(meter_ids).tolist(), day__in=list(day_dates.values()), field__in=SKETCH_FIELDS
+    ):
+        index = wanted.get((sketch.meter_id, sketch.day, sketch.field))
+        if index is not None:
+            existing[index] = sketch
+
+    all_groups = [groups]
+    all_means = [new_values]
+    all_weights = [np.ones(len(new_values))]
+    for index, sketch in existing.items():
+        means, weights = decode(sketch.centroids)
+        all_groups.append(np.full(len(means), index))
+        all_means.append(means)
+        all_weights.append(weights)
+    merged_groups, merged_means, merged_weights = compress(
+        np.concatenate(all_groups), np.concatenate(all_means), np.concatenate(all_weights)
+    )
+    bounds = np.flatnonzero(np.diff(merged_groups)) + 1
+
+    # Exact extremes and counts of the new values per digest
+    order = np.argsort(groups, kind='stable')
+    starts = np.flatnonzero(np.diff(groups[order], prepend=-1))
+    counts = np.diff(np.append(starts, len(order))).tolist()
+    minimums = np.minimum.reduceat(new_values[order], starts).tolist()
+    maximums = np.maximum.reduceat(new_values[order], starts).tolist()
+
+    merged = []
+    for index, ((meter_pk, day, field), means, weights) in enumerate(zip(
+        digests.tolist(), np.split(merged_means, bounds), np.split(merged_weights, bounds)
+    )):
+        sketch = existing.get(index)
+        merged.append(MeterDailySketch(
+            meter_id=meter_pk,
+            day=day_dates[day],
+            field=SKETCH_FIELDS[field],
+            count=counts[index] + (sketch.count if sketch else 0),
+            minimum=min(minimums[index], sketch.minimum) if sketch else minimums[index],
+            maximum=max(maximums[index], sketch.maximum) if sketch else maximums[index],
+            centroids=encode(means, weights),
+        ))
+    MeterDailySketch.objects.bulk_create(
+        merged,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['meter', 'day', 'field'],
+        update_fields=['count', 'minimum', 'maximum', 'centroids'],
+    )
+
+
+def sketch_instances(instances):
+    """Fold freshly written MeterData instances into the daily sketches"""
+    sketch_rows([
+        (instance.meter_id, instance.timestamp, *(getattr(instance, field) for field in SKETCH_FIELDS))
+        for instance in instances
+    ])
+
+
+def rebuild(meter_pk, chunk_size=50000):
+    """Recompute one meter's daily sketches from all of its raw readings; returns readings read"""
+    MeterDailySketch.objects.filter(meter_id=meter_pk).delete()
+    readings = (
+        MeterData.objects.filter(meter_id=meter_pk)
+        .order_by('timestamp', 'id')
+        .values_list('meter_id', 'timestamp', *SKETCH_FIELDS)
+    )
+    total = 0
+    chunk = []
+    for row in readings.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            sketch_rows(chunk)
+            total += len(chunk)
+            chunk = []
+    sketch_rows(chunk)
+    return total + len(chunk)
+
+
+def quantiles(means, weights, minimum, maximum, percentiles):
+    """
+    Percentiles of pooled centroids. Each centroid stands at the middle of
+    its weight, and values between centroids are interpolated linearly,
+    out to the exact minimum and maximum at the ends.
+    """
+    order = np.argsort(means, kind='stable')
+    means, weights = means[order], weights[order]
+    total = weights.sum()
+    centers = np.cumsum(weights) - weights / 2
+    return np.interp(
+        np.asarray(percentiles, dtype=np.float64) / 100 * total,
+        np.concatenate([[0], centers, [total]]),
+        np.concatenate([[minimum], means, [maximum]]),
+    )
+
+
+def fleet_percentiles(fields, first_day, last_day, percentiles, meter_ids=None):
+    """
+    Percentiles of ``fields`` over the days ``[first_day, last_day)``,
+    merged across ``meter_ids`` or the whole fleet. Returns
+    ``{field: {...}}``; statistics of a field without values are None.
+    """
+    sketches = MeterDailySketch.objects.filter(day__gte=first_day, day__lt=last_day, field__in=fields)
+    if meter_ids is not None:
+        sketches = sketches.filter(meter_id__in=meter_ids)
+    pooled = {field: {'means': [], 'weights': [], 'count': 0, 'min': [], 'max': [], 'meters': set(), 'days': set()}
+              for field in fields}
+    for meter_pk, day, field, count, minimum, maximum, centroids in sketches.values_list(
+        'meter_id', 'day', 'field', 'count', 'minimum', 'maximum', 'centroids'
+    ).iterator():
+        means, weights = decode(centroids)
+        entry = pooled[field]
+        entry['means'].append(means)
+        entry['weights'].append(weights)
+        entry['count'] += count
+        entry['min'].append(minimum)
+        entry['max'].append(maximum)
+        entry['meters'].add(meter_pk)
+        entry['days'].add(day)
+
+    result = {}
+    for field, entry in pooled.items():
+        minimum = min(entry['min'], default=None)
+        maximum = max(entry['max'], default=None)
+        if entry['means']:
+            values = quantiles(np.concatenate(entry['means']), np.concatenate(entry['weights']),
+                               minimum, maximum, percentiles).tolist()
+        else:
+            values = [None] * len(percentiles)
+        result[field] = {
+            "count": entry['count'],
+            "meters": len(entry['meters']),
+            "days": len(entry['days']),
+            "min": minimum,
+            "max": maximum,
+            "percentiles": {f"p{percentile:g}": value for percentile, value in zip(percentiles, values)},
+        }
+    return result
@@ -0,0 +1,500 @@
+"""
+Crash-safe on-disk spool for telemetry ingest.
+
+When METER_INGEST_MODE is ``'spooled'``, MeterDataViewSet.create appends each
+validated reading to an append-only segment file and answers 202 once the
+record has been fsync'd. Concurrent requests share fsyncs: whichever thread
+finds no sync in progress flushes everything appended so far, and the
+others wait for it (group commit).
+
+Each worker process owns one open segment, named
+``<pid>-<seq>-<token>.open`` where the token is random, and holds an
+exclusive ``flock`` on it for as long as it writes there. A segment is
+sealed (renamed to ``.sealed``) when it grows past
+METER_INGEST_SPOOL_SEGMENT_BYTES or has been idle for the replay interval.
+A background replayer locks a sealed segment, claims it by renaming it,
+loads its records into MeterData and deletes it. An open or claimed
+segment whose lock can be taken belongs to a process that is gone, however
+its PID has been reused since; it is sealed again and picked up the next
+time any replayer runs, including ``python manage.py spool replay``. Locks
+need the spool directory on a local filesystem.
+
+Records are framed as ``<length:uint32><crc32:uint32><json payload>``. A torn
+record at the end of a segment (the process died mid-write) is ignored.
+A segment is recorded in SpoolReplay in the same transaction as its rows,
+so one loaded again after a crash between committing and deleting it is
+skipped.
+
+Rows that cannot be written (for a meter deleted since it was spooled, or
+that the database refuses) are rejected one at a time, the rest of the
+segment is written, and the rejected records are kept in a segment under
+``quarantine/``. A segment that fails for any other reason than the
+database being unavailable is moved to ``quarantine/`` whole, so the
+segments after it still drain. ``python manage.py spool inspect`` lists
+quarantined segments.
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .ingest import parse_timestamp, write_rows
+from .models import Meter, SpoolReplay
+
+logger = logging.getLogger(__name__)
+
+# Directory holding spool segments
+SPOOL_DIR = getattr(settings, 'METER_INGEST_SPOOL_DIR', os.path.join(settings.MEDIA_ROOT, 'spool'))
+
+# Size at which the open segment is sealed and a new one started
+SPOOL_SEGMENT_BYTES = getattr(settings, 'METER_INGEST_SPOOL_SEGMENT_BYTES', 16 * 1024 * 1024)
+
+# Seconds between replay passes; an open segment idle this long is sealed
+SPOOL_REPLAY_INTERVAL = getattr(settings, 'METER_INGEST_SPOOL_REPLAY_INTERVAL', 2.0)
+
+# Days a replayed segment is remembered, guarding against loading it twice
+SPOOL_REPLAY_RETENTION_DAYS = getattr(settings, 'METER_INGEST_SPOOL_REPLAY_RETENTION_DAYS', 7)
+
+HEADER = struct.Struct('>II')
+
+NEW = 'new'
+OPEN = 'open'
+SEALED = 'sealed'
+REPLAYING = 'replaying'
+
+QUARANTINE_DIR = 'quarantine'
+
+# The database being unreachable or busy; the segment is retried on a later pass
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+Replay = namedtuple('Replay', ['written', 'rejected', 'quarantined', 'already_replayed'])
+
+
+def _lock(path, shared=False):
+    """Take a non-blocking flock on ``path``; returns the locked descriptor, or None if held elsewhere or gone"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(fd, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+def is_locked(path):
+    """Whether a live process holds the segment at ``path``"""
+    fd = _lock(path, shared=True)
+    if fd is None:
+        return os.path.exists(path)
+    os.close(fd)
+    return False
+
+
+def _fsync_directory(directory):
+    """Make a newly created or renamed segment's directory entry durable"""
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def parse_segment_name(name):
+    """Split ``<pid>-<seq>[-<token>].<state>[-<claimer pid>]`` into its parts, or return None"""
+    try:
+        stem, state = name.split('.', 1)
+        pid, seq = stem.split('-', 2)[:2]
+        owner = int(pid)
+        if state.startswith(REPLAYING + '-'):
+            owner = int(state[len(REPLAYING) + 1:])
+            state = REPLAYING
+        elif state not in (NEW, OPEN, SEALED):
+            return None
+        return {"name": name, "stem": stem, "pid": int(pid), "seq": int(seq), "state": state, "owner": owner}
+    except ValueError:
+        return None
+
+
+def list_segments(directory=SPOOL_DIR):
+    """Return parsed segment names in the spool directory, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    segments = [parse_segment_name(name) for name in os.listdir(directory)]
+    return sorted((s for s in segments if s), key=lambda s: (s['seq'], s['pid']))
+
+
+def encode_row(row):
+    row = dict(row)
+    row['timestamp'] = row['timestamp'].isoformat()
+    return json.dumps(row, separators=(',', ':')).encode()
+
+
+def decode_row(payload):
+    row = json.loads(payload)
+    row['timestamp'] = parse_timestamp(row['timestamp'])
+    return row
+
+
+def frame(payload):
+    return HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_segment(path):
+    """
+    Read every intact record from a segment.
+
+    Returns ``(payloads, torn_bytes)`` where ``torn_bytes`` counts trailing
+    bytes that did not form a complete record with a valid checksum.
+    """
+    payloads = []
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset + HEADER.size <= len(data):
+        length, checksum = HEADER.unpack_from(data, offset)
+        start = offset + HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            break
+        payloads.append(payload)
+        offset = start + length
+    return payloads, len(data) - offset
+
+
+class SpoolWriter:
+    """Appends records to this process's open segment with group-committed fsyncs"""
+
+    def __init__(self, directory=SPOOL_DIR, segment_bytes=SPOOL_SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.cond = threading.Condition()
+        self.file = None
+        self.path = None
+        self.size = 0
+        self.opened_at = 0
+        self.appended = 0
+        self.synced = 0
+        self.syncing = False
+        self.seq = int(time.time() * 1000)
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, payload):
+        """Append one record and return once it is durable on disk"""
+        record = frame(payload)
+        with self.cond:
+            if self.file is None:
+                self._open_segment()
+            self.file.write(record)
+            self.size += len(record)
+            self.appended += 1
+            ticket = self.appended
+
+            while self.synced < ticket:
+                if self.syncing:
+                    self.cond.wait()
+                    continue
+                # Lead a group commit covering everything appended so far
+                self.syncing = True
+                target = self.appended
+                fd = self.file.fileno()
+                self.cond.release()
+                try:
+                    os.fsync(fd)
+                finally:
+                    self.cond.acquire()
+                    self.syncing = False
+                    self.cond.notify_all()
+                self.synced = max(self.synced, target)
+                if self.size >= self.segment_bytes:
+                    self._seal()
+
+    def seal_if_idle(self, idle_seconds):
+        """Seal the open segment if it holds records and has been open for a while"""
+        with self.cond:
+            if self.file is not None and not self.syncing and self.size and \
+                    time.monotonic() - self.opened_at >= idle_seconds:
+                self._seal()
+
+    def close(self):
+        with self.cond:
+            while self.syncing:
+                self.cond.wait()
+            if self.file is not None:
+                self._seal()
+
+    def _open_segment(self):
+        self.seq += 1
+        stem = f"{os.getpid()}-{self.seq}-{uuid.uuid4().hex}"
+        new = os.path.join(self.directory, f"{stem}.{NEW}")
+        self.path = os.path.join(self.directory, f"{stem}.{OPEN}")
+        self.file = open(new, 'ab', buffering=0)
+        # Locked before it is visible as open, so recover() never takes it for an orphan
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        os.rename(new, self.path)
+        _fsync_directory(self.directory)
+        self.size = 0
+        self.opened_at = time.monotonic()
+
+    def _seal(self):
+        """Fsync and publish the open segment for replay, then close it; caller holds the lock"""
+        os.fsync(self.file.fileno())
+        self.synced = self.appended
+        # Renamed while still locked, so recover() cannot seal it a second time
+        if self.size:
+            os.rename(self.path, self.path[:-len(OPEN)] + SEALED)
+        else:
+            os.remove(self.path)
+        _fsync_directory(self.directory)
+        self.file.close()
+        self.file = None
+        self.path = None
+
+
+def recover(directory=SPOOL_DIR):
+    """Reset segments whose writer or replayer process is gone so they get replayed"""
+    for segment in list_segments(directory):
+        if segment['state'] == SEALED:
+            continue
+        path = os.path.join(directory, segment['name'])
+        fd = _lock(path)
+        if fd is None:
+            continue
+        try:
+            if segment['state'] == NEW:
+                # Created but never written to
+                os.remove(path)
+            else:
+                os.rename(path, os.path.join(directory, f"{segment['stem']}.{SEALED}"))
+        except FileNotFoundError:
+            pass
+        finally:
+            os.close(fd)
+
+
+def quarantine(directory, stem, payloads):
+    """Keep records that could not be replayed in a sealed segment under quarantine/; returns its relative path"""
+    quarantine_dir = os.path.join(directory, QUARANTINE_DIR)
+    os.makedirs(quarantine_dir, exist_ok=True)
+    name = f"{stem}.{SEALED}"
+    path = os.path.join(quarantine_dir, name)
+    with open(path + '.tmp', 'wb') as f:
+        for payload in payloads:
+            f.write(frame(payload))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+    _fsync_directory(quarantine_dir)
+    return os.path.join(QUARANTINE_DIR, name)
+
+
+def write_isolated(rows, payloads):
+    """
+    Write rows, splitting the batch in half on failure down to single rows.
+    Returns ``(written, payloads of the rows that could not be written)``.
+    """
+    try:
+        write_rows(rows)
+    except TRANSIENT_ERRORS:
+        raise
+    except Exception:
+        if len(rows) == 1:
+            logger.exception("Rejecting spooled meter reading that could not be written: %r", payloads[0])
+            return 0, payloads
+        middle = len(rows) // 2
+        written, rejected = write_isolated(rows[:middle], payloads[:middle])
+        more, more_rejected = write_isolated(rows[middle:], payloads[middle:])
+        return written + more, rejected + more_rejected
+    return len(rows), []
+
+
+def load_records(payloads):
+    """
+    Decode payloads into rows ready for write_rows. Returns ``(rows,
+    row_payloads, rejected)``; records that do not decode, or whose meter
+    no longer exists, are rejected.
+    """
+    decoded = []
+    rejected = []
+    for payload in payloads:
+        try:
+            decoded.append((decode_row(payload), payload))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            logger.warning("Rejecting undecodable spooled meter reading: %r", payload)
+            rejected.append(payload)
+    # Foreign keys are only checked at commit, too late to single out a row
+    meters = set(Meter.objects.filter(
+        pk__in={row.get('meter_id') for row, _ in decoded if isinstance(row.get('meter_id'), int)}
+    ).values_list('pk', flat=True))
+    rows = []
+    row_payloads = []
+    for row, payload in decoded:
+        if row.get('meter_id') in meters:
+            rows.append(row)
+            row_payloads.append(payload)
+        else:
+            logger.warning("Rejecting spooled meter reading for missing meter: %r", payload)
+            rejected.append(payload)
+    return rows, row_payloads, rejected
+
+
+def replay_segment(name, directory=SPOOL_DIR):
+    """
+    Claim a sealed segment, load it into MeterData and delete it.
+
+    Returns a Replay, or None if another process claimed the segment
+    first. Raises on errors that mean the database is unavailable, leaving
+    the segment sealed for a later pass.
+    """
+    segment = parse_segment_name(name)
+    path = os.path.join(directory, name)
+    fd = _lock(path)
+    if fd is None:
+        return None
+    try:
+        claimed = os.path.join(directory, f"{segment['stem']}.{REPLAYING}-{os.getpid()}")
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return None
+
+        payloads = []
+        try:
+            payloads, torn = read_segment(claimed)
+            if torn:
+                logger.warning("Ignoring %d torn bytes at the end of spool segment %s", torn, name)
+            with transaction.atomic():
+                if SpoolReplay.objects.filter(segment=segment['stem']).exists():
+                    logger.warning("Spool segment %s was already replayed, discarding it", name)
+                    result = Replay(0, 0, None, True)
+                else:
+                    rows, row_payloads, rejected = load_records(payloads)
+                    written, failed = write_isolated(rows, row_payloads)
+                    rejected += failed
+                    SpoolReplay.objects.create(segment=segment['stem'], rows=written, rejected=len(rejected))
+                    quarantined = quarantine(directory, segment['stem'], rejected) if rejected else None
+                    result = Replay(written, len(rejected), quarantined, False)
+        except TRANSIENT_ERRORS:
+            # Hand the segment back so a later pass can retry it
+            os.rename(claimed, path)
+            raise
+        except Exception:
+            logger.exception("Moving spool segment %s that could not be replayed to quarantine", name)
+            os.makedirs(os.path.join(directory, QUARANTINE_DIR), exist_ok=True)
+            quarantined = os.path.join(QUARANTINE_DIR, f"{segment['stem']}.{SEALED}")
+            os.rename(claimed, os.path.join(directory, quarantined))
+            _fsync_directory(os.path.join(directory, QUARANTINE_DIR))
+            return Replay(0, len(payloads), quarantined, False)
+        if result.quarantined:
+            logger.warning("Kept %d rejected records of spool segment %s in %s", result.rejected, name, result.quarantined)
+        os.remove(claimed)
+        return result
+    finally:
+        os.close(fd)
+
+
+def discard_segment(name, directory=SPOOL_DIR):
+    """
+    Delete a sealed segment without loading it, holding its lock like a
+    replayer does. Returns False if another process holds or claimed it.
+    """
+    path = os.path.join(directory, name)
+    fd = _lock(path)
+    if fd is None:
+        return False
+    try:
+        # A replayer may have claimed the file between our open and our lock
+        try:
+            if os.stat(path).st_ino != os.fstat(fd).st_ino:
+                return False
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        _fsync_directory(directory)
+        return True
+    finally:
+        os.close(fd)
+
+
+def replay_all(directory=SPOOL_DIR):
+    """Recover abandoned segments and replay every sealed one; returns rows written"""
+    recover(directory)
+    written = 0
+    for segment in list_segments(directory):
+        if segment['state'] == SEALED:
+            result = replay_segment(segment['name'], directory)
+            written += result.written if result else 0
+    SpoolReplay.objects.filter(
+        replayed_at__lt=timezone.now() - timedelta(days=SPOOL_REPLAY_RETENTION_DAYS)
+    ).delete()
+    return written
+
+
+class Spool:
+    """Per-process spool: a writer plus a background replayer thread"""
+
+    def __init__(self, directory=SPOOL_DIR, interval=SPOOL_REPLAY_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.writer = SpoolWriter(directory)
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='meter-spool-replayer', daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def append(self, row):
+        self.writer.append(encode_row(row))
+
+    def stop(self, timeout=30):
+        """Seal the open segment and replay it before the process exits"""
+        self.writer.close()
+        self.stopping.set()
+        self.thread.join(timeout)
+
+    def _run(self):
+        try:
+            # Replay whatever earlier workers left behind, then keep draining
+            while True:
+                try:
+                    close_old_connections()
+                    replay_all(self.directory)
+                except Exception:
+                    logger.exception("Failed to replay meter data spool")
+                if self.stopping.wait(self.interval):
+                    break
+                self.writer.seal_if_idle(self.interval)
+            replay_all(self.directory)
+        finally:
+            connection.close()
+
+
+_spool = None
+_spool_pid = None
+_spool_lock = threading.Lock()
+
+
+def get_spool():
+    """Return this process's spool, starting its replayer on first use"""
+    global _spool, _spool_pid
+    with _spool_lock:
+        if _spool is None or _spool_pid != os.getpid():
+            _spool = Spool()
+            _spool_pid = os.getpid()
+            _spool.start()
+            atexit.register(_spool.stop)
+        return _spool
@@ -1,3 +1,1400 @@
-from django.test import TestCase
+import base64
+import importlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User
+
+from . import alarms
+from .anomalies import RollingStats, stats as anomaly_stats
+from .analytics import alarm_episodes, alarm_summary, load_flags
+from .buffer import BufferFull, IngestBuffer
+from .cache import MeterResolver, resolver
+from .exports import PARQUET_AVAILABLE
+from .ingest import ingest_stream, write_rows
+from .jobs import claim, claim_next, execute, run_job, submit
+from .models import (
+    AlarmEvent, AlarmRule, Anomaly, Meter, MeterDailySketch, MeterDailyTotal, MeterData, MeterDataRollup, MeterLatest,
+    MeterTotalizer, ReportJob, SpoolReplay,
+)
+from .queries import readings_in_range
+from .retention import evict, touch
+from .rollups import rebuild
+from .rules import engine
+from .schema import READING_SCHEMA, flatten_reading
+from .serializers import MeterDataSerializer
+from . import sketches, spool, totalizers
+
+
+def make_readings(meter, start, count, step=timedelta(seconds=10)):
+    row, _ = flatten_reading({})
+    return MeterData.objects.bulk_create([
+        MeterData(meter=meter, timestamp=start + step * i, **row) for i in range(count)
+    ])
+
+
+class ReadingSchemaTests(TestCase):
+    """The compiled flattener must accept, coerce and reject exactly like MeterDataSerializer did"""
+
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_01', location='Plant A')
+
+    def serializer_path(self, data):
+        # The per-field mapping the create view used before the schema was compiled
+        mapped = {'meter': self.meter.id}
+        for column, path, default in READING_SCHEMA:
+            section = data
+            for key in path[:-1]:
+                section = section.get(key, {})
+            mapped[column] = section.get(path[-1], default)
+        serializer = MeterDataSerializer(data=mapped)
+        if not serializer.is_valid():
+            return None, {field: [str(error) for error in errors] for field, errors in serializer.errors.items()}
+        row = dict(serializer.validated_data)
+        row.pop('meter')
+        return row, {}
+
+    def assert_parity(self, data):
+        row, errors = flatten_reading(data)
+        expected_row, expected_errors = self.serializer_path(data)
+        self.assertEqual(errors, expected_errors)
+        if not errors:
+            self.assertEqual(row, expected_row)
+            for column, value in row.items():
+                self.assertIs(type(value), type(expected_row[column]), column)
+        return row, errors
+
+    def test_full_reading(self):
+        phase = {'voltage_v': 230.1, 'current_a': '101.5', 'voltage_ll': 398, 'frequency_hz': 50.0,
+                 'real_power': 21.5, 'apparent_power': 23, 'reactive_power': '7.5'}
+        row, _ = self.assert_parity({
+            'engine_hours': 1200, 'frequency_hz': '50.02', 'power_percentage': 61.5,
+            'avg_ll_volt': 399.1, 'avg_ln_volt': 230.4, 'avg_current': 100,
+            'phase_a': phase, 'phase_b': dict(phase, current_a=98), 'phase_c': dict(phase, current_a=103),
+            'gen_breaker': ' closed ', 'util_breaker': 'open', 'gc_status': 'auto',
+            'coolant_temp_c': 85, 'oil_pressure_kpa': 410.5, 'battery_voltage_v': 13.6, 'fuel_level_percent': 70,
+            'rpm': '1500', 'oil_temp_c': 92, 'boost_pressure_kpa': 150.2, 'intake_air_temp_c': 35,
+            'fuel_rate_lph': 42.1, 'instantaneous_power_kw': 64.2,
+            'alarms': {'emergency_stop': 'false', 'low_oil_pressure': 1, 'high_coolant_temp': False,
+                       'low_coolant_level': 'no', 'crank_failure': 'yes'},
+        })
+        self.assertEqual((row['phase_b_current_a'], row['gen_breaker'], row['alarm_crank_failure']), (98.0, 'closed', True))
+
+    def test_missing_and_null_fields(self):
+        self.assert_parity({})
+        self.assert_parity({'phase_a': {}, 'alarms': {}})
+        self.assert_parity({'gen_breaker': None, 'util_breaker': None})
+        _, errors = self.assert_parity({'rpm': None, 'phase_b': {'voltage_v': None}, 'alarms': {'emergency_stop': None}})
+        self.assertEqual(set(errors), {'rpm', 'phase_b_voltage_v', 'alarm_emergency_stop'})
+
+    def test_coercion_failures(self):
+        _, errors = self.assert_parity({
+            'engine_hours': 1.5, 'rpm': 'fast', 'frequency_hz': [50], 'coolant_temp_c': True,
+            'phase_c': {'current_a': 'n/a'}, 'gc_status': {'state': 'auto'}, 'gen_breaker': 'x' * 500,
+            'alarms': {'crank_failure': 'maybe', 'low_oil_pressure': 2},
+        })
+        self.assertEqual(set(errors), {
+            'coolant_temp_c', 'rpm', 'frequency_hz', 'phase_c_current_a', 'gc_status', 'gen_breaker',
+            'alarm_crank_failure', 'alarm_low_oil_pressure',
+        })
+
+
+    def test_non_finite_and_overflowing_numbers(self):
+        for value in (float('inf'), float('-inf'), float('nan'), '1e999', 'nan', 10 ** 400, -10 ** 400, '1' * 1001):
+            _, errors = self.assert_parity({'engine_hours': value, 'phase_a': {'voltage_v': value}, 'rpm': value})
+            self.assertEqual(set(errors), {'engine_hours', 'phase_a_voltage_v', 'rpm'}, value)
+
+    def test_create_rejects_non_finite_numbers(self):
+        response = APIClient().post('/api/meter/meter-data/', {'meter_id': 'GENERATOR_01', 'data': {'engine_hours': '1e999'}},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MeterData.objects.exists())
+
+        # 1e400 is valid JSON that parses to inf
+        response = APIClient().post('/api/meter/meter-data/bulk/', '{"readings": ['
+                                    '{"meter_id": "GENERATOR_01", "data": {"engine_hours": 1e400}}, '
+                                    '{"meter_id": "GENERATOR_01", "data": {"rpm": 1%s}}, '
+                                    '{"meter_id": "GENERATOR_01", "data": {"engine_hours": 12.5}}]}' % ('0' * 400),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(MeterData.objects.get().engine_hours, 12.5)
+
+class BulkIngestTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_01', location='Plant A')
+
+    def post(self, readings):
+        return APIClient().post('/api/meter/meter-data/bulk/', {'readings': readings}, format='json')
+
+    def test_mixed_valid_and_invalid_rows(self):
+        response = self.post([
+            {'meter_id': 'GENERATOR_01', 'timestamp': '2025-04-01T00:00:00Z', 'data': {}},
+            {'meter_id': ['GENERATOR_01'], 'data': {}},
+            {'meter_id': {'id': 1}, 'data': {}},
+            {'data': {}},
+            'not an object',
+            {'meter_id': 'GENERATOR_01', 'timestamp': 'yesterday', 'data': {}},
+            {'meter_id': 'GENERATOR_01', 'timestamp': 1743465600, 'data': {}},
+        ])
+        self.assertEqual(response.status_code, 201)
+        data = response.json()['details']['data']
+        self.assertEqual((data['accepted'], data['rejected']), (2, 5))
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['accepted', 'rejected', 'rejected', 'rejected', 'rejected', 'rejected', 'accepted'])
+        self.assertEqual(data['results'][1]['errors'], {'meter_id': ['meter_id must be a string']})
+        self.assertEqual(data['results'][3]['errors'], {'meter_id': ['meter_id is required']})
+        self.assertIn('timestamp', data['results'][5]['errors'])
+        self.assertEqual(MeterData.objects.filter(meter=self.meter).count(), 2)
+
+    def test_unknown_meters_are_rejected_per_row(self):
+        response = self.post([
+            {'meter_id': 'GENERATOR_99', 'data': {}},
+            {'meter_id': 'GENERATOR_01', 'data': {}},
+        ])
+        data = response.json()['details']['data']
+        self.assertEqual((data['accepted'], data['rejected']), (1, 1))
+        self.assertEqual(data['results'][0]['errors'], {'meter_id': ['Meter with device_id GENERATOR_99 not found']})
+        self.assertEqual(data['results'][1]['id'], MeterData.objects.get().id)
+
+    def test_all_rejected_or_empty_is_a_bad_request(self):
+        response = self.post([{'meter_id': 'GENERATOR_99', 'data': {}}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['details']['data']['rejected'], 1)
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertFalse(MeterData.objects.exists())
+
+
+class StreamIngestTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_01', location='Plant A')
+
+    def line(self, i, meter_id='GENERATOR_01'):
+        return json.dumps({'meter_id': meter_id, 'timestamp': 1743465600 + i, 'data': {}})
+
+    def test_endpoint_summary_with_malformed_lines(self):
+        body = '\n'.join([
+            self.line(0), '{not json', '', self.line(1, meter_id=['GENERATOR_01']), self.line(2, 'GENERATOR_99'),
+            '[1, 2]', self.line(3),
+        ]) + '\n'
+        response = APIClient().post('/api/meter/meter-data/stream/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        summary = response.json()['details']['data']
+        self.assertEqual((summary['accepted'], summary['rejected'], summary['errors_truncated']), (2, 4, False))
+        self.assertEqual([error['line'] for error in summary['errors']], [2, 4, 5, 6])
+        self.assertEqual(summary['errors'][1]['errors'], {'meter_id': ['meter_id must be a string']})
+        self.assertEqual(MeterData.objects.count(), 2)
+
+    def test_batches_flush_independently_and_errors_are_capped(self):
+        lines = [self.line(i) if i % 3 else 'oops' for i in range(10)]
+        summary = ingest_stream(iter(lines), batch_size=2, max_errors=2)
+        # Lines 1, 4, 7 and 10 are bad; only the first two are detailed
+        self.assertEqual((summary['accepted'], summary['rejected']), (6, 4))
+        self.assertEqual([error['line'] for error in summary['errors']], [1, 4])
+        self.assertTrue(summary['errors_truncated'])
+        self.assertEqual(
+            sorted(MeterData.objects.values_list('timestamp', flat=True)),
+            [datetime.fromtimestamp(1743465600 + i, tz=dt_timezone.utc) for i in range(10) if i % 3],
+        )
+
+    def test_non_finite_numbers_are_rejected_per_line(self):
+        reading = '{"meter_id": "GENERATOR_01", "timestamp": %d, "data": {"engine_hours": %s}}'
+        lines = [self.line(0), reading % (1, 'NaN'), reading % (2, '-Infinity'), reading % (3, '1e400'), self.line(4)]
+        summary = ingest_stream(iter(lines), batch_size=10)
+        self.assertEqual((summary['accepted'], summary['rejected']), (2, 3))
+        self.assertEqual([error['line'] for error in summary['errors']], [2, 3, 4])
+        self.assertEqual(summary['errors'][2]['errors'], {'engine_hours': ['A valid number is required.']})
+        self.assertEqual(MeterData.objects.count(), 2)
+
+    def test_empty_stream_is_a_bad_request(self):
+        response = APIClient().post('/api/meter/meter-data/stream/', '{"bad"\n', content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['details']['data']['rejected'], 1)
+
+
+class IngestBufferTests(SimpleTestCase):
+    def setUp(self):
+        self.batches = []
+
+    def write(self, batch):
+        if 'bad' in batch:
+            raise ValueError("bad row")
+        self.batches.append(list(batch))
+
+    def wait_for(self, buffer, written, timeout=5):
+        deadline = time.monotonic() + timeout
+        while buffer.written + buffer.failed < written and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_backpressure_when_full(self):
+        rejecting = IngestBuffer(self.write, max_size=2, full_policy='reject')
+        rejecting.put('a')
+        rejecting.put('b')
+        with self.assertRaises(BufferFull):
+            rejecting.put('c')
+
+        blocking = IngestBuffer(self.write, max_size=1, full_policy='block', block_timeout=0.05)
+        blocking.put('a')
+        started = time.monotonic()
+        with self.assertRaises(BufferFull):
+            blocking.put('b')
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+
+    def test_flushes_partial_batch_after_interval(self):
+        buffer = IngestBuffer(self.write, batch_size=100, flush_interval=0.05)
+        buffer.start()
+        self.addCleanup(buffer.stop)
+        for row in 'abc':
+            buffer.put(row)
+        self.wait_for(buffer, 3)
+        self.assertEqual(self.batches, [['a', 'b', 'c']])
+
+    def test_full_batches_then_remainder(self):
+        buffer = IngestBuffer(self.write, batch_size=4, flush_interval=0.05)
+        for row in range(10):
+            buffer.put(row)
+        buffer.start()
+        self.addCleanup(buffer.stop)
+        self.wait_for(buffer, 10)
+        self.assertEqual([len(batch) for batch in self.batches], [4, 4, 2])
+
+    def test_drains_queue_on_shutdown(self):
+        buffer = IngestBuffer(self.write, batch_size=2, flush_interval=0.2)
+        buffer.start()
+        for row in range(5):
+            buffer.put(row)
+        buffer.stop()
+        self.assertFalse(buffer.thread.is_alive())
+        self.assertEqual(sorted(row for batch in self.batches for row in batch), list(range(5)))
+        with self.assertRaises(BufferFull):
+            buffer.put(5)
+
+    def test_failed_batch_drops_only_bad_rows(self):
+        buffer = IngestBuffer(self.write, batch_size=8, flush_interval=0.05)
+        for row in ['a', 'b', 'bad', 'c', 'd', 'e', 'bad', 'f']:
+            buffer.put(row)
+        self.addCleanup(buffer.stop)
+        with self.assertLogs('meter.buffer', 'ERROR'):
+            buffer.start()
+            self.wait_for(buffer, 8)
+        self.assertEqual(buffer.stats(), {"queued": 0, "written": 6, "failed": 2})
+        self.assertEqual(sorted(row for batch in self.batches for row in batch), list('abcdef'))
+
+
+class SpoolTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_01', location='Plant A')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.row, _ = flatten_reading({})
+        self.start = datetime(2025, 4, 1, tzinfo=dt_timezone.utc)
+
+    def payload(self, i, **fields):
+        row = dict(self.row, meter_id=self.meter.id, timestamp=self.start + timedelta(seconds=i))
+        row.update(fields)
+        return spool.encode_row(row)
+
+    def write_segment(self, payloads):
+        writer = spool.SpoolWriter(self.directory)
+        for payload in payloads:
+            writer.append(payload)
+        writer.close()
+        return [segment['name'] for segment in spool.list_segments(self.directory)][-1]
+
+    def test_framing_round_trip_and_torn_tail(self):
+        payloads = [self.payload(i) for i in range(3)]
+        name = self.write_segment(payloads)
+        path = os.path.join(self.directory, name)
+        self.assertEqual(spool.read_segment(path), (payloads, 0))
+
+        # A record cut short by a crash, then one whose checksum does not match
+        with open(path, 'ab') as f:
+            f.write(spool.frame(self.payload(3))[:-5])
+        self.assertEqual(spool.read_segment(path), (payloads, len(spool.frame(self.payload(3))) - 5))
+        bad = bytearray(spool.frame(self.payload(4)))
+        bad[-1] ^= 0xFF
+        with open(path, 'r+b') as f:
+            f.truncate(sum(len(spool.frame(payload)) for payload in payloads))
+            f.seek(0, os.SEEK_END)
+            f.write(bytes(bad))
+        self.assertEqual(spool.read_segment(path)[0], payloads)
+        with self.assertLogs('meter.spool', 'WARNING'):
+            self.assertEqual(spool.replay_all(self.directory), 3)
+        self.assertEqual(MeterData.objects.count(), 3)
+        self.assertEqual(spool.list_segments(self.directory), [])
+
+    def test_replaying_a_segment_twice_writes_it_once(self):
+        name = self.write_segment([self.payload(i) for i in range(4)])
+        path = os.path.join(self.directory, name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.assertEqual(spool.replay_segment(name, self.directory), spool.Replay(4, 0, None, False))
+        # A crash between committing and deleting leaves the segment behind
+        with open(path, 'wb') as f:
+            f.write(data)
+        with self.assertLogs('meter.spool', 'WARNING'):
+            self.assertEqual(spool.replay_segment(name, self.directory), spool.Replay(0, 0, None, True))
+        self.assertEqual(MeterData.objects.count(), 4)
+        self.assertFalse(os.path.exists(path))
+
+    def test_orphaned_segments_are_recovered_even_with_a_live_pid(self):
+        writer = spool.SpoolWriter(self.directory)
+        writer.append(self.payload(0))
+        self.addCleanup(writer.close)
+        # Left behind by a dead process whose PID now belongs to a live one
+        orphan = os.path.join(self.directory, f"{os.getpid()}-1-{'0' * 32}.{spool.OPEN}")
+        with open(orphan, 'wb') as f:
+            f.write(spool.frame(self.payload(1)))
+        claimed = os.path.join(self.directory, f"{os.getpid()}-2-{'1' * 32}.{spool.REPLAYING}-{os.getpid()}")
+        with open(claimed, 'wb') as f:
+            f.write(spool.frame(self.payload(2)))
+
+        spool.recover(self.directory)
+        states = {segment['stem']: segment['state'] for segment in spool.list_segments(self.directory)}
+        self.assertEqual(states.pop(f"{os.getpid()}-1-{'0' * 32}"), spool.SEALED)
+        self.assertEqual(states.pop(f"{os.getpid()}-2-{'1' * 32}"), spool.SEALED)
+        # The live writer's segment stays open
+        self.assertEqual(list(states.values()), [spool.OPEN])
+        self.assertEqual(spool.replay_all(self.directory), 2)
+
+    def test_unwritable_rows_are_quarantined_and_later_segments_drain(self):
+        first = self.write_segment([
+            self.payload(0), self.payload(1, meter_id=self.meter.id + 100), self.payload(2, bogus_column=1),
+            b'{"not": "a reading"}', self.payload(3),
+        ])
+        second = self.write_segment([self.payload(10)])
+        out = io.StringIO()
+        with self.assertLogs('meter.spool', 'WARNING'):
+            call_command('spool', 'replay', dir=self.directory, stdout=out)
+        self.assertEqual(MeterData.objects.count(), 3)
+        quarantined = os.path.join(spool.QUARANTINE_DIR, first)
+        self.assertIn(f"{first}: 2 rows replayed, 3 records quarantined in {quarantined}", out.getvalue())
+        self.assertIn(f"{second}: 1 rows replayed", out.getvalue())
+        self.assertEqual(len(spool.read_segment(os.path.join(self.directory, quarantined))[0]), 3)
+        self.assertEqual(SpoolReplay.objects.get(segment=first.split('.')[0]).rejected, 3)
+
+        out = io.StringIO()
+        call_command('spool', 'inspect', dir=self.directory, stdout=out)
+        self.assertIn(quarantined, out.getvalue())
+        self.assertIn('quarantined', out.getvalue())
+
+    def test_truncate_skips_segments_a_replayer_holds(self):
+        held = self.write_segment([self.payload(0)])
+        free = self.write_segment([self.payload(1)])
+        fd = spool._lock(os.path.join(self.directory, held))
+        try:
+            out = io.StringIO()
+            call_command('spool', 'truncate', dir=self.directory, stdout=out)
+        finally:
+            os.close(fd)
+        self.assertIn(f"{held}: claimed by another process, skipped", out.getvalue())
+        self.assertIn(f"{free}: removed", out.getvalue())
+        self.assertEqual([segment['name'] for segment in spool.list_segments(self.directory)], [held])
+
+        call_command('spool', 'truncate', dir=self.directory, stdout=io.StringIO())
+        self.assertEqual(spool.list_segments(self.directory), [])
+        self.assertFalse(MeterData.objects.exists())
+
+    def test_failing_segment_is_quarantined_whole(self):
+        name = self.write_segment([self.payload(0)])
+        self.write_segment([self.payload(1)])
+        load_records = spool.load_records
+        calls = []
+
+        def fail_once(payloads):
+            calls.append(payloads)
+            if len(calls) == 1:
+                raise RuntimeError("unexpected")
+            return load_records(payloads)
+
+        with mock.patch.object(spool, 'load_records', fail_once), self.assertLogs('meter.spool', 'ERROR'):
+            self.assertEqual(spool.replay_all(self.directory), 1)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, spool.QUARANTINE_DIR, name)))
+        self.assertEqual(spool.list_segments(self.directory), [])
+        self.assertEqual(MeterData.objects.get().timestamp, self.start + timedelta(seconds=1))
+
+    def test_database_outage_leaves_segment_for_a_later_pass(self):
+        name = self.write_segment([self.payload(0)])
+        with mock.patch.object(spool, 'write_rows', side_effect=OperationalError("database is locked")):
+            with self.assertRaises(OperationalError):
+                spool.replay_all(self.directory)
+        self.assertEqual([segment['name'] for segment in spool.list_segments(self.directory)], [name])
+        self.assertEqual(spool.replay_all(self.directory), 1)
+
+
+class MeterResolverTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_01', location='Plant A')
+        resolver.clear()
+
+    def test_hits_and_misses(self):
+        lookups = MeterResolver(version_check_interval=60)
+        with self.assertNumQueries(1):
+            self.assertEqual(lookups.get('GENERATOR_01').pk, self.meter.pk)
+            self.assertEqual(lookups.get('GENERATOR_01').location, 'Plant A')
+        with self.assertNumQueries(1):
+            self.assertIsNone(lookups.get('GENERATOR_99'))
+        stats = lookups.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size'], stats['hit_rate']), (1, 2, 1, 0.3333))
+
+    def test_save_and_delete_invalidate(self):
+        self.assertEqual(resolver.get('GENERATOR_01').location, 'Plant A')
+        self.meter.location = 'Plant B'
+        self.meter.save()
+        self.assertEqual(resolver.get('GENERATOR_01').location, 'Plant B')
+        self.meter.delete()
+        self.assertIsNone(resolver.get('GENERATOR_01'))
+        recreated = Meter.objects.create(device_id='GENERATOR_01', location='Plant C')
+        self.assertEqual(resolver.get('GENERATOR_01').pk, recreated.pk)
+
+    def test_entries_expire_when_invalidations_do_not_arrive(self):
+        # Another worker's cache: changes made elsewhere send it no signal
+        fresh = MeterResolver(version_check_interval=60, ttl=60)
+        expiring = MeterResolver(version_check_interval=60, ttl=0)
+        fresh.get('GENERATOR_01')
+        expiring.get('GENERATOR_01')
+        Meter.objects.filter(pk=self.meter.pk).update(location='Plant B')
+        self.assertEqual(fresh.get('GENERATOR_01').location, 'Plant A')
+        self.assertEqual(expiring.get('GENERATOR_01').location, 'Plant B')
+        Meter.objects.filter(pk=self.meter.pk).delete()
+        self.assertIsNone(expiring.get('GENERATOR_01'))
+        self.assertEqual(expiring.stats()['size'], 0)
+
+    def test_unhashable_meter_id_is_a_bad_request(self):
+        client = APIClient()
+        for url in ('/api/meter/meter-data/', '/api/meter/meter-report/', '/api/meter/meter-alarm-report/'):
+            for meter_id in (['GENERATOR_01'], {'id': 'GENERATOR_01'}, 1):
+                response = client.post(url, {'meter_id': meter_id}, format='json')
+                self.assertEqual(response.status_code, 400, (url, meter_id))
+                self.assertEqual(response.json()['error'], 'meter_id must be a string')
+
+    def test_cache_stats_endpoint(self):
+        admin = User.objects.create(username='admin', email='admin@example.com', role='ADMIN')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(admin)}')
+        resolver.get('GENERATOR_01')
+        resolver.get('GENERATOR_01')
+        response = client.get('/api/admin/meters/cache-stats/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['details']['data']
+        self.assertGreaterEqual(data['hits'], 1)
+        self.assertEqual(data['size'], 1)
+        self.assertEqual(data['ttl'], resolver.ttl)
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_01', location='Plant A')
+        self.start = datetime(2025, 4, 1, tzinfo=dt_timezone.utc)
+        # Pairs of readings share a timestamp, so ordering leans on the id tiebreak
+        row, _ = flatten_reading({})
+        self.readings = MeterData.objects.bulk_create([
+            MeterData(meter=self.meter, timestamp=self.start + timedelta(seconds=10 * (i // 2)), **row)
+            for i in range(7)
+        ])
+        self.newest_first = [reading.id for reading in sorted(
+            self.readings, key=lambda reading: (reading.timestamp, reading.id), reverse=True
+        )]
+
+    def page(self, **params):
+        return APIClient().get('/api/meter/meter-data/', dict({'meter_id': 'GENERATOR_01', 'page_size': 3}, **params))
+
+    def test_walks_forward_and_back_with_equal_timestamps(self):
+        seen = []
+        pages = []
+        response = self.page()
+        while True:
+            details = response.json()['details']
+            pages.append(details)
+            seen += [row['id'] for row in details['data']]
+            if details['next'] is None:
+                break
+            response = self.page(cursor=details['next'])
+        self.assertEqual(seen, self.newest_first)
+        self.assertEqual([len(page['data']) for page in pages], [3, 3, 1])
+        self.assertIsNone(pages[0]['previous'])
+
+        # The previous cursor of the last page returns the page before it
+        back = self.page(cursor=pages[-1]['previous']).json()['details']
+        self.assertEqual([row['id'] for row in back['data']], self.newest_first[3:6])
+        self.assertEqual(back['next'], pages[1]['next'])
+
+    def test_exact_last_page_has_no_next(self):
+        details = self.page(page_size=7).json()['details']
+        self.assertEqual(len(details['data']), 7)
+        self.assertIsNone(details['next'])
+
+    def test_invalid_or_tampered_cursor_is_a_bad_request(self):
+        next_cursor = self.page().json()['details']['next']
+        tampered = [
+            'not-a-cursor!', next_cursor[:-4], next_cursor + 'AAAA',
+            base64.urlsafe_b64encode(b'[1, 2]').decode(),
+            base64.urlsafe_b64encode(b'{"t": 5, "i": 1, "r": 0}').decode(),
+            base64.urlsafe_b64encode(b'{"t": "2025-04-01T00:00:00+00:00", "i": "x", "r": 0}').decode(),
+            base64.urlsafe_b64encode(b'{"t": "2025-04-01T00:00:00+00:00", "i": 1e30, "r": 0}').decode(),
+            base64.urlsafe_b64encode(b'{"t": "2025-04-01T00:00:00+00:00", "i": 99999999999999999999, "r": 0}').decode(),
+        ]
+        for cursor in tampered:
+            response = self.page(cursor=cursor)
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertEqual(response.json()['error'], 'Invalid cursor')
+
+
+class MeterDataRangeTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_01', location='Plant A')
+        self.start = datetime(2025, 4, 1, tzinfo=dt_timezone.utc)
+        make_readings(self.meter, self.start, 30)
+
+    def test_range_query_uses_composite_index(self):
+        plan = readings_in_range(self.meter.id, self.start, self.start + timedelta(minutes=2)).explain()
+        self.assertIn('meterdata_meter_ts_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_latest_query_uses_composite_index(self):
+        plan = readings_in_range(self.meter.id, descending=True)[:1].explain()
+        self.assertIn('meterdata_meter_ts_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_range_endpoint_returns_half_open_interval(self):
+        response = APIClient().get('/api/meter/meter-data/range/', {
+            'meter_id': 'GENERATOR_01',
+            'from': (self.start + timedelta(seconds=50)).isoformat(),
+            'to': (self.start + timedelta(seconds=100)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['details']['data']
+        self.assertEqual(data['count'], 5)
+        self.assertFalse(data['has_more'])
+
+
+    def export(self, export_format):
+        return APIClient().get('/api/meter/meter-data/range/', {
+            'meter_id': 'GENERATOR_01',
+            'from': self.start.isoformat(),
+            'to': (self.start + timedelta(minutes=2)).isoformat(),
+            'format': export_format,
+        })
+
+    def test_range_exports_csv_stream(self):
+        response = self.export('csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'meter', 'timestamp'])
+        self.assertEqual(len(lines), 13)
+
+    @skipUnless(PARQUET_AVAILABLE, "pyarrow is not installed")
+    def test_range_exports_parquet_stream(self):
+        import pyarrow.parquet as pq
+
+        response = self.export('parquet')
+        self.assertEqual(response.status_code, 200)
+        table = pq.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(table.num_rows, 12)
+        self.assertEqual(str(table.schema.field('timestamp').type), 'timestamp[us, tz=UTC]')
+
+    def test_range_exports_xlsx(self):
+        response = self.export('xlsx')
+        self.assertEqual(response.status_code, 200)
+        sheet = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))).read('xl/worksheets/sheet1.xml')
+        self.assertEqual(sheet.decode().count('<row '), 13)
+
+    def test_range_rejects_unknown_format(self):
+        response = self.export('pdf')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()['details'], 'format must be one of xlsx, csv, parquet')
+
+
+class MeterLatestTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_01', location='Plant A')
+        self.other = Meter.objects.create(device_id='GENERATOR_02', location='Plant B')
+        self.start = datetime(2025, 4, 1, tzinfo=dt_timezone.utc)
+        self.row, _ = flatten_reading({})
+
+    def reading(self, meter, seconds, rpm=1500):
+        return dict(self.row, meter_id=meter.id, timestamp=self.start + timedelta(seconds=seconds), rpm=rpm)
+
+    def test_older_reading_does_not_overwrite_newer_snapshot(self):
+        newest = write_rows([self.reading(self.meter, 60, rpm=1)])[0]
+        # A backlog upload arriving after the live reading, in a batch with a newer reading of another meter
+        write_rows([self.reading(self.meter, 30, rpm=2), self.reading(self.meter, 0, rpm=3), self.reading(self.other, 90)])
+        self.assertEqual(MeterLatest.objects.get(meter=self.meter).data_id, newest.id)
+        self.assertEqual(MeterLatest.objects.get(meter=self.other).timestamp, self.start + timedelta(seconds=90))
+
+        latest = write_rows([self.reading(self.meter, 120, rpm=4), self.reading(self.meter, 90, rpm=5)])[0]
+        snapshot = MeterLatest.objects.get(meter=self.meter)
+        self.assertEqual((snapshot.data_id, snapshot.timestamp), (latest.id, self.start + timedelta(seconds=120)))
+        response = APIClient().get('/api/meter/meter-data/latest/')
+        self.assertEqual(response.json()['details']['data']['GENERATOR_01']['rpm'], 4)
+
+    def test_backfill_migration_seeds_snapshots_from_existing_readings(self):
+        make_readings(self.meter, self.start, 5)
+        newest = make_readings(self.other, self.start, 3)[-1]
+        importlib.import_module('meter.migrations.0012_meterlatest').backfill_latest(apps, None)
+        snapshots = {snapshot.meter_id: snapshot for snapshot in MeterLatest.objects.all()}
+        self.assertEqual(set(snapshots), {self.meter.id, self.other.id})
+        self.assertEqual(snapshots[self.meter.id].timestamp, self.start + timedelta(seconds=40))
+        self.assertEqual(snapshots[self.other.id].data_id, newest.id)
+
+
+class MeterDataRollupTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_01', location='Plant A')
+        self.start = datetime(2025, 4, 1, tzinfo=dt_timezone.utc)
+        row, _ = flatten_reading({})
+        self.rows = [
+            dict(row, meter_id=self.meter.id, timestamp=self.start + timedelta(seconds=20 * i),
+                 instantaneous_power_kw=float(i))
+            for i in range(9)
+        ]
+
+    def stats(self, resolution):
+        return {
+            rollup.bucket_start: (rollup.count, rollup.stats['instantaneous_power_kw'])
+            for rollup in MeterDataRollup.objects.filter(meter=self.meter, resolution=resolution)
+        }
+
+    def test_ingest_merges_batches_into_buckets(self):
+        # Out of order batches must still leave the newest value as last
+        write_rows(self.rows[5:])
+        write_rows(self.rows[:5])
+        minutes = self.stats('1m')
+        self.assertEqual(minutes[self.start], (3, [0.0, 2.0, 3.0, 3, 2.0]))
+        self.assertEqual(minutes[self.start + timedelta(minutes=2)], (3, [6.0, 8.0, 21.0, 3, 8.0]))
+        self.assertEqual(self.stats('1d')[self.start], (9, [0.0, 8.0, 36.0, 9, 8.0]))
+
+    def test_rebuild_matches_incremental_rollups(self):
+        write_rows(self.rows[:4])
+        write_rows(self.rows[4:])
+        incremental = self.stats('15m')
+        MeterDataRollup.objects.all().delete()
+        self.assertEqual(rebuild(self.meter.id, self.start, self.start + timedelta(hours=1)), 9)
+        self.assertEqual(self.stats('15m'), incremental)
+
+    def test_rollup_endpoint(self):
+        write_rows(self.rows)
+        response = APIClient().get('/api/meter/meter-data/rollup/', {
+            'meter_id': 'GENERATOR_01',
+            'resolution': '1m',
+            'from': self.start.isoformat(),
+            'to': (self.start + timedelta(minutes=2)).isoformat(),
+            'fields': 'instantaneous_power_kw',
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['details']['data']
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['buckets'][1]['fields']['instantaneous_power_kw'],
+                         {'min': 3.0, 'max': 5.0, 'avg': 4.0, 'last': 5.0})
+
+
+class AlarmEventTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_03', location='Plant C')
+        self.start = datetime(2025, 4, 1, tzinfo=dt_timezone.utc)
+        row, _ = flatten_reading({})
+        # Low oil pressure on readings 2-4, emergency stop from reading 4 on
+        self.rows = [
+            dict(row, meter_id=self.meter.id, timestamp=self.at(i),
+                 alarm_low_oil_pressure=2 <= i <= 4, alarm_emergency_stop=i >= 4)
+            for i in range(7)
+        ]
+
+    def at(self, i):
+        return self.start + timedelta(seconds=10 * i)
+
+    def events(self):
+        return list(
+            AlarmEvent.objects.filter(meter=self.meter)
+            .order_by('raised_at', 'alarm').values_list('alarm', 'raised_at', 'cleared_at')
+        )
+
+    def expected(self):
+        return [
+            ('alarm_low_oil_pressure', self.at(2), self.at(5)),
+            ('alarm_emergency_stop', self.at(4), None),
+        ]
+
+    def test_edges_within_one_batch(self):
+        write_rows(self.rows)
+        self.assertEqual(self.events(), self.expected())
+        self.assertEqual(MeterLatest.objects.get(meter=self.meter).alarms, 1)
+
+    def test_edges_across_batches(self):
+        for i in range(0, 7, 2):
+            write_rows(self.rows[i:i + 2])
+        self.assertEqual(self.events(), self.expected())
+
+    def test_readings_older_than_the_snapshot_are_ignored(self):
+        write_rows(self.rows)
+        write_rows([dict(self.rows[3], timestamp=self.at(-1))])
+        self.assertEqual(self.events(), self.expected())
+
+    def test_rebuild_matches_incremental_events(self):
+        write_rows(self.rows[:3])
+        write_rows(self.rows[3:])
+        AlarmEvent.objects.all().delete()
+        MeterLatest.objects.filter(meter=self.meter).update(alarms=0)
+        self.assertEqual(alarms.rebuild(self.meter.id), 2)
+        self.assertEqual(self.events(), self.expected())
+        self.assertEqual(MeterLatest.objects.get(meter=self.meter).alarms, 1)
+
+    def test_history_run_length_encoding(self):
+        write_rows(self.rows)
+        end = self.at(8).timestamp()
+        summary = alarm_summary(*alarm_episodes(*load_flags(readings_in_range(self.meter.id)), end))
+        self.assertEqual(summary['alarm_low_oil_pressure'],
+                         {'occurrences': 1, 'active_seconds': 30.0, 'longest_seconds': 30.0})
+        # Still active on the last reading, so it runs to the end of the range
+        self.assertEqual(summary['alarm_emergency_stop'],
+                         {'occurrences': 1, 'active_seconds': 40.0, 'longest_seconds': 40.0})
+        self.assertEqual(summary['alarm_crank_failure']['occurrences'], 0)
+
+    @override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+    def test_history_report(self):
+        write_rows(self.rows)
+        response = APIClient().post('/api/meter/meter-alarm-report/', {
+            'meter_id': 'GENERATOR_03',
+            'from': self.start.isoformat(),
+            'to': self.at(8).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 202)
+        execute(claim_next())
+        job = ReportJob.objects.get()
+        self.assertEqual(job.status, 'SUCCEEDED')
+
+        with default_storage.open(f'reports/{job.filename}') as f:
+            archive = zipfile.ZipFile(f)
+            workbook = archive.read('xl/workbook.xml').decode()
+            timeline = archive.read('xl/worksheets/sheet2.xml').decode()
+        self.assertEqual(re.findall(r'<sheet name="([^"]+)"', workbook),
+                         ['Alarm Summary', 'Alarm Timeline', 'Report Info'])
+        self.assertEqual(timeline.count('<row '), 3)
+        self.assertIn('Low Oil Pressure', timeline)
+        self.assertIn('Active', timeline)
+
+
+class AlarmRuleTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_01', location='Plant A')
+        self.other = Meter.objects.create(device_id='GENERATOR_02', location='Plant B')
+        self.start = datetime(2025, 4, 1, tzinfo=dt_timezone.utc)
+        self.row, _ = flatten_reading({})
+        engine.clear()
+
+    def at(self, i):
+        return self.start + timedelta(seconds=10 * i)
+
+    def readings(self, meter, temps):
+        return [dict(self.row, meter_id=meter.id, timestamp=self.at(i), coolant_temp_c=temp)
+                for i, temp in enumerate(temps)]
+
+    def events(self, rule):
+        return list(rule.events.order_by('raised_at').values_list('meter__device_id', 'raised_at', 'cleared_at'))
+
+    def test_condition_must_hold_for_duration(self):
+        rule = AlarmRule.objects.create(name='Hot coolant', field='coolant_temp_c', operator='>', threshold=105,
+                                        duration_seconds=60)
+        # Hot from reading 2 to 11; a 30 second spike on the other meter never fires
+        rows = self.readings(self.meter, [90] * 2 + [110] * 10 + [90] * 3)
+        rows += self.readings(self.other, [90] * 2 + [110] * 4 + [90] * 9)
+        for i in range(0, 15, 4):
+            write_rows(rows[i:i + 4] + rows[15 + i:15 + i + 4])
+        self.assertEqual(self.events(rule), [('GENERATOR_01', self.at(8), self.at(12))])
+
+    def test_rule_scoped_to_a_meter_on_a_derived_metric(self):
+        rule = AlarmRule.objects.create(name='Current imbalance', meter=self.other, field='current_imbalance_pct',
+                                        operator='>', threshold=20)
+        rows = [
+            dict(self.row, meter_id=meter.id, timestamp=self.at(0),
+                 phase_a_current_a=100, phase_b_current_a=100, phase_c_current_a=140)
+            for meter in (self.meter, self.other)
+        ]
+        write_rows(rows)
+        self.assertEqual(self.events(rule), [('GENERATOR_02', self.at(0), None)])
+
+    def test_open_alerts_survive_a_reload(self):
+        rule = AlarmRule.objects.create(name='Hot coolant', field='coolant_temp_c', operator='>=', threshold=105)
+        rows = self.readings(self.meter, [110, 110, 90])
+        write_rows(rows[:2])
+        engine.clear()
+        write_rows(rows[2:])
+        self.assertEqual(self.events(rule), [('GENERATOR_01', self.at(0), self.at(2))])
+
+    def test_api_rejects_unknown_fields(self):
+        admin = User.objects.create(username='admin', email='admin@example.com', role='ADMIN')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(admin)}')
+        response = client.post('/api/admin/alarm-rules/', {
+            'name': 'Bogus', 'field': 'bogus', 'operator': '>', 'threshold': 1,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('field', response.json()['details'])
+
+
+class AnomalyTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_01', location='Plant A')
+        self.other = Meter.objects.create(device_id='GENERATOR_02', location='Plant B')
+        self.start = datetime(2025, 4, 1, tzinfo=dt_timezone.utc)
+        self.row, _ = flatten_reading({})
+        anomaly_stats.clear()
+
+    def at(self, i):
+        return self.start + timedelta(seconds=10 * i)
+
+    def readings(self, meter, rpms):
+        return [dict(self.row, meter_id=meter.id, timestamp=self.at(i), rpm=rpm) for i, rpm in enumerate(rpms)]
+
+    def test_spike_is_flagged_after_warmup(self):
+        rpms = [1500 + (i % 5) * 2 for i in range(60)]
+        rpms[10] = 3000
+        rpms[50] = 3000
+        rows = self.readings(self.meter, rpms) + self.readings(self.other, [1500 + (i % 5) * 2 for i in range(60)])
+        for i in range(0, 60, 7):
+            write_rows(rows[i:i + 7] + rows[60 + i:60 + i + 7])
+        # The spike during warm-up is folded in but never flagged
+        anomalies = list(Anomaly.objects.values_list('meter__device_id', 'timestamp', 'field', 'value'))
+        self.assertEqual(anomalies, [('GENERATOR_01', self.at(50), 'rpm', 3000)])
+        self.assertGreater(Anomaly.objects.get().zscore, 4)
+
+    def test_batch_matches_reading_by_reading(self):
+        rng = np.random.default_rng(1)
+        rpms = rng.normal(1500, 10, 80).tolist()
+        rpms[40] = 1200
+        rows = self.readings(self.meter, rpms)
+        write_rows(rows[:40])
+        for row in rows[40:]:
+            write_rows([row])
+        batched = list(Anomaly.objects.values_list('timestamp', 'zscore'))
+        Anomaly.objects.all().delete()
+        anomaly_stats.clear()
+        for row in rows:
+            write_rows([dict(row, timestamp=row['timestamp'] + timedelta(days=1))])
+        single = list(Anomaly.objects.values_list('timestamp', 'zscore'))
+        self.assertEqual(len(batched), 1)
+        self.assertEqual(batched[0][0] + timedelta(days=1), single[0][0])
+        self.assertAlmostEqual(batched[0][1], single[0][1])
+
+    def test_state_grows_with_new_meters(self):
+        rolling = RollingStats(fields=['rpm'], capacity=1)
+        rolling.update(rolling.slots([7]), np.array([[1500.0]]))
+        slots = rolling.slots([7, 8, 9])
+        self.assertEqual(slots.tolist(), [0, 1, 2])
+        self.assertGreaterEqual(len(rolling.mean), 3)
+        self.assertEqual(rolling.mean[0, 0], 1500)
+        self.assertEqual(rolling.count[:3, 0].tolist(), [1, 0, 0])
+
+    def test_anomalies_endpoint(self):
+        rows = self.readings(self.meter, [1500] * 40 + [2000])
+        write_rows(rows)
+        response = APIClient().get('/api/meter/meter-data/anomalies/', {
+            'meter_id': 'GENERATOR_01', 'from': self.at(0).isoformat(), 'to': self.at(41).isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['details']['data']
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['anomalies'][0]['field'], 'rpm')
+        self.assertEqual(data['anomalies'][0]['mean'], 1500)
+
+
+class TotalizerTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_01', location='Plant A')
+        self.start = datetime(2025, 4, 1, 23, tzinfo=dt_timezone.utc)
+        self.row, _ = flatten_reading({})
+
+    def readings(self, count, step=timedelta(minutes=1), **values):
+        return [dict(self.row, meter_id=self.meter.id, timestamp=self.start + step * i, **values) for i in range(count)]
+
+    def test_trapezoids_skip_gaps(self):
+        write_rows([
+            dict(self.row, meter_id=self.meter.id, timestamp=self.start, instantaneous_power_kw=0, fuel_rate_lph=0),
+            dict(self.row, meter_id=self.meter.id, timestamp=self.start + timedelta(minutes=1),
+                 instantaneous_power_kw=60, fuel_rate_lph=12),
+        ])
+        # An hour offline is not integrated across
+        write_rows([dict(self.row, meter_id=self.meter.id, timestamp=self.start + timedelta(hours=1, minutes=1),
+                         instantaneous_power_kw=60, fuel_rate_lph=12)])
+        counter = MeterTotalizer.objects.get(meter=self.meter)
+        self.assertAlmostEqual(counter.energy_kwh, 0.5)
+        self.assertAlmostEqual(counter.fuel_l, 0.1)
+
+    def test_period_totals_combine_days_and_edges(self):
+        # 26 hours at 60 kW and 15 L/h across two midnights, in batches
+        rows = self.readings(26 * 60 + 1, instantaneous_power_kw=60, fuel_rate_lph=15)
+        for i in range(0, len(rows), 500):
+            write_rows(rows[i:i + 500])
+        self.assertEqual(MeterDailyTotal.objects.filter(meter=self.meter).count(), 3)
+
+        response = APIClient().get('/api/meter/meter-data/totals/', {
+            'meter_id': 'GENERATOR_01',
+            'from': (self.start + timedelta(minutes=30)).isoformat(),
+            'to': (self.start + timedelta(hours=25, minutes=30)).isoformat(),
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['details']['data']
+        self.assertEqual(data['days_from_totals'], 1)
+        self.assertAlmostEqual(data['energy_kwh'], 1500)
+        self.assertAlmostEqual(data['fuel_l'], 375)
+        self.assertAlmostEqual(data['specific_fuel_consumption_l_per_kwh'], 0.25)
+
+    def test_rebuild_matches_incremental(self):
+        rows = self.readings(200, instantaneous_power_kw=40, fuel_rate_lph=10)
+        write_rows(rows[:70])
+        write_rows(rows[70:])
+        incremental = MeterTotalizer.objects.get(meter=self.meter)
+        self.assertEqual(totalizers.rebuild(self.meter.id, chunk_size=64), 200)
+        rebuilt = MeterTotalizer.objects.get(meter=self.meter)
+        self.assertAlmostEqual(rebuilt.energy_kwh, incremental.energy_kwh)
+        self.assertAlmostEqual(rebuilt.energy_kwh, 40 * 199 / 60)
+        self.assertEqual(rebuilt.timestamp, incremental.timestamp)
+
+
+class SketchTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_01', location='Plant A')
+        self.other = Meter.objects.create(device_id='GENERATOR_02', location='Plant B')
+        self.start = datetime(2025, 4, 1, 22, tzinfo=dt_timezone.utc)
+        self.row, _ = flatten_reading({})
+
+    def readings(self, meter, temps, step=timedelta(minutes=10)):
+        return [dict(self.row, meter_id=meter.id, timestamp=self.start + step * i, coolant_temp_c=temp)
+                for i, temp in enumerate(temps)]
+
+    def percentiles(self, **params):
+        return APIClient().get('/api/meter/meter-data/percentiles/', dict({
+            'fields': 'coolant_temp_c', 'from': '2025-04-01', 'to': '2025-04-03',
+        }, **params))
+
+    def test_merged_digests_stay_small_and_accurate(self):
+        rng = np.random.default_rng(0)
+        values = np.concatenate([rng.normal(85, 4, 50000), rng.exponential(10, 50000) + 90])
+        rng.shuffle(values)
+        digest = (np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0))
+        for chunk in np.array_split(values, 200):
+            _, means, weights = sketches.compress(
+                np.zeros(len(digest[1]) + len(chunk), dtype=np.int64),
+                np.concatenate([digest[1], chunk]), np.concatenate([digest[2], np.ones(len(chunk))]),
+            )
+            digest = (None, means, weights)
+        self.assertLessEqual(len(digest[1]), sketches.COMPRESSION)
+        self.assertEqual(digest[2].sum(), len(values))
+        estimates = sketches.quantiles(digest[1], digest[2], values.min(), values.max(), [1, 50, 95, 99.9])
+        ranks = np.searchsorted(np.sort(values), estimates) / len(values)
+        np.testing.assert_allclose(ranks, [0.01, 0.5, 0.95, 0.999], atol=0.002)
+
+    def test_ingest_and_fleet_percentiles(self):
+        # 24 readings each, half on April 1st and half on the 2nd
+        first = list(range(60, 84))
+        second = list(range(100, 124))
+        rows = self.readings(self.meter, first) + self.readings(self.other, second)
+        write_rows(rows[:30])
+        write_rows(rows[30:])
+        self.assertEqual(MeterDailySketch.objects.filter(field='coolant_temp_c').count(), 4)
+
+        response = self.percentiles(percentiles='0,50,100')
+        self.assertEqual(response.status_code, 200)
+        fleet = response.json()['details']['data']['fields']['coolant_temp_c']
+        self.assertEqual((fleet['count'], fleet['meters'], fleet['days']), (48, 2, 2))
+        self.assertEqual((fleet['percentiles']['p0'], fleet['percentiles']['p100']), (60, 123))
+        self.assertAlmostEqual(fleet['percentiles']['p50'], np.percentile(first + second, 50), delta=1)
+
+        one = self.percentiles(device_ids='GENERATOR_02', to='2025-04-02').json()['details']['data']
+        self.assertEqual(one['fields']['coolant_temp_c']['count'], 12)
+        self.assertEqual(one['fields']['coolant_temp_c']['max'], 111)
+
+    def test_catchup_rebuilds_and_bad_queries_are_rejected(self):
+        MeterData.objects.bulk_create([MeterData(**row) for row in self.readings(self.meter, range(70, 90))])
+        call_command('sketch_catchup', '--meter', 'GENERATOR_01', stdout=io.StringIO())
+        data = self.percentiles().json()['details']['data']['fields']['coolant_temp_c']
+        self.assertEqual((data['count'], data['min'], data['max']), (20, 70, 89))
+        self.assertEqual(self.percentiles(fields='phase_a_voltage_v').status_code, 400)
+        self.assertEqual(self.percentiles(device_ids='NOPE').status_code, 404)
+        self.assertEqual(self.percentiles(percentiles='nan').status_code, 400)
+        self.assertEqual(self.percentiles(percentiles='inf').status_code, 400)
+
+
+class PowerQualityTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_01', location='Plant A')
+        self.start = datetime(2025, 4, 1, tzinfo=dt_timezone.utc)
+        row, _ = flatten_reading({})
+        self.rows = [
+            dict(row, meter_id=self.meter.id, timestamp=self.start + timedelta(seconds=10 * i),
+                 phase_a_real_power=10, phase_b_real_power=20, phase_c_real_power=30,
+                 phase_a_apparent_power=12.5, phase_b_apparent_power=25, phase_c_apparent_power=37.5 * i,
+                 phase_a_voltage_v=230, phase_b_voltage_v=230, phase_c_voltage_v=230,
+                 phase_a_current_a=100, phase_b_current_a=100, phase_c_current_a=140)
+            for i in range(2)
+        ]
+
+    def derived(self):
+        return list(MeterData.objects.order_by('timestamp').values_list(
+            'total_real_power', 'total_apparent_power', 'power_factor', 'voltage_imbalance_pct',
+            'current_imbalance_pct',
+        ))
+
+    def test_metrics_are_stored_at_ingest(self):
+        write_rows(self.rows)
+        (real, apparent, pf, voltage, current), second = self.derived()
+        self.assertEqual((real, apparent), (60, 37.5))
+        self.assertAlmostEqual(pf, 1.6)
+        self.assertEqual(voltage, 0)
+        self.assertAlmostEqual(current, (140 - 340 / 3) / (340 / 3) * 100)
+        self.assertAlmostEqual(second[2], 0.8)
+
+    def test_migration_backfill_matches_ingest(self):
+        write_rows(self.rows)
+        ingested = self.derived()
+        MeterData.objects.update(total_real_power=None, total_apparent_power=None, power_factor=None,
+                                 voltage_imbalance_pct=None, current_imbalance_pct=None)
+        importlib.import_module('meter.migrations.0020_power_quality').backfill_power_quality(apps, None)
+        for backfilled, expected in zip(self.derived(), ingested):
+            for value, ingested_value in zip(backfilled, expected):
+                self.assertAlmostEqual(value, ingested_value)
+
+    def test_fields_are_selectable(self):
+        write_rows(self.rows)
+        client = APIClient()
+        params = {'meter_id': 'GENERATOR_01', 'from': self.start.isoformat(),
+                  'to': (self.start + timedelta(minutes=1)).isoformat()}
+        response = client.get('/api/meter/meter-data/range/', dict(params, fields='power_factor,current_imbalance_pct'))
+        self.assertEqual(response.status_code, 200)
+        readings = response.json()['details']['data']['readings']
+        self.assertEqual(set(readings[1]), {'timestamp', 'power_factor', 'current_imbalance_pct'})
+        self.assertAlmostEqual(readings[1]['power_factor'], 0.8)
+
+        response = client.get('/api/meter/meter-data/stats/', dict(params, fields='power_factor'))
+        self.assertEqual(response.status_code, 200)
+        self.assertAlmostEqual(response.json()['details']['data']['fields']['power_factor']['max'], 1.6)
+
+        response = client.get('/api/meter/meter-data/range/', dict(params, fields='bogus'))
+        self.assertEqual(response.status_code, 400)
+
+
+class MeterDataStatsTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_01', location='Plant A')
+        self.start = datetime(2025, 4, 1, tzinfo=dt_timezone.utc)
+        readings = make_readings(self.meter, self.start, 11)
+        for i, reading in enumerate(readings):
+            reading.instantaneous_power_kw = float(i)
+            reading.avg_current = None if i % 2 else float(i)
+        MeterData.objects.bulk_update(readings, ['instantaneous_power_kw', 'avg_current'])
+
+    def test_stats_endpoint(self):
+        response = APIClient().get('/api/meter/meter-data/stats/', {
+            'meter_id': 'GENERATOR_01',
+            'from': self.start.isoformat(),
+            'to': (self.start + timedelta(hours=1)).isoformat(),
+            'fields': 'instantaneous_power_kw,avg_current',
+            'percentiles': '50,90',
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['details']['data']
+        self.assertEqual(data['rows'], 11)
+        power = data['fields']['instantaneous_power_kw']
+        self.assertEqual((power['count'], power['min'], power['max'], power['mean']), (11, 0.0, 10.0, 5.0))
+        self.assertEqual(power['percentiles'], {'p50': 5.0, 'p90': 9.0})
+        self.assertEqual(data['fields']['avg_current']['count'], 6)
+
+    def test_stats_rejects_non_numeric_fields(self):
+        response = APIClient().get('/api/meter/meter-data/stats/', {
+            'meter_id': 'GENERATOR_01',
+            'from': self.start.isoformat(),
+            'to': (self.start + timedelta(hours=1)).isoformat(),
+            'fields': 'gen_breaker',
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_stats_rejects_non_finite_percentiles(self):
+        for percentiles in ('nan', 'inf', '50,-inf'):
+            response = APIClient().get('/api/meter/meter-data/stats/', {
+                'meter_id': 'GENERATOR_01',
+                'from': self.start.isoformat(),
+                'to': (self.start + timedelta(hours=1)).isoformat(),
+                'fields': 'rpm',
+                'percentiles': percentiles,
+            })
+            self.assertEqual(response.status_code, 400, percentiles)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ReportJobTests(TestCase):
+    def setUp(self):
+        self.meter = Meter.objects.create(device_id='GENERATOR_01', location='Plant A')
+        row, _ = flatten_reading({})
+        write_rows([dict(row, meter_id=self.meter.id, timestamp=datetime(2025, 4, 1, tzinfo=dt_timezone.utc))])
+
+    def test_report_is_queued_then_polled(self):
+        client = APIClient()
+        response = client.post('/api/meter/meter-report/', {'meter_id': 'GENERATOR_01'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        details = response.json()['details']
+        self.assertEqual(details['status'], 'PENDING')
+
+        self.assertEqual(str(claim_next()), details['job_id'])
+        execute(details['job_id'])
+
+        response = client.get(details['status_url'])
+        self.assertEqual(response.status_code, 200)
+        details = response.json()['details']
+        self.assertEqual(details['data']['status'], 'SUCCEEDED')
+        self.assertTrue(details['download_url'].endswith('.xlsx/'))
+        self.assertIsNone(claim_next())
+
+        response = client.get(details['download_url'])
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        # Resume from byte 100, only while the ETag still matches
+        response = client.get(details['download_url'], HTTP_RANGE='bytes=100-', HTTP_IF_RANGE=response['ETag'])
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-{len(content) - 1}/{len(content)}')
+        self.assertEqual(b''.join(response.streaming_content), content[100:])
+
+        response = client.get(details['download_url'], HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        response = client.get(details['download_url'], HTTP_RANGE=f'bytes={len(content)}-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_identical_request_reuses_stored_report(self):
+        client = APIClient()
+        first = client.post('/api/meter/meter-report/', {'meter_id': 'GENERATOR_01'}, format='json').json()
+        execute(claim_next())
+        second = client.post('/api/meter/meter-report/', {'meter_id': 'GENERATOR_01'}, format='json').json()
+        self.assertEqual(second['details']['job_id'], first['details']['job_id'])
+        self.assertEqual(second['details']['status'], 'SUCCEEDED')
+
+        # A new reading changes the fingerprint
+        row, _ = flatten_reading({})
+        write_rows([dict(row, meter_id=self.meter.id, timestamp=datetime(2025, 4, 2, tzinfo=dt_timezone.utc))])
+        third = client.post('/api/meter/meter-report/', {'meter_id': 'GENERATOR_01'}, format='json').json()
+        self.assertNotEqual(third['details']['job_id'], first['details']['job_id'])
+
+    @mock.patch('meter.jobs.REPORT_EXECUTOR', 'thread')
+    def test_reused_pending_job_is_handed_to_the_pool(self):
+        params = {'device_id': 'GENERATOR_01'}
+        with self.captureOnCommitCallbacks() as callbacks:
+            first = submit('meter', self.meter.pk, params)
+            second = submit('meter', self.meter.pk, params)
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(len(callbacks), 2)
+
+        with mock.patch('meter.jobs.get_executor') as get_executor:
+            for callback in callbacks:
+                callback()
+        get_executor.return_value.submit.assert_called_with(run_job, first.pk)
+        self.assertEqual(get_executor.return_value.submit.call_count, 2)
+
+        # Stored reports are served without queueing anything
+        claim(first.pk)
+        execute(first.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(submit('meter', self.meter.pk, params).pk, first.pk)
+        self.assertEqual(callbacks, [])
+
+    def test_stale_running_job_is_failed_not_reused(self):
+        params = {'device_id': 'GENERATOR_01'}
+        stuck = submit('meter', self.meter.pk, params)
+        claim(stuck.pk)
+        self.assertEqual(submit('meter', self.meter.pk, params).pk, stuck.pk)
+
+        ReportJob.objects.filter(pk=stuck.pk).update(started_at=timezone.now() - timedelta(hours=2))
+        with self.assertLogs('meter.jobs', 'WARNING'):
+            job = submit('meter', self.meter.pk, params)
+        self.assertNotEqual(job.pk, stuck.pk)
+        self.assertEqual(job.status, 'PENDING')
+        stuck.refresh_from_db()
+        self.assertEqual(stuck.status, 'FAILED')
+        self.assertIsNotNone(stuck.finished_at)
+
+    def test_eviction_drops_least_recently_used_files(self):
+        jobs = []
+        for day in range(3):
+            job = submit('meter', self.meter.pk, {'device_id': 'GENERATOR_01', 'from': f'2025-03-0{day + 1}', 'to': '2025-04-02'})
+            claim(job.pk)
+            execute(job.pk)
+            jobs.append(ReportJob.objects.get(pk=job.pk))
+        touch(jobs[0])
+
+        self.assertEqual(evict(keep=jobs[2].filename, max_files=2), [jobs[1].filename])
+        self.assertEqual(ReportJob.objects.get(pk=jobs[1].pk).status, 'EXPIRED')
+        self.assertEqual(ReportJob.objects.get(pk=jobs[0].pk).status, 'SUCCEEDED')
+
+    def test_job_status_is_scoped_to_report_type(self):
+        job = ReportJob.objects.create(report_type='alarm', meter=self.meter)
+        response = APIClient().get(f'/api/meter/meter-report/jobs/{job.pk}/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_range_report_streams_selected_fields(self):
+        start = datetime(2025, 4, 1, tzinfo=dt_timezone.utc)
+        make_readings(self.meter, start + timedelta(seconds=10), 5)
+        client = APIClient()
+        response = client.post('/api/meter/meter-alarm-report/', {
+            'meter_id': 'GENERATOR_01',
+            'from': start.isoformat(),
+            'to': (start + timedelta(minutes=1)).isoformat(),
+            'fields': 'alarm_emergency_stop,coolant_temp_c',
+        }, format='json')
+        self.assertEqual(response.status_code, 202)
+        job = ReportJob.objects.get(pk=response.json()['details']['job_id'])
+        self.assertEqual(job.params['fields'], ['alarm_emergency_stop', 'coolant_temp_c'])
+
+        claim_next()
+        execute(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'SUCCEEDED')
+
+        # The readings follow the alarm summary and timeline sheets
+        with default_storage.open(f'reports/{job.filename}') as f:
+            sheet = zipfile.ZipFile(f).read('xl/worksheets/sheet3.xml').decode()
+        self.assertIn('Emergency Stop', sheet)
+        self.assertNotIn('Oil Pressure', sheet)
+        # Header plus the setUp reading and the five in range
+        self.assertEqual(sheet.count('<row '), 7)
+
+    def test_range_report_as_csv(self):
+        start = datetime(2025, 4, 1, tzinfo=dt_timezone.utc)
+        response = APIClient().post('/api/meter/meter-report/', {
+            'meter_id': 'GENERATOR_01',
+            'from': start.isoformat(),
+            'to': (start + timedelta(minutes=1)).isoformat(),
+            'fields': 'rpm,alarm_crank_failure',
+            'format': 'csv',
+        }, format='json')
+        self.assertEqual(response.status_code, 202)
+        execute(claim_next())
+        job = ReportJob.objects.get()
+        self.assertTrue(job.filename.endswith('.csv'))
+        with default_storage.open(f'reports/{job.filename}') as f:
+            lines = f.read().decode().splitlines()
+        self.assertEqual(lines[0], 'timestamp,rpm,alarm_crank_failure')
+        self.assertEqual(len(lines), 2)
+
+    def test_csv_report_needs_a_range(self):
+        response = APIClient().post('/api/meter/meter-report/', {'meter_id': 'GENERATOR_01', 'format': 'csv'},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_range_report_rejects_malformed_fields(self):
+        for fields in ([1], 5, {'rpm': True}, ['rpm', None]):
+            response = APIClient().post('/api/meter/meter-report/', {
+                'meter_id': 'GENERATOR_01',
+                'from': '2025-04-01',
+                'to': '2025-04-02',
+                'fields': fields,
+            }, format='json')
+            self.assertEqual(response.status_code, 400, fields)
+        self.assertFalse(ReportJob.objects.exists())
+
+    def test_range_report_rejects_unknown_fields(self):
+        response = APIClient().post('/api/meter/meter-report/', {
+            'meter_id': 'GENERATOR_01',
+            'from': '2025-04-01',
+            'to': '2025-04-02',
+            'fields': 'bogus',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class FleetReportTests(TestCase):
+    def setUp(self):
+        self.start = datetime(2025, 4, 1, tzinfo=dt_timezone.utc)
+        self.meters = [
+            Meter.objects.create(device_id=device_id, location='Plant A')
+            for device_id in ('GENERATOR_01', 'GENERATOR/02', 'GENERATOR_03')
+        ]
+        make_readings(self.meters[0], self.start, 3)
+        make_readings(self.meters[1], self.start, 2)
+
+    def run_fleet_report(self, data):
+        response = APIClient().post('/api/meter/fleet-report/', data, format='json')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['details']['job_id']
+        claim_next()
+        execute(job_id)
+        job = ReportJob.objects.get(pk=job_id)
+        self.assertEqual(job.status, 'SUCCEEDED', job.error)
+        return default_storage.open(f'reports/{job.filename}')
+
+    def test_range_workbook_has_a_sheet_per_meter(self):
+        with self.run_fleet_report({
+            'device_ids': 'GENERATOR_01,GENERATOR/02,GENERATOR_03',
+            'from': self.start.isoformat(),
+            'to': (self.start + timedelta(hours=1)).isoformat(),
+            'fields': ['instantaneous_power_kw'],
+        }) as f:
+            workbook = zipfile.ZipFile(f).read('xl/workbook.xml').decode()
+        self.assertIn('name="GENERATOR_01"', workbook)
+        self.assertIn('name="GENERATOR_02"', workbook)
+        self.assertIn('name="GENERATOR_03"', workbook)
+        self.assertIn('name="Fleet Info"', workbook)
+
+    def test_zip_has_a_workbook_per_meter(self):
+        with self.run_fleet_report({
+            'device_ids': ['GENERATOR_01', 'GENERATOR/02', 'GENERATOR_03'],
+            'from': self.start.isoformat(),
+            'to': (self.start + timedelta(hours=1)).isoformat(),
+            'format': 'zip',
+        }) as f:
+            names = zipfile.ZipFile(f).namelist()
+        self.assertEqual(names, ['GENERATOR_01.xlsx', 'GENERATOR_02.xlsx', 'GENERATOR_03.xlsx'])
+
+    def test_zip_names_stay_unique_when_device_ids_collide(self):
+        for device_id in ('GENERATOR:01', 'generator/01'):
+            Meter.objects.create(device_id=device_id, location='Plant B')
+        with self.run_fleet_report({
+            'device_ids': ['GENERATOR_01', 'GENERATOR:01', 'generator/01'],
+            'from': self.start.isoformat(),
+            'to': (self.start + timedelta(hours=1)).isoformat(),
+            'format': 'zip',
+        }) as f:
+            names = zipfile.ZipFile(f).namelist()
+        self.assertEqual(names, ['GENERATOR_01.xlsx', 'GENERATOR_01~2.xlsx', 'generator_01~3.xlsx'])
+
+    def test_csv_has_every_meter_in_one_file(self):
+        with self.run_fleet_report({
+            'device_ids': ['GENERATOR_01', 'GENERATOR/02'],
+            'from': self.start.isoformat(),
+            'to': (self.start + timedelta(hours=1)).isoformat(),
+            'fields': 'rpm',
+            'format': 'csv',
+        }) as f:
+            lines = f.read().decode().splitlines()
+        self.assertEqual(lines[0], 'device_id,timestamp,rpm')
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], ['GENERATOR_01'] * 3 + ['GENERATOR/02'] * 2)
+
+    def test_unknown_device_ids_are_reported(self):
+        response = APIClient().post('/api/meter/fleet-report/', {'device_ids': ['GENERATOR_01', 'NOPE']}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['details'], ['NOPE'])
+
+
+class StartupImportTests(SimpleTestCase):
+    def test_report_libraries_load_on_first_use(self):
+        # Fails with CommandError when pandas, xlsxwriter or pyarrow load at startup
+        call_command('bench_imports', '--top', '0', stdout=io.StringIO())
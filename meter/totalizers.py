@@ -0,0 +1,230 @@
+"""
+Energy and fuel totalizers.
+
+Ingest integrates ``instantaneous_power_kw`` and ``fuel_rate_lph`` with
+the trapezoidal rule: every reading adds the area between itself and the
+meter's previous reading, which for the first reading of a batch is the
+one held in its MeterTotalizer. The increments advance the running
+counters and are summed per UTC day into MeterDailyTotal rows, so energy
+and fuel over any period are read from one row per whole day plus the raw
+readings of at most two partial days at its edges.
+
+A segment is counted on the day, and in the period, of the reading that
+ends it. Segments longer than METER_TOTALIZER_MAX_GAP_SECONDS are treated
+as the meter being offline and add nothing. Readings older than the
+counter's newest one cannot be integrated in order and are skipped;
+``python manage.py totalizer_catchup`` rebuilds a meter from its raw
+readings. As with rollups, two workers advancing the same meter at the
+same moment can lose one of the updates.
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Sum
+
+from .models import MeterDailyTotal, MeterData, MeterTotalizer
+from .queries import readings_in_range
+
+# Advance totalizers as part of every ingest write
+TOTALIZE_AT_INGEST = getattr(settings, 'METER_TOTALIZE_AT_INGEST', True)
+
+# Longest gap between readings that is still integrated across
+MAX_GAP = getattr(settings, 'METER_TOTALIZER_MAX_GAP_SECONDS', 15 * 60)
+
+DAY = 24 * 60 * 60
+
+TOTALIZED_FIELDS = ['instantaneous_power_kw', 'fuel_rate_lph']
+
+
+def increments(epochs, power, fuel, prev_epochs, prev_power, prev_fuel):
+    """kWh and litres of the trapezoid ending at each reading; readings without a usable predecessor add 0"""
+    elapsed = epochs - prev_epochs
+    hours = np.where((elapsed >= 0) & (elapsed <= MAX_GAP), elapsed, 0) / 3600
+    return (
+        np.nan_to_num((power + prev_power) / 2 * hours),
+        np.nan_to_num((fuel + prev_fuel) / 2 * hours),
+    )
+
+
+def shifted(values, first, carried):
+    """Each reading's predecessor value within its meter; the first reading of a meter takes ``carried``"""
+    previous = np.empty_like(values)
+    previous[1:] = values[:-1]
+    previous[first] = carried
+    return previous
+
+
+def totalize_rows(rows):
+    """Advance totalizers and daily totals with ``(meter_id, timestamp, power_kw, fuel_rate_lph)`` tuples"""
+    if not rows:
+        return
+    meter_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    epochs = np.fromiter((row[1].timestamp() for row in rows), dtype=np.float64, count=len(rows))
+    values = np.array([row[2:] for row in rows], dtype=np.float64).reshape(len(rows), 2)
+    order = np.lexsort((epochs, meter_ids))
+    meter_ids, epochs, power, fuel = meter_ids[order], epochs[order], values[order, 0], values[order, 1]
+
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = meter_ids[1:] != meter_ids[:-1]
+    counters = {counter.meter_id: counter for counter in MeterTotalizer.objects.filter(meter_id__in=meter_ids[first].tolist())}
+
+    # Leave out readings older than what each counter already integrated
+    since = np.array([
+        counters[meter_pk].timestamp.timestamp() if meter_pk in counters else -np.inf
+        for meter_pk in meter_ids[first].tolist()
+    ])
+    keep = epochs >= since[np.cumsum(first) - 1]
+    if not keep.all():
+        meter_ids, epochs, power, fuel = meter_ids[keep], epochs[keep], power[keep], fuel[keep]
+        first = np.ones(len(meter_ids), dtype=bool)
+        first[1:] = meter_ids[1:] != meter_ids[:-1]
+    if not len(meter_ids):
+        return
+
+    meters = meter_ids[first].tolist()
+    carried = [counters.get(meter_pk) for meter_pk in meters]
+    energy, litres = increments(
+        epochs, power, fuel,
+        shifted(epochs, first, [c.timestamp.timestamp() if c else np.nan for c in carried]),
+        shifted(power, first, [c.power_kw if c else np.nan for c in carried]),
+        shifted(fuel, first, [c.fuel_rate_lph if c else np.nan for c in carried]),
+    )
+
+    # Readings are sorted by meter and time, so each (meter, day) is one run
+    days = np.floor_divide(epochs, DAY)
+    day_start = first.copy()
+    day_start[1:] |= days[1:] != days[:-1]
+    starts = np.flatnonzero(day_start)
+    merge_daily({
+        (meter_pk, datetime.fromtimestamp(day * DAY, tz=dt_timezone.utc).date()): (day_energy, day_fuel)
+        for meter_pk, day, day_energy, day_fuel in zip(
+            meter_ids[starts].tolist(), days[starts].tolist(),
+            np.add.reduceat(energy, starts).tolist(), np.add.reduceat(litres, starts).tolist(),
+        )
+    })
+
+    segment_first = np.flatnonzero(first)
+    last = np.append(segment_first[1:], len(meter_ids)) - 1
+    MeterTotalizer.objects.bulk_create(
+        [
+            MeterTotalizer(
+                meter_id=meter_pk,
+                timestamp=datetime.fromtimestamp(epochs[i], tz=dt_timezone.utc),
+                power_kw=power[i],
+                fuel_rate_lph=fuel[i],
+                energy_kwh=(counter.energy_kwh if counter else 0) + added_energy,
+                fuel_l=(counter.fuel_l if counter else 0) + added_fuel,
+            )
+            for meter_pk, counter, i, added_energy, added_fuel in zip(
+                meters, carried, last.tolist(),
+                np.add.reduceat(energy, segment_first).tolist(), np.add.reduceat(litres, segment_first).tolist(),
+            )
+        ],
+        update_conflicts=True,
+        unique_fields=['meter'],
+        update_fields=['timestamp', 'power_kw', 'fuel_rate_lph', 'energy_kwh', 'fuel_l'],
+    )
+
+
+def merge_daily(totals):
+    """Add ``{(meter_pk, day): (energy_kwh, fuel_l)}`` into MeterDailyTotal rows, creating days as needed"""
+    existing = {
+        (total.meter_id, total.day): total
+        for total in MeterDailyTotal.objects.filter(
+            meter_id__in={meter_pk for meter_pk, _ in totals}, day__in={day for _, day in totals}
+        )
+    }
+    created = []
+    updated = []
+    for (meter_pk, day), (energy, fuel) in totals.items():
+        total = existing.get((meter_pk, day))
+        if total is None:
+            created.append(MeterDailyTotal(meter_id=meter_pk, day=day, energy_kwh=energy, fuel_l=fuel))
+        else:
+            total.energy_kwh += energy
+            total.fuel_l += fuel
+            updated.append(total)
+    MeterDailyTotal.objects.bulk_create(created, batch_size=500)
+    MeterDailyTotal.objects.bulk_update(updated, ['energy_kwh', 'fuel_l'], batch_size=500)
+
+
+def totalize_instances(instances):
+    """Advance totalizers with freshly written MeterData instances"""
+    totalize_rows([
+        (instance.meter_id, instance.timestamp, *(getattr(instance, field) for field in TOTALIZED_FIELDS))
+        for instance in instances
+    ])
+
+
+def rebuild(meter_pk, chunk_size=50000):
+    """Recompute one meter's totalizer and daily totals from all of its raw readings; returns readings read"""
+    MeterDailyTotal.objects.filter(meter_id=meter_pk).delete()
+    MeterTotalizer.objects.filter(meter_id=meter_pk).delete()
+    readings = (
+        MeterData.objects.filter(meter_id=meter_pk)
+        .order_by('timestamp', 'id')
+        .values_list('meter_id', 'timestamp', *TOTALIZED_FIELDS)
+    )
+    total = 0
+    chunk = []
+    for row in readings.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            totalize_rows(chunk)
+            total += len(chunk)
+            chunk = []
+    totalize_rows(chunk)
+    return total + len(chunk)
+
+
+def integrate_range(meter_pk, start, end):
+    """Energy and fuel of the segments ending in ``[start, end)``, integrated from raw readings"""
+    rows = list(readings_in_range(meter_pk, start, end).values_list('timestamp', *TOTALIZED_FIELDS))
+    previous = readings_in_range(meter_pk, end=start, descending=True).values_list('timestamp', *TOTALIZED_FIELDS).first()
+    if not rows:
+        return 0.0, 0.0
+    epochs = np.array([row[0].timestamp() for row in rows])
+    values = np.array([row[1:] for row in rows], dtype=np.float64).reshape(len(rows), 2)
+    first = np.zeros(len(rows), dtype=bool)
+    first[0] = True
+    before = (previous[0].timestamp(), previous[1], previous[2]) if previous else (np.nan, np.nan, np.nan)
+    energy, litres = increments(
+        epochs, values[:, 0], values[:, 1],
+        shifted(epochs, first, before[0]), shifted(values[:, 0], first, before[1]),
+        shifted(values[:, 1], first, before[2]),
+    )
+    return float(energy.sum()), float(litres.sum())
+
+
+def period_totals(meter_pk, start, end):
+    """
+    Energy, fuel and specific fuel consumption of one meter over ``[start, end)``:
+    whole UTC days from MeterDailyTotal, partial days at either edge from raw readings
+    """
+    first_day = datetime.combine(start.astimezone(dt_timezone.utc).date(), time(), tzinfo=dt_timezone.utc)
+    if first_day < start:
+        first_day += timedelta(days=1)
+    last_day = datetime.combine(end.astimezone(dt_timezone.utc).date(), time(), tzinfo=dt_timezone.utc)
+
+    days = 0
+    if first_day < last_day:
+        daily = MeterDailyTotal.objects.filter(
+            meter_id=meter_pk, day__gte=first_day.date(), day__lt=last_day.date()
+        ).aggregate(energy=Sum('energy_kwh'), fuel=Sum('fuel_l'), days=Count('pk'))
+        energy, fuel, days = daily['energy'] or 0.0, daily['fuel'] or 0.0, daily['days']
+        for edge_start, edge_end in ((start, first_day), (last_day, end)):
+            if edge_start < edge_end:
+                edge_energy, edge_fuel = integrate_range(meter_pk, edge_start, edge_end)
+                energy += edge_energy
+                fuel += edge_fuel
+    else:
+        energy, fuel = integrate_range(meter_pk, start, end)
+
+    return {
+        "energy_kwh": energy,
+        "fuel_l": fuel,
+        # Litres burnt per kWh generated; undefined without output
+        "specific_fuel_consumption_l_per_kwh": fuel / energy if energy > 0 else None,
+        "days_from_totals": days,
+    }
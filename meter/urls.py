@@ -1,15 +1,17 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import MeterViewSet, MeterAssignmentViewSet, MeterDataViewSet, GenerateAlarmReport, GenerateMeterReport
+from .views import AlarmRuleViewSet, MeterViewSet, MeterAssignmentViewSet, MeterDataViewSet, GenerateAlarmReport, GenerateMeterReport, GenerateFleetReport
 
 # Router for admin-only endpoints
 router = DefaultRouter()
 router.register(r'meters', MeterViewSet)
 router.register(r'meter-assignments', MeterAssignmentViewSet, basename='meter-assignments')
+router.register(r'alarm-rules', AlarmRuleViewSet)
 # Admin can still access these endpoints via the admin URL
 router.register(r'meter-data', MeterDataViewSet, basename='meter-data')
 router.register(r'meter-report', GenerateMeterReport, basename='meter-report')
 router.register(r'meter-alarm-report', GenerateAlarmReport, basename='meter-alarm-report')
+router.register(r'fleet-report', GenerateFleetReport, basename='fleet-report')
 
 urlpatterns = [
     path('', include(router.urls)),
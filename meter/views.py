@@ -2,18 +2,49 @@ from django.shortcuts import render, get_object_or_404
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action, api_view
-from .models import Meter, MeterAssignment, MeterData
-from .serializers import MeterSerializer, MeterAssignmentSerializer, MeterDataSerializer
+from .models import AlarmRule, Anomaly, Meter, MeterAssignment, MeterData, MeterDataRollup, MeterLatest, ReportJob
+from .serializers import (
+    AlarmRuleSerializer, MeterSerializer, MeterAssignmentSerializer, MeterDataSerializer, ReportJobSerializer,
+)
+from .ingest import prepare_reading, write_rows, ingest_bulk, ingest_stream, BULK_MAX_READINGS, INGEST_MODE
+from .buffer import get_buffer, BufferFull
+from .spool import get_spool
+from .queries import (
+    READING_FIELDS, fleet_readings_in_range, latest_reading, parse_reading_fields, parse_time, readings_in_range,
+    time_range,
+)
+from .pagination import InvalidCursor, page_size_from, paginate
+from .cache import resolver
+from .jobs import submit
+from .retention import is_stored, touch
+from .downloads import report_response
+from .report_specs import REPORT_LABELS, parse_report_fields
+from .exports import (
+    CONTENT_TYPES, EXPORT_FORMATS, CSVRenderer, ParquetRenderer, XLSXRenderer,
+    check_format, export_rows, streaming_export,
+)
+from .analytics import describe, load_columns, parse_fields, parse_percentiles
+from .rollups import RESOLUTIONS, ROLLUP_FIELDS, bucket_summary
+from .totalizers import period_totals
+from .sketches import SKETCH_FIELDS, fleet_percentiles
 from accounts.models import User
 from django.core.exceptions import ValidationError
-from django.http import HttpResponse
-import pandas as pd
-from io import BytesIO
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
+from django.db.models import Q
+from django.http import FileResponse
+from rest_framework.settings import api_settings
 from django.urls import reverse
 from django.utils import timezone
+from django.conf import settings
 import os
+import tempfile
+from datetime import time, timedelta, timezone as dt_timezone
+
+# Rows returned by meter-data/range/ when no limit is given, and the most allowed
+RANGE_DEFAULT_LIMIT = getattr(settings, 'METER_RANGE_DEFAULT_LIMIT', 1000)
+RANGE_MAX_LIMIT = getattr(settings, 'METER_RANGE_MAX_LIMIT', 10000)
+
+# Most rollup buckets returned by one request
+ROLLUP_MAX_BUCKETS = getattr(settings, 'METER_ROLLUP_MAX_BUCKETS', 10000)
 
 class MeterViewSet(viewsets.ModelViewSet):
     """
@@ -97,6 +128,57 @@ class MeterViewSet(viewsets.ModelViewSet):
         """Custom perform_update method"""
         serializer.save()
 
+    @action(detail=False, methods=['get'], url_path='cache-stats')
+    def cache_stats(self, request):
+        """Hit/miss counters of this worker's device_id lookup cache"""
+        return Response({
+            "details": {
+                "message": "Meter cache statistics retrieved successfully",
+                "data": resolver.stats()
+            }
+        }, status=status.HTTP_200_OK)
+
+
+class AlarmRuleViewSet(viewsets.ModelViewSet):
+    """
+    API endpoints for managing server-side alarm rules. Changes reach every
+    ingest worker within METER_CACHE_VERSION_CHECK_INTERVAL seconds.
+    """
+    queryset = AlarmRule.objects.select_related('meter').order_by('pk')
+    serializer_class = AlarmRuleSerializer
+    http_method_names = ['get', 'post', 'put', 'patch', 'delete']
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                "error": "Invalid alarm rule",
+                "details": serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        self.perform_create(serializer)
+        return Response({
+            "details": {
+                "message": "Alarm rule created successfully",
+                "data": serializer.data
+            }
+        }, status=status.HTTP_201_CREATED)
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        serializer = self.get_serializer(self.get_object(), data=request.data, partial=partial)
+        if not serializer.is_valid():
+            return Response({
+                "error": "Invalid alarm rule",
+                "details": serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        self.perform_update(serializer)
+        return Response({
+            "details": {
+                "message": "Alarm rule updated successfully",
+                "data": serializer.data
+            }
+        })
+
 
 class MeterAssignmentViewSet(viewsets.ViewSet):
     def list(self, request):
@@ -169,21 +251,49 @@ class MeterDataViewSet(viewsets.ViewSet):
     API endpoints for managing meter data.
     """
 
+    def perform_content_negotiation(self, request, force=False):
+        # range validates its own ?format=, which DRF also reads as a renderer override and
+        # answers with a 404 when no renderer matches; fall back to JSON so range can return a 400
+        return super().perform_content_negotiation(request, force=force or self.action == 'range')
+
     def list(self, request):
-        """Get all meter data or filter by meter_id"""
+        """Get a page of meter data, newest first, optionally filtered by meter_id"""
         try:
+            try:
+                page_size = page_size_from(request.query_params)
+            except ValueError as e:
+                return Response({
+                    "error": "Invalid page size",
+                    "details": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
             meter_id = request.query_params.get('meter_id', None)
             if meter_id:
-                meter = get_object_or_404(Meter, device_id=meter_id)
-                data_points = MeterData.objects.filter(meter=meter)
+                meter = resolver.get(meter_id)
+                if meter is None:
+                    return Response({
+                        "error": f"Meter with device_id {meter_id} not found"
+                    }, status=status.HTTP_404_NOT_FOUND)
+                data_points = MeterData.objects.filter(meter_id=meter.pk)
             else:
                 data_points = MeterData.objects.all()
 
-            serializer = MeterDataSerializer(data_points, many=True)
+            try:
+                rows, next_cursor, previous_cursor = paginate(
+                    data_points, READING_FIELDS, request.query_params.get('cursor'), page_size
+                )
+            except InvalidCursor as e:
+                return Response({
+                    "error": "Invalid cursor",
+                    "details": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
             return Response({
                 "details": {
                     "message": "Meter data retrieved successfully",
-                    "data": serializer.data
+                    "data": rows,
+                    "next": next_cursor,
+                    "previous": previous_cursor
                 }
             }, status=status.HTTP_200_OK)
         except Exception as e:
@@ -196,7 +306,7 @@ class MeterDataViewSet(viewsets.ViewSet):
         """Get a specific meter data point by ID"""
         try:
             print(f"Attempting to retrieve meter data with pk={pk}")
-            data = MeterData.objects.filter(meter=pk).first()
+            data = latest_reading(pk)
             print(f"Found data: {data}")
             # This will never execute since get_object_or_404 raises an exception if not found
             if not data:
@@ -229,100 +339,61 @@ class MeterDataViewSet(viewsets.ViewSet):
         try:
             # Extract meter_id from payload
             meter_id = request.data.get('meter_id')
-            data = request.data.get('data', {})
 
             if not meter_id:
                 return Response({
                     "error": "meter_id is required"
                 }, status=status.HTTP_400_BAD_REQUEST)
+            if not isinstance(meter_id, str):
+                return Response({
+                    "error": "meter_id must be a string"
+                }, status=status.HTTP_400_BAD_REQUEST)
 
             # Get the meter
-            try:
-                meter = Meter.objects.get(device_id=meter_id)
-            except Meter.DoesNotExist:
+            meter = resolver.get(meter_id)
+            if meter is None:
                 return Response({
                     "error": f"Meter with device_id {meter_id} not found"
                 }, status=status.HTTP_404_NOT_FOUND)
 
-            # Prepare data object
-            meter_data = {
-                'meter': meter.id,
-                'engine_hours': data.get('engine_hours', 0),
-                'frequency_hz': data.get('frequency_hz', 0),
-                'power_percentage': data.get('power_percentage', 0),
-
-                # Average readings
-                'avg_ll_volt': data.get('avg_ll_volt', 0),
-                'avg_ln_volt': data.get('avg_ln_volt', 0),
-                'avg_current': data.get('avg_current', 0),
-
-                # Phase A data
-                'phase_a_voltage_v': data.get('phase_a', {}).get('voltage_v', 0),
-                'phase_a_current_a': data.get('phase_a', {}).get('current_a', 0),
-                'phase_a_voltage_ll': data.get('phase_a', {}).get('voltage_ll', 0),
-                'phase_a_frequency_hz': data.get('phase_a', {}).get('frequency_hz', 0),
-                'phase_a_real_power': data.get('phase_a', {}).get('real_power', 0),
-                'phase_a_apparent_power': data.get('phase_a', {}).get('apparent_power', 0),
-                'phase_a_reactive_power': data.get('phase_a', {}).get('reactive_power', 0),
-
-                # Phase B data
-                'phase_b_voltage_v': data.get('phase_b', {}).get('voltage_v', 0),
-                'phase_b_current_a': data.get('phase_b', {}).get('current_a', 0),
-                'phase_b_voltage_ll': data.get('phase_b', {}).get('voltage_ll', 0),
-                'phase_b_frequency_hz': data.get('phase_b', {}).get('frequency_hz', 0),
-                'phase_b_real_power': data.get('phase_b', {}).get('real_power', 0),
-                'phase_b_apparent_power': data.get('phase_b', {}).get('apparent_power', 0),
-                'phase_b_reactive_power': data.get('phase_b', {}).get('reactive_power', 0),
-
-                # Phase C data
-                'phase_c_voltage_v': data.get('phase_c', {}).get('voltage_v', 0),
-                'phase_c_current_a': data.get('phase_c', {}).get('current_a', 0),
-                'phase_c_voltage_ll': data.get('phase_c', {}).get('voltage_ll', 0),
-                'phase_c_frequency_hz': data.get('phase_c', {}).get('frequency_hz', 0),
-                'phase_c_real_power': data.get('phase_c', {}).get('real_power', 0),
-                'phase_c_apparent_power': data.get('phase_c', {}).get('apparent_power', 0),
-                'phase_c_reactive_power': data.get('phase_c', {}).get('reactive_power', 0),
-
-                # Breaker statuses
-                'gen_breaker': data.get('gen_breaker'),
-                'util_breaker': data.get('util_breaker'),
-                'gc_status': data.get('gc_status'),
-
-                # Other measurements
-                'coolant_temp_c': data.get('coolant_temp_c', 0),
-                'oil_pressure_kpa': data.get('oil_pressure_kpa', 0),
-                'battery_voltage_v': data.get('battery_voltage_v', 0),
-                'fuel_level_percent': data.get('fuel_level_percent', 0),
-                'rpm': data.get('rpm', 0),
-                'oil_temp_c': data.get('oil_temp_c', 0),
-                'boost_pressure_kpa': data.get('boost_pressure_kpa', 0),
-                'intake_air_temp_c': data.get('intake_air_temp_c', 0),
-                'fuel_rate_lph': data.get('fuel_rate_lph', 0),
-                'instantaneous_power_kw': data.get('instantaneous_power_kw', 0),
-
-                # Alarms
-                'alarm_emergency_stop': data.get('alarms', {}).get('emergency_stop', False),
-                'alarm_low_oil_pressure': data.get('alarms', {}).get('low_oil_pressure', False),
-                'alarm_high_coolant_temp': data.get('alarms', {}).get('high_coolant_temp', False),
-                'alarm_low_coolant_level': data.get('alarms', {}).get('low_coolant_level', False),
-                'alarm_crank_failure': data.get('alarms', {}).get('crank_failure', False),
-            }
+            # Flatten and validate with the compiled reading schema
+            row, errors = prepare_reading(request.data, {meter_id: meter.pk})
+            if errors:
+                return Response({
+                    "error": "Invalid data",
+                    "details": errors
+                }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Validate and save
-            serializer = MeterDataSerializer(data=meter_data)
-            if serializer.is_valid():
-                serializer.save()
+            if INGEST_MODE in ('buffered', 'spooled'):
+                # Stamp the reading now so it keeps its arrival time while queued
+                row.setdefault('timestamp', timezone.now())
+                if INGEST_MODE == 'spooled':
+                    get_spool().append(row)
+                else:
+                    try:
+                        get_buffer().put(row)
+                    except BufferFull as e:
+                        return Response({
+                            "error": "Meter data buffer is full, retry later",
+                            "details": str(e)
+                        }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
                 return Response({
                     "details": {
-                        "message": "Meter data recorded successfully",
-                        "data": serializer.data
+                        "message": "Meter data accepted for recording",
+                        "data": {
+                            "meter_id": meter_id,
+                            "timestamp": row['timestamp']
+                        }
                     }
-                }, status=status.HTTP_201_CREATED)
-            else:
-                return Response({
-                    "error": "Invalid data",
-                    "details": serializer.errors
-                }, status=status.HTTP_400_BAD_REQUEST)
+                }, status=status.HTTP_202_ACCEPTED)
+
+            instance = write_rows([row])[0]
+            return Response({
+                "details": {
+                    "message": "Meter data recorded successfully",
+                    "data": MeterDataSerializer(instance).data
+                }
+            }, status=status.HTTP_201_CREATED)
 
         except Exception as e:
             return Response({
@@ -330,190 +401,507 @@ class MeterDataViewSet(viewsets.ViewSet):
                 "details": str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    @action(detail=False, methods=['get'])
-    def latest(self, request):
-        """Get latest data for each meter"""
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Record many meter data points, possibly for many meters, in one request"""
         try:
-            latest_data = {}
-            for meter in Meter.objects.all():
-                data = MeterData.objects.filter(meter=meter).order_by('-timestamp').first()
-                if data:
-                    latest_data[meter.device_id] = MeterDataSerializer(data).data
+            readings = request.data
+            if isinstance(readings, dict):
+                readings = readings.get('readings')
+
+            if not isinstance(readings, list) or not readings:
+                return Response({
+                    "error": "readings must be a non-empty list"
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            if len(readings) > BULK_MAX_READINGS:
+                return Response({
+                    "error": f"A bulk request may contain at most {BULK_MAX_READINGS} readings"
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            results = ingest_bulk(readings)
+            accepted = sum(1 for result in results if result['status'] == 'accepted')
 
             return Response({
                 "details": {
-                    "message": "Latest meter data retrieved successfully",
-                    "data": latest_data
+                    "message": "Bulk meter data processed",
+                    "data": {
+                        "accepted": accepted,
+                        "rejected": len(results) - accepted,
+                        "results": results
+                    }
                 }
-            }, status=status.HTTP_200_OK)
+            }, status=status.HTTP_201_CREATED if accepted else status.HTTP_400_BAD_REQUEST)
+
         except Exception as e:
             return Response({
-                "error": "Error retrieving latest meter data",
+                "error": "Error recording bulk meter data",
                 "details": str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['post'])
+    def stream(self, request):
+        """Record newline-delimited JSON readings, flushing them in batches as the body arrives"""
+        try:
+            # request.data is never touched, so DRF does not buffer or parse the body
+            body = request.stream
+            if body is None:
+                return Response({
+                    "error": "Request body is empty"
+                }, status=status.HTTP_400_BAD_REQUEST)
 
+            summary = ingest_stream(body)
 
-class GenerateAlarmReport(viewsets.ViewSet):
-    def create(self, request):
+            return Response({
+                "details": {
+                    "message": "Streamed meter data processed",
+                    "data": summary
+                }
+            }, status=status.HTTP_201_CREATED if summary['accepted'] else status.HTTP_400_BAD_REQUEST)
+
+        except Exception as e:
+            return Response({
+                "error": "Error recording streamed meter data",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=False, methods=['get'], url_path='range',
+            renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES + [CSVRenderer, ParquetRenderer, XLSXRenderer])
+    def range(self, request):
         """
-        Generate an alarm report for a specific meter and return a download URL.
+        Get one meter's readings between from (inclusive) and to (exclusive), oldest first.
+
+        ``fields`` selects columns, including the derived power-quality
+        metrics. With ``format=csv``, ``parquet`` or ``xlsx`` the whole
+        range is downloaded as a file instead, ignoring ``limit``.
         """
         try:
-            meter_id = request.data.get('meter_id')
+            meter_id = request.query_params.get('meter_id')
+            if not meter_id:
+                return Response({
+                    "error": "meter_id is required"
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                export_format = request.query_params.get('format')
+                if export_format not in (None, 'json', 'api'):
+                    check_format(export_format, ['xlsx'] + EXPORT_FORMATS)
+            except ValueError as e:
+                return Response({
+                    "error": "Invalid format",
+                    "details": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                start, end = time_range(request.query_params, required=True)
+                limit = int(request.query_params.get('limit', RANGE_DEFAULT_LIMIT))
+            except ValueError as e:
+                return Response({
+                    "error": "Invalid range",
+                    "details": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+            limit = max(1, min(limit, RANGE_MAX_LIMIT))
+
+            try:
+                fields = parse_reading_fields(request.query_params.get('fields'))
+            except ValueError as e:
+                return Response({
+                    "error": "Invalid fields",
+                    "details": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            meter = resolver.get(meter_id)
+            if meter is None:
+                return Response({
+                    "error": f"Meter with device_id {meter_id} not found"
+                }, status=status.HTTP_404_NOT_FOUND)
+
+            if export_format in EXPORT_FORMATS:
+                rows = export_rows(readings_in_range(meter.pk, start, end), fields)
+                filename = f"{meter_id}_{start:%Y%m%d}-{end:%Y%m%d}.{export_format}"
+                return streaming_export(rows, fields, export_format, filename)
+            if export_format == 'xlsx':
+                return self.range_workbook(meter, start, end, fields if request.query_params.get('fields') else None)
+
+            # Fetch one extra row to tell whether the range holds more than the limit
+            rows = list(readings_in_range(meter.pk, start, end).values(*fields)[:limit + 1])
+            has_more = len(rows) > limit
+
+            return Response({
+                "details": {
+                    "message": "Meter data retrieved successfully",
+                    "data": {
+                        "meter_id": meter_id,
+                        "from": start,
+                        "to": end,
+                        "count": min(len(rows), limit),
+                        "has_more": has_more,
+                        "readings": rows[:limit]
+                    }
+                }
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({
+                "error": "Error retrieving meter data",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def range_workbook(self, meter, start, end, fields=None):
+        """A meter data workbook of the range, built in constant_memory mode into a temporary file"""
+        # Imported on first use to keep pandas and xlsxwriter out of worker startup
+        from .reports import write_range_workbook
+
+        # Only report columns have sheet labels; the timestamp is always the first column
+        fields = [field for field in fields or [] if field in REPORT_LABELS] or parse_report_fields(None, 'meter')
+        rows = export_rows(readings_in_range(meter.pk, start, end), ['timestamp'] + fields)
+        file = tempfile.TemporaryFile()
+        write_range_workbook(file, rows, fields, 'Meter Data Report', meter.device_id, start, end)
+        file.seek(0)
+        filename = f"{meter.device_id}_{start:%Y%m%d}-{end:%Y%m%d}.xlsx"
+        return FileResponse(file, as_attachment=True, filename=filename, content_type=CONTENT_TYPES['xlsx'])
+
+    @action(detail=False, methods=['get'], url_path='rollup')
+    def rollup(self, request):
+        """Get one meter's min/max/avg/last per time bucket between from (inclusive) and to (exclusive)"""
+        try:
+            meter_id = request.query_params.get('meter_id')
+            resolution = request.query_params.get('resolution')
+            if not meter_id or not resolution:
+                return Response({
+                    "error": "meter_id and resolution are required"
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            if resolution not in RESOLUTIONS:
+                return Response({
+                    "error": "Invalid resolution",
+                    "details": f"resolution must be one of {', '.join(RESOLUTIONS)}"
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            fields = request.query_params.get('fields')
+            fields = fields.split(',') if fields else ROLLUP_FIELDS
+            unknown = [field for field in fields if field not in ROLLUP_FIELDS]
+            if unknown:
+                return Response({
+                    "error": "Invalid fields",
+                    "details": f"Not rolled up: {', '.join(unknown)}"
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                start, end = time_range(request.query_params, required=True)
+            except ValueError as e:
+                return Response({
+                    "error": "Invalid range",
+                    "details": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            meter = resolver.get(meter_id)
+            if meter is None:
+                return Response({
+                    "error": f"Meter with device_id {meter_id} not found"
+                }, status=status.HTTP_404_NOT_FOUND)
+
+            rollups = list(MeterDataRollup.objects.filter(
+                meter_id=meter.pk,
+                resolution=resolution,
+                bucket_start__gte=start,
+                bucket_start__lt=end,
+            ).order_by('bucket_start')[:ROLLUP_MAX_BUCKETS + 1])
+            has_more = len(rollups) > ROLLUP_MAX_BUCKETS
+            rollups = rollups[:ROLLUP_MAX_BUCKETS]
+
+            return Response({
+                "details": {
+                    "message": "Meter data rollup retrieved successfully",
+                    "data": {
+                        "meter_id": meter_id,
+                        "resolution": resolution,
+                        "from": start,
+                        "to": end,
+                        "count": len(rollups),
+                        "has_more": has_more,
+                        "buckets": [
+                            {
+                                "bucket_start": rollup.bucket_start,
+                                "count": rollup.count,
+                                "last_timestamp": rollup.last_timestamp,
+                                "fields": bucket_summary(rollup, fields),
+                            }
+                            for rollup in rollups
+                        ]
+                    }
+                }
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({
+                "error": "Error retrieving meter data rollup",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['get'], url_path='totals')
+    def totals(self, request):
+        """Get one meter's energy, fuel and specific fuel consumption between from (inclusive) and to (exclusive)"""
+        try:
+            meter_id = request.query_params.get('meter_id')
             if not meter_id:
                 return Response({
                     "error": "meter_id is required"
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Get the meter
             try:
-                meter = Meter.objects.get(device_id=meter_id)
-            except Meter.DoesNotExist:
+                start, end = time_range(request.query_params, required=True)
+            except ValueError as e:
+                return Response({
+                    "error": "Invalid range",
+                    "details": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            meter = resolver.get(meter_id)
+            if meter is None:
                 return Response({
                     "error": f"Meter with device_id {meter_id} not found"
                 }, status=status.HTTP_404_NOT_FOUND)
 
-            # Get the most recent data point
-            data = MeterData.objects.filter(meter=meter).order_by('-timestamp').first()
+            return Response({
+                "details": {
+                    "message": "Meter totals retrieved successfully",
+                    "data": {
+                        "meter_id": meter_id,
+                        "from": start,
+                        "to": end,
+                        **period_totals(meter.pk, start, end),
+                    }
+                }
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({
+                "error": "Error retrieving meter totals",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-            if not data:
+    @action(detail=False, methods=['get'], url_path='anomalies')
+    def anomalies(self, request):
+        """Get one meter's anomalous readings between from (inclusive) and to (exclusive), oldest first"""
+        try:
+            meter_id = request.query_params.get('meter_id')
+            if not meter_id:
                 return Response({
-                    "error": "No data found for this meter"
+                    "error": "meter_id is required"
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                start, end = time_range(request.query_params, required=True)
+                limit = int(request.query_params.get('limit', RANGE_DEFAULT_LIMIT))
+            except ValueError as e:
+                return Response({
+                    "error": "Invalid range",
+                    "details": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+            limit = max(1, min(limit, RANGE_MAX_LIMIT))
+
+            meter = resolver.get(meter_id)
+            if meter is None:
+                return Response({
+                    "error": f"Meter with device_id {meter_id} not found"
                 }, status=status.HTTP_404_NOT_FOUND)
 
-            # Create Excel file with only the most recent data point
-            report_data = {
-                'Metric': [
-                    'Timestamp',
-                    'Emergency Stop',
-                    'Low Oil Pressure',
-                    'High Coolant Temp',
-                    'Low Coolant Level',
-                    'Crank Failure',
-                    'Coolant Temp (°C)',
-                    'Oil Pressure (kPa)',
-                    'Engine Hours',
-                    'Fuel Level (%)'
-                ],
-                'Current Value': [
-                    data.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                    'Yes' if data.alarm_emergency_stop else 'No',
-                    'Yes' if data.alarm_low_oil_pressure else 'No',
-                    'Yes' if data.alarm_high_coolant_temp else 'No',
-                    'Yes' if data.alarm_low_coolant_level else 'No',
-                    'Yes' if data.alarm_crank_failure else 'No',
-                    data.coolant_temp_c,
-                    data.oil_pressure_kpa,
-                    data.engine_hours,
-                    data.fuel_level_percent
-                ]
-            }
+            anomalies = list(Anomaly.objects.filter(
+                meter_id=meter.pk, timestamp__gte=start, timestamp__lt=end
+            ).order_by('timestamp', 'id').values('timestamp', 'field', 'value', 'mean', 'stddev', 'zscore')[:limit])
+            return Response({
+                "details": {
+                    "message": "Anomalies retrieved successfully",
+                    "data": {
+                        "meter_id": meter_id,
+                        "from": start,
+                        "to": end,
+                        "count": len(anomalies),
+                        "anomalies": anomalies,
+                    }
+                }
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({
+                "error": "Error retrieving anomalies",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=False, methods=['get'], url_path='stats')
+    def stats(self, request):
+        """Get count, min, max, mean, stddev and percentiles of fields over one meter's time range"""
+        try:
+            meter_id = request.query_params.get('meter_id')
+            if not meter_id:
+                return Response({
+                    "error": "meter_id is required"
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                start, end = time_range(request.query_params, required=True)
+                fields = parse_fields(request.query_params.get('fields'))
+                percentiles = parse_percentiles(request.query_params.get('percentiles'))
+            except ValueError as e:
+                return Response({
+                    "error": "Invalid stats query",
+                    "details": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            meter = resolver.get(meter_id)
+            if meter is None:
+                return Response({
+                    "error": f"Meter with device_id {meter_id} not found"
+                }, status=status.HTTP_404_NOT_FOUND)
+
+            values = load_columns(readings_in_range(meter.pk, start, end), fields)
+
+            return Response({
+                "details": {
+                    "message": "Meter data stats retrieved successfully",
+                    "data": {
+                        "meter_id": meter_id,
+                        "from": start,
+                        "to": end,
+                        "rows": len(values),
+                        "fields": describe(values, fields, percentiles)
+                    }
+                }
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({
+                "error": "Error computing meter data stats",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=False, methods=['get'], url_path='percentiles')
+    def percentiles(self, request):
+        """
+        Get percentiles of sketched fields merged across meters (device_ids,
+        default the whole fleet) over the whole UTC days from and to touch
+        """
+        try:
+            try:
+                start, end = time_range(request.query_params, required=True)
+                fields = parse_fields(request.query_params.get('fields'))
+                unsketched = [field for field in fields if field not in SKETCH_FIELDS]
+                if unsketched:
+                    raise ValueError(f"Fields without sketches: {', '.join(unsketched)}")
+                percentiles = parse_percentiles(request.query_params.get('percentiles'))
+            except ValueError as e:
+                return Response({
+                    "error": "Invalid percentiles query",
+                    "details": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Create DataFrame
-            df = pd.DataFrame(report_data)
-
-            # Create a buffer to save the Excel file
-            buffer = BytesIO()
-
-            # Create Excel writer
-            with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                df.to_excel(writer, sheet_name='Alarm Report', index=False)
-                workbook = writer.book
-                worksheet = writer.sheets['Alarm Report']
-
-                # Add some formatting
-                header_format = workbook.add_format({
-                    'bold': True,
-                    'text_wrap': True,
-                    'valign': 'top',
-                    'bg_color': '#D7E4BC',
-                    'border': 1
-                })
-
-                # Format the header row
-                for col_num, value in enumerate(df.columns.values):
-                    worksheet.write(0, col_num, value, header_format)
-
-                # Format the metric names column
-                metric_format = workbook.add_format({
-                    'bold': True,
-                    'bg_color': '#E6E6E6',
-                    'border': 1
-                })
-
-                for row_num in range(df.shape[0]):
-                    worksheet.write(row_num + 1, 0, df['Metric'][row_num], metric_format)
-
-                # Set column widths
-                worksheet.set_column(0, 0, 25)  # Metric names column
-                worksheet.set_column(1, 1, 25)  # Values column
-
-                # Add device info at the bottom
-                info_format = workbook.add_format({
-                    'bold': True,
-                    'font_size': 12,
-                    'font_color': 'blue'
-                })
-                worksheet.write(df.shape[0] + 3, 0, "Device ID:", info_format)
-                worksheet.write(df.shape[0] + 3, 1, meter_id)
-                worksheet.write(df.shape[0] + 4, 0, "Report Generated At:", info_format)
-                worksheet.write(df.shape[0] + 4, 1, timezone.now().strftime('%Y-%m-%d %H:%M:%S'))
-
-            # Save the Excel file
-            timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"alarm_report_{meter_id}_{timestamp}.xlsx"
-            file_path = f"reports/{filename}"
-
-            # Reset buffer position
-            buffer.seek(0)
-
-            # Save to storage
-            default_storage.save(file_path, ContentFile(buffer.getvalue()))
-
-            # Generate download URL
-            download_url = request.build_absolute_uri(f'/media/{file_path}')
+            meter_ids = None
+            device_ids = request.query_params.get('device_ids')
+            if device_ids:
+                device_ids = list(dict.fromkeys(device_id.strip() for device_id in device_ids.split(',') if device_id.strip()))
+                meters = dict(Meter.objects.filter(device_id__in=device_ids).values_list('device_id', 'pk'))
+                missing = set(device_ids) - set(meters)
+                if missing:
+                    return Response({
+                        "error": "Meters not found",
+                        "details": sorted(missing)
+                    }, status=status.HTTP_404_NOT_FOUND)
+                meter_ids = list(meters.values())
+
+            first_day = start.astimezone(dt_timezone.utc).date()
+            end = end.astimezone(dt_timezone.utc)
+            last_day = end.date() if end.time() == time() else end.date() + timedelta(days=1)
 
             return Response({
                 "details": {
-                    "message": "Alarm report generated successfully",
-                    "filename": filename,
-                    "download_url": download_url
+                    "message": "Meter data percentiles retrieved successfully",
+                    "data": {
+                        "device_ids": device_ids or None,
+                        "from_day": first_day,
+                        "to_day": last_day,
+                        "fields": fleet_percentiles(fields, first_day, last_day, percentiles, meter_ids),
+                    }
                 }
             }, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({
+                "error": "Error computing meter data percentiles",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=False, methods=['get'])
+    def latest(self, request):
+        """Get latest data for each meter"""
+        try:
+            snapshots = MeterLatest.objects.select_related('meter', 'data')
+            latest_data = {
+                snapshot.meter.device_id: MeterDataSerializer(snapshot.data).data
+                for snapshot in snapshots
+            }
 
+            return Response({
+                "details": {
+                    "message": "Latest meter data retrieved successfully",
+                    "data": latest_data
+                }
+            }, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({
-                "error": "Error generating alarm report",
+                "error": "Error retrieving latest meter data",
                 "details": str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+
+
+class ReportJobMixin:
+    """
+    Request parsing shared by the report viewsets, plus ``GET jobs/<job_id>/``
+    for polling their jobs and ``GET <filename>/`` for downloading reports
+    """
+    report_type = None
+    report_formats = ['xlsx'] + EXPORT_FORMATS
+    # Report file names contain dots
+    lookup_value_regex = r'[^/]+'
+
+    def report_params(self, data, **params):
+        """
+        Job parameters from the request body. ``from`` and ``to`` ask for one
+        row per reading in that range instead of the latest reading only
+        (alarm reports summarize the range's alarm history instead, adding
+        the readings only when ``fields`` are selected); ``fields`` narrows a
+        range report's columns and ``format`` picks one of report_formats,
+        where CSV and Parquet need a range. Raises ValueError.
+        """
+        report_format = check_format(data.get('format') or 'xlsx', self.report_formats)
+        if data.get('from') or data.get('to'):
+            start, end = time_range(data, required=True)
+            params.update({'from': start.isoformat(), 'to': end.isoformat()})
+            # Builders fall back to every column of the report when no fields are stored
+            if data.get('fields'):
+                params['fields'] = parse_report_fields(data.get('fields'), self.report_type)
+        elif data.get('fields'):
+            raise ValueError("fields can only be selected for a from/to range report")
+        elif report_format in EXPORT_FORMATS:
+            raise ValueError(f"{report_format} reports need a from/to range")
+        params['format'] = report_format
+        return params
+
+    def has_data(self, meter_pk, params):
+        if 'from' in params:
+            return readings_in_range(meter_pk, parse_time(params['from']), parse_time(params['to'])).exists()
+        return latest_reading(meter_pk) is not None
+
     def retrieve(self, request, pk=None):
         """
-        Download a specific report by filename and delete it afterward
+        Download a report by filename, streamed from storage with Range and
+        ETag support; the file stays cached for other requests of the same report
         """
         try:
-            filename = pk
-            file_path = f"reports/{filename}"
-
-            if not default_storage.exists(file_path):
+            response = report_response(request, pk)
+            if response is None:
                 return Response({
                     "error": "Report file not found"
                 }, status=status.HTTP_404_NOT_FOUND)
 
-            # Read the file
-            file_content = default_storage.open(file_path).read()
-
-            # Create HTTP response with file
-            response = HttpResponse(
-                file_content,
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-            # Delete the file after sending
-            default_storage.delete(file_path)
+            # Downloads count as a use for storage eviction
+            for job in ReportJob.objects.filter(filename=pk, status='SUCCEEDED'):
+                touch(job)
 
             return response
 
@@ -523,12 +911,45 @@ class GenerateAlarmReport(viewsets.ViewSet):
                 "details": str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['get'], url_path=r'jobs/(?P<job_id>[0-9a-f-]+)')
+    def job_status(self, request, job_id=None):
+        """Get the status of a report job, with the download URL once it has succeeded"""
+        try:
+            job = ReportJob.objects.select_related('meter').filter(pk=job_id, report_type=self.report_type).first()
+            if job is None:
+                return Response({
+                    "error": "Report job not found"
+                }, status=status.HTTP_404_NOT_FOUND)
+
+            # A job whose file was evicted is reported as EXPIRED; polling a stored one counts as a use
+            if job.status == 'SUCCEEDED' and is_stored(job):
+                touch(job)
 
+            details = {
+                "message": f"Report job {job.status.lower()}",
+                "data": ReportJobSerializer(job).data
+            }
+            if job.status == 'SUCCEEDED':
+                details["download_url"] = self.reverse_action('detail', kwargs={'pk': job.filename})
+
+            return Response({"details": details}, status=status.HTTP_200_OK)
+        except (ValidationError, ValueError):
+            return Response({
+                "error": "Report job not found"
+            }, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({
+                "error": "Error retrieving report job",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class GenerateAlarmReport(ReportJobMixin, viewsets.ViewSet):
+    report_type = 'alarm'
 
-class GenerateMeterReport(viewsets.ViewSet):
     def create(self, request):
         """
-        Generate a comprehensive report with only the most recent meter data for a specific meter.
+        Queue an alarm report for a specific meter and return the job id to poll.
         """
         try:
             meter_id = request.data.get('meter_id')
@@ -537,204 +958,101 @@ class GenerateMeterReport(viewsets.ViewSet):
                 return Response({
                     "error": "meter_id is required"
                 }, status=status.HTTP_400_BAD_REQUEST)
+            if not isinstance(meter_id, str):
+                return Response({
+                    "error": "meter_id must be a string"
+                }, status=status.HTTP_400_BAD_REQUEST)
 
             # Get the meter
-            try:
-                meter = Meter.objects.get(device_id=meter_id)
-            except Meter.DoesNotExist:
+            meter = resolver.get(meter_id)
+            if meter is None:
                 return Response({
                     "error": f"Meter with device_id {meter_id} not found"
                 }, status=status.HTTP_404_NOT_FOUND)
 
-            # Get only the most recent data point
-            data = MeterData.objects.filter(meter=meter).order_by('-timestamp').first()
+            try:
+                params = self.report_params(request.data, device_id=meter_id)
+            except ValueError as e:
+                return Response({
+                    "error": "Invalid report request",
+                    "details": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
 
-            if not data:
+            # Fail fast when there is nothing to report on
+            if not self.has_data(meter.pk, params):
                 return Response({
                     "error": "No data found for this meter"
                 }, status=status.HTTP_404_NOT_FOUND)
 
-            # Create a buffer to save the Excel file
-            buffer = BytesIO()
-
-            # Create DataFrame with a single column for the most recent data
-            report_data = {
-                'Metric': [
-                    'Timestamp',
-                    # Basic meter data
-                    'Engine Hours',
-                    'Frequency (Hz)',
-                    'Power (%)',
-                    # Average readings
-                    'Avg Line-to-Line Voltage',
-                    'Avg Line-to-Neutral Voltage',
-                    'Avg Current',
-                    # Phase A data
-                    'Phase A Voltage (V)',
-                    'Phase A Current (A)',
-                    'Phase A Voltage Line-to-Line',
-                    'Phase A Frequency (Hz)',
-                    'Phase A Real Power',
-                    'Phase A Apparent Power',
-                    'Phase A Reactive Power',
-                    # Phase B data
-                    'Phase B Voltage (V)',
-                    'Phase B Current (A)',
-                    'Phase B Voltage Line-to-Line',
-                    'Phase B Frequency (Hz)',
-                    'Phase B Real Power',
-                    'Phase B Apparent Power',
-                    'Phase B Reactive Power',
-                    # Phase C data
-                    'Phase C Voltage (V)',
-                    'Phase C Current (A)',
-                    'Phase C Voltage Line-to-Line',
-                    'Phase C Frequency (Hz)',
-                    'Phase C Real Power',
-                    'Phase C Apparent Power',
-                    'Phase C Reactive Power',
-                    # Breaker statuses
-                    'Generator Breaker',
-                    'Utility Breaker',
-                    'GC Status',
-                    # Temperature and pressure
-                    'Coolant Temp (°C)',
-                    'Oil Temp (°C)',
-                    'Intake Air Temp (°C)',
-                    'Oil Pressure (kPa)',
-                    'Boost Pressure (kPa)',
-                    # Fuel metrics
-                    'Fuel Level (%)',
-                    'Fuel Rate (L/h)',
-                    # Others
-                    'RPM',
-                    'Battery Voltage (V)',
-                    'Instantaneous Power (kW)',
-                    # Alarms
-                    'Emergency Stop',
-                    'Low Oil Pressure',
-                    'High Coolant Temp',
-                    'Low Coolant Level',
-                    'Crank Failure',
-                ],
-                'Current Value': [
-                    data.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                    data.engine_hours,
-                    data.frequency_hz,
-                    data.power_percentage,
-                    data.avg_ll_volt,
-                    data.avg_ln_volt,
-                    data.avg_current,
-                    data.phase_a_voltage_v,
-                    data.phase_a_current_a,
-                    data.phase_a_voltage_ll,
-                    data.phase_a_frequency_hz,
-                    data.phase_a_real_power,
-                    data.phase_a_apparent_power,
-                    data.phase_a_reactive_power,
-                    data.phase_b_voltage_v,
-                    data.phase_b_current_a,
-                    data.phase_b_voltage_ll,
-                    data.phase_b_frequency_hz,
-                    data.phase_b_real_power,
-                    data.phase_b_apparent_power,
-                    data.phase_b_reactive_power,
-                    data.phase_c_voltage_v,
-                    data.phase_c_current_a,
-                    data.phase_c_voltage_ll,
-                    data.phase_c_frequency_hz,
-                    data.phase_c_real_power,
-                    data.phase_c_apparent_power,
-                    data.phase_c_reactive_power,
-                    data.gen_breaker,
-                    data.util_breaker,
-                    data.gc_status,
-                    data.coolant_temp_c,
-                    data.oil_temp_c,
-                    data.intake_air_temp_c,
-                    data.oil_pressure_kpa,
-                    data.boost_pressure_kpa,
-                    data.fuel_level_percent,
-                    data.fuel_rate_lph,
-                    data.rpm,
-                    data.battery_voltage_v,
-                    data.instantaneous_power_kw,
-                    'Yes' if data.alarm_emergency_stop else 'No',
-                    'Yes' if data.alarm_low_oil_pressure else 'No',
-                    'Yes' if data.alarm_high_coolant_temp else 'No',
-                    'Yes' if data.alarm_low_coolant_level else 'No',
-                    'Yes' if data.alarm_crank_failure else 'No',
-                ]
-            }
+            job = submit('alarm', meter.pk, params, request.user)
 
-            # Create DataFrame
-            df = pd.DataFrame(report_data)
-
-            # Create Excel writer
-            with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                df.to_excel(writer, sheet_name='Meter Data Report', index=False)
-                workbook = writer.book
-                worksheet = writer.sheets['Meter Data Report']
-
-                # Add some formatting
-                header_format = workbook.add_format({
-                    'bold': True,
-                    'text_wrap': True,
-                    'valign': 'top',
-                    'bg_color': '#D7E4BC',
-                    'border': 1
-                })
-
-                # Format the header row
-                for col_num, value in enumerate(df.columns.values):
-                    worksheet.write(0, col_num, value, header_format)
-
-                # Format the metric names column
-                metric_format = workbook.add_format({
-                    'bold': True,
-                    'bg_color': '#E6E6E6',
-                    'border': 1
-                })
-
-                for row_num in range(df.shape[0]):
-                    worksheet.write(row_num + 1, 0, df['Metric'][row_num], metric_format)
-
-                # Set column widths
-                worksheet.set_column(0, 0, 30)  # Metric names column
-                worksheet.set_column(1, 1, 25)  # Values column
-
-                # Add device info at the bottom
-                info_format = workbook.add_format({
-                    'bold': True,
-                    'font_size': 12,
-                    'font_color': 'blue'
-                })
-                worksheet.write(df.shape[0] + 3, 0, "Device ID:", info_format)
-                worksheet.write(df.shape[0] + 3, 1, meter_id)
-                worksheet.write(df.shape[0] + 4, 0, "Report Generated At:", info_format)
-                worksheet.write(df.shape[0] + 4, 1, timezone.now().strftime('%Y-%m-%d %H:%M:%S'))
-
-            # Save the Excel file
-            timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"meter_data_report_{meter_id}_{timestamp}.xlsx"
-            file_path = f"reports/{filename}"
-
-            # Reset buffer position
-            buffer.seek(0)
-
-            # Save to storage
-            default_storage.save(file_path, ContentFile(buffer.getvalue()))
-
-            # Generate download URL
-            download_url = request.build_absolute_uri(f'/media/{file_path}')
+            return Response({
+                "details": {
+                    "message": "Alarm report queued",
+                    "job_id": str(job.pk),
+                    "status": job.status,
+                    "status_url": self.reverse_action('job-status', kwargs={'job_id': job.pk})
+                }
+            }, status=status.HTTP_202_ACCEPTED)
+
+        except Exception as e:
+            return Response({
+                "error": "Error generating alarm report",
+                "details": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+
+class GenerateMeterReport(ReportJobMixin, viewsets.ViewSet):
+    report_type = 'meter'
+
+    def create(self, request):
+        """
+        Queue a comprehensive report with only the most recent meter data for a specific meter.
+        """
+        try:
+            meter_id = request.data.get('meter_id')
+
+            if not meter_id:
+                return Response({
+                    "error": "meter_id is required"
+                }, status=status.HTTP_400_BAD_REQUEST)
+            if not isinstance(meter_id, str):
+                return Response({
+                    "error": "meter_id must be a string"
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            # Get the meter
+            meter = resolver.get(meter_id)
+            if meter is None:
+                return Response({
+                    "error": f"Meter with device_id {meter_id} not found"
+                }, status=status.HTTP_404_NOT_FOUND)
+
+            try:
+                params = self.report_params(request.data, device_id=meter_id)
+            except ValueError as e:
+                return Response({
+                    "error": "Invalid report request",
+                    "details": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            # Fail fast when there is nothing to report on
+            if not self.has_data(meter.pk, params):
+                return Response({
+                    "error": "No data found for this meter"
+                }, status=status.HTTP_404_NOT_FOUND)
+
+            job = submit('meter', meter.pk, params, request.user)
 
             return Response({
                 "details": {
-                    "message": "Meter data report generated successfully",
-                    "filename": filename,
-                    "download_url": download_url
+                    "message": "Meter data report queued",
+                    "job_id": str(job.pk),
+                    "status": job.status,
+                    "status_url": self.reverse_action('job-status', kwargs={'job_id': job.pk})
                 }
-            }, status=status.HTTP_200_OK)
+            }, status=status.HTTP_202_ACCEPTED)
 
         except Exception as e:
             import traceback
@@ -745,36 +1063,94 @@ class GenerateMeterReport(viewsets.ViewSet):
                 "details": str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def retrieve(self, request, pk=None):
+
+class GenerateFleetReport(ReportJobMixin, viewsets.ViewSet):
+    report_type = 'fleet'
+    report_formats = ['xlsx', 'zip'] + EXPORT_FORMATS
+
+    def create(self, request):
         """
-        Download a specific meter report by filename and delete it afterward
+        Queue one report over many meters and return the job id to poll.
+
+        Meters are given as ``device_ids`` (a list or comma separated string),
+        or with ``assigned: true`` as every meter assigned to the requesting
+        manager or engineer. ``format`` is ``xlsx`` (one sheet per meter, the
+        default), ``zip`` (one workbook per meter), or ``csv``/``parquet``
+        (one file of every meter's range rows); ``from``/``to`` and ``fields``
+        work as for the single meter reports.
         """
         try:
-            filename = pk
-            file_path = f"reports/{filename}"
+            device_ids = request.data.get('device_ids')
+            assigned = str(request.data.get('assigned', '')).lower() in ('1', 'true', 'yes')
+
+            if assigned:
+                if not request.user.is_authenticated:
+                    return Response({
+                        "error": "Unauthorized",
+                        "details": "Log in to report on assigned meters"
+                    }, status=status.HTTP_403_FORBIDDEN)
+                meters = Meter.objects.filter(
+                    pk__in=MeterAssignment.objects.filter(
+                        Q(manager=request.user) | Q(engineer=request.user)
+                    ).values('meter_id')
+                )
+            elif device_ids:
+                if isinstance(device_ids, str):
+                    device_ids = device_ids.split(',')
+                device_ids = list(dict.fromkeys(str(device_id).strip() for device_id in device_ids if str(device_id).strip()))
+                meters = Meter.objects.filter(device_id__in=device_ids)
+                missing = set(device_ids) - set(meters.values_list('device_id', flat=True))
+                if missing:
+                    return Response({
+                        "error": "Meters not found",
+                        "details": sorted(missing)
+                    }, status=status.HTTP_404_NOT_FOUND)
+            else:
+                return Response({
+                    "error": "device_ids or assigned is required"
+                }, status=status.HTTP_400_BAD_REQUEST)
 
-            if not default_storage.exists(file_path):
+            meters = dict(meters.values_list('pk', 'device_id'))
+            if not meters:
                 return Response({
-                    "error": "Report file not found"
+                    "error": "No meters assigned to this user"
                 }, status=status.HTTP_404_NOT_FOUND)
 
-            # Read the file
-            file_content = default_storage.open(file_path).read()
+            try:
+                params = self.report_params(
+                    request.data,
+                    device_ids=sorted(meters.values()),
+                    meter_ids=sorted(meters),
+                )
+            except ValueError as e:
+                return Response({
+                    "error": "Invalid report request",
+                    "details": str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
 
-            # Create HTTP response with file
-            response = HttpResponse(
-                file_content,
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            # Fail fast when there is nothing to report on
+            if 'from' in params:
+                readings = fleet_readings_in_range(meters, parse_time(params['from']), parse_time(params['to']))
+            else:
+                readings = MeterData.objects.filter(meter_id__in=meters)
+            if not readings.exists():
+                return Response({
+                    "error": "No data found for these meters"
+                }, status=status.HTTP_404_NOT_FOUND)
 
-            # Delete the file after sending
-            default_storage.delete(file_path)
+            job = submit('fleet', None, params, request.user)
 
-            return response
+            return Response({
+                "details": {
+                    "message": f"Fleet report for {len(meters)} meters queued",
+                    "job_id": str(job.pk),
+                    "status": job.status,
+                    "status_url": self.reverse_action('job-status', kwargs={'job_id': job.pk})
+                }
+            }, status=status.HTTP_202_ACCEPTED)
 
         except Exception as e:
             return Response({
-                "error": "Error downloading report",
+                "error": "Error generating fleet report",
                 "details": str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
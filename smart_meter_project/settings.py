@@ -133,6 +133,26 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Meter telemetry ingest
+# 'sync' writes each reading before responding; 'buffered' queues it in
+# memory and lets a background thread write batches (see meter/buffer.py);
+# 'spooled' fsyncs it to an append-only spool first (see meter/spool.py)
+METER_INGEST_MODE = os.environ.get('METER_INGEST_MODE', 'sync')
+METER_INGEST_SPOOL_DIR = os.environ.get('METER_INGEST_SPOOL_DIR', os.path.join(MEDIA_ROOT, 'spool'))
+
+# Meter reports
+# 'thread' builds queued reports in a small pool inside each web process;
+# 'worker' leaves them to `python manage.py report_worker` (see meter/jobs.py)
+METER_REPORT_EXECUTOR = os.environ.get('METER_REPORT_EXECUTOR', 'thread')
+METER_REPORT_WORKERS = int(os.environ.get('METER_REPORT_WORKERS', 2))
+# Seconds after which a RUNNING report is assumed lost and marked FAILED
+METER_REPORT_JOB_TIMEOUT = int(os.environ.get('METER_REPORT_JOB_TIMEOUT', 3600))
+# Processes building each ZIP fleet report; 0 builds it in the report worker itself
+METER_REPORT_PROCESSES = int(os.environ.get('METER_REPORT_PROCESSES', 0))
+# Least recently used report files are deleted beyond these bounds (see meter/retention.py)
+METER_REPORT_STORAGE_MAX_BYTES = int(os.environ.get('METER_REPORT_STORAGE_MAX_BYTES', 1024 ** 3))
+METER_REPORT_STORAGE_MAX_FILES = int(os.environ.get('METER_REPORT_STORAGE_MAX_FILES', 1000))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 